@@ -0,0 +1,65 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    db = schema_editor.connection.alias
+    first_likes = (LikedItem.objects.using(db)
+                   .values('user', 'content_type', 'object_id')
+                   .annotate(first=Min('id'))
+                   .values('first'))
+    LikedItem.objects.using(db).exclude(id__in=first_likes).delete()
+
+
+def count_likes(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCounter = apps.get_model('likes', 'LikeCounter')
+    db = schema_editor.connection.alias
+    counts = (LikedItem.objects.using(db)
+              .order_by()
+              .values_list('content_type', 'object_id')
+              .annotate(count=Count('id')))
+    LikeCounter.objects.using(db).bulk_create(
+        (LikeCounter(content_type_id=content_type_id, object_id=object_id, count=count)
+         for content_type_id, object_id, count in counts.iterator()),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('likes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='likes_likeditem_unique'),
+        ),
+        migrations.AddField(
+            model_name='likecounter',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecounter',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='likes_likecounter_unique'),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
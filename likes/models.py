@@ -1,11 +1,78 @@
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+class LikedItemManager(models.Manager):
+    def get_likes_for_many(self, obj_type, obj_ids, user=None) -> dict:
+        """
+        {object id: (likes_count, liked_by_me)} for many objects of the same type: the counts come from
+        LikeCounter and the user's own likes from one lookup on the unique (user, content_type, object_id)
+        index, so at most two queries (one for anonymous users).
+        """
+        obj_ids = list(obj_ids)
+        if not obj_ids:
+            return {}
+        content_type = ContentType.objects.get_for_model(obj_type)
+        counts: dict = dict(LikeCounter.objects.using(self.db)
+                            .filter(content_type=content_type, object_id__in=obj_ids)
+                            .values_list('object_id', 'count'))
+        liked: set = set()
+        if user is not None and user.is_authenticated:
+            liked = set(self.filter(user=user, content_type=content_type, object_id__in=obj_ids)
+                        .values_list('object_id', flat=True))
+        return {obj_id: (counts.get(obj_id, 0), obj_id in liked) for obj_id in obj_ids}
+
+
 class LikedItem(models.Model):
+    objects = LikedItemManager()
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        constraints = [
+            # a user likes an object at most once, this is what makes like / unlike idempotent
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'], name='likes_likeditem_unique'),
+        ]
+
+
+class LikeCounterManager(models.Manager):
+    def increment(self, content_type_id: int, object_id: int, delta: int = 1) -> None:
+        """
+        Atomically adds `delta` to the counter of an object, creating it on the first like
+        (INSERT ... ON CONFLICT DO UPDATE, supported by PostgreSQL and SQLite 3.24+).
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table: str = quote(self.model._meta.db_table)
+        content_type, object_id_column, count = (quote(self.model._meta.get_field(name).column)
+                                                 for name in ('content_type', 'object_id', 'count'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({content_type}, {object_id_column}, {count}) VALUES (%s, %s, %s) '
+                f'ON CONFLICT ({content_type}, {object_id_column}) '
+                f'DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+                [content_type_id, object_id, delta])
+
+    def decrement(self, content_type_id: int, object_id: int, delta: int = 1) -> None:
+        self.filter(content_type_id=content_type_id, object_id=object_id, count__gte=delta) \
+            .update(count=models.F('count') - delta)
+
+
+class LikeCounter(models.Model):
+    """
+    Denormalized number of likes of an object, maintained by likes.signals.handlers and repaired by
+    `manage.py repair_counters likes.likecounter`.
+    """
+    objects = LikeCounterManager()
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='likes_likecounter_unique'),
+        ]
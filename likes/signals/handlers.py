@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from likes.models import LikeCounter, LikedItem
+
+
+# region Like counters
+@receiver(post_save, sender=LikedItem)
+def count_like(sender, instance: LikedItem, created: bool, **kwargs) -> None:
+    if created:
+        LikeCounter.objects.increment(instance.content_type_id, instance.object_id)
+
+
+@receiver(post_delete, sender=LikedItem)
+def count_unlike(sender, instance: LikedItem, **kwargs) -> None:
+    LikeCounter.objects.decrement(instance.content_type_id, instance.object_id)
+# endregion
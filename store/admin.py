@@ -1,9 +1,97 @@
 from django.contrib import admin, messages
-from django.db.models.aggregates import Count
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.db.models.query import QuerySet
 from django.utils.html import format_html, urlencode
+from django.utils.text import smart_split, unescape_string_literal
 from django.urls import reverse
 from . import models
+from .estimates import EstimatedCountPaginator
+from .search import filter_products
+
+
+def prefix_condition(field: str, prefix: str) -> Q:
+    """
+    Case insensitive `field` starts with `prefix`, as a LIKE 'prefix%' on lower(field) that its functional index
+    serves (text_pattern_ops on PostgreSQL, so whatever the collation of the database, see migration 0016).
+    """
+    return Q(**{f'{field}_lower__startswith': prefix.lower()})
+
+
+class PrefetchedAutocompleteSelect(AutocompleteSelect):
+    """
+    AutocompleteSelect that takes its selected object from `selected` ({value: object}) once the formset filled
+    it (see AutocompleteInlineMixin), instead of querying it: one query per form otherwise.
+    """
+    selected: dict | None = None
+
+    def to_field_attname(self) -> str:
+        remote_model_opts = self.field.remote_field.model._meta
+        return remote_model_opts.get_field(getattr(self.field.remote_field, 'field_name',
+                                                   remote_model_opts.pk.attname)).attname
+
+    def optgroups(self, name, value, attr=None):
+        if self.selected is None:
+            return super().optgroups(name, value, attr)
+        options: list = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for choice in value:
+            obj = self.selected.get(str(choice))
+            if obj is not None:
+                options.append(self.create_option(name, getattr(obj, self.to_field_attname()),
+                                                  self.choices.field.label_from_instance(obj), True, len(options)))
+        return [(None, options, 0)]
+
+
+class AutocompleteInlineMixin:
+    """
+    Inline whose autocomplete fields look up the selected objects of all its forms with one query per field.
+    """
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if 'widget' not in kwargs and db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = PrefetchedAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_formset(self, request, obj=None, **kwargs):
+        base = super().get_formset(request, obj, **kwargs)
+        names: list = [name for name in self.get_autocomplete_fields(request) if name in base.form.base_fields]
+
+        class AutocompleteFormSet(base):
+            def __init__(self, *args, **kwargs) -> None:
+                super().__init__(*args, **kwargs)
+                for name in names:
+                    prefetch_selected(self.forms, name)
+
+        return AutocompleteFormSet
+
+
+def prefetch_selected(forms: list, name: str) -> None:
+    """
+    Fills `selected` of the PrefetchedAutocompleteSelect of field `name` of `forms` with one query.
+    """
+    # the admin wraps the widget in a RelatedFieldWidgetWrapper
+    widgets: list = [getattr(form.fields[name].widget, 'widget', form.fields[name].widget) for form in forms]
+    if not widgets or not isinstance(widgets[0], PrefetchedAutocompleteSelect):
+        return
+    field = forms[0].fields[name]
+    values: set = {str(form[name].value()) for form in forms} - {str(value) for value in field.empty_values}
+    attname: str = widgets[0].to_field_attname()
+    selected: dict = {str(getattr(obj, attname)): obj
+                      for obj in field.queryset.using(widgets[0].db).filter(**{f'{attname}__in': values})}
+    for widget in widgets:
+        widget.selected = selected
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelists of tables too large to count on every request: the page count comes from the planner's
+    estimate (see store.estimates), and the unfiltered total is not counted at all.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -17,30 +105,36 @@ class InventoryFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset: QuerySet):
         if self.value() == '<10':
-            return queryset.filter(inventory__lt=10)
+            return queryset.filter(inventory__lt=models.LOW_INVENTORY)
 
 
 @admin.register(models.Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     autocomplete_fields = ['collection']
     prepopulated_fields = {
         'slug': ['title']
     }
     actions = ['clear_inventory']
-    list_display = ['title', 'unit_price',
+    list_display = ['title', 'unit_price', 'final_price',
                     'inventory_status', 'collection_title']
     list_editable = ['unit_price']
     list_filter = ['collection', 'last_update', InventoryFilter]
     list_per_page = 10
     list_select_related = ['collection']
+    # search_fields only enables the search box, get_search_results() queries the full-text index instead
     search_fields = ['title']
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return filter_products(queryset, search_term), False
+
     def collection_title(self, product):
         return product.collection.title
 
     @admin.display(ordering='inventory')
     def inventory_status(self, product):
-        if product.inventory < 10:
+        if product.inventory < models.LOW_INVENTORY:
             return 'Low'
         return 'OK'
 
@@ -70,20 +164,26 @@ class CollectionAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Products</a>', url, collection.products_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('product')
-        )
-
 
 @admin.register(models.Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(LargeTableAdmin):
     list_display = ['first_name', 'last_name',  'membership', 'orders']
     list_editable = ['membership']
     list_per_page = 10
     ordering = ['first_name', 'last_name']
+    # search_fields only enables the search box, get_search_results() runs the same search on the lower() indexes
     search_fields = ['first_name__istartswith', 'last_name__istartswith']
 
+    def get_search_results(self, request, queryset, search_term):
+        queryset = queryset.alias(first_name_lower=Lower('first_name'), last_name_lower=Lower('last_name'))
+        # every term must prefix the first or the last name, quoted terms may contain spaces (as in the admin)
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            if bit:
+                queryset = queryset.filter(prefix_condition('first_name', bit) | prefix_condition('last_name', bit))
+        return queryset, False
+
     @admin.display(ordering='orders_count')
     def orders(self, customer):
         url = (
@@ -94,13 +194,8 @@ class CustomerAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Orders</a>', url, customer.orders_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            orders_count=Count('order')
-        )
-
 
-class OrderItemInline(admin.TabularInline):
+class OrderItemInline(AutocompleteInlineMixin, admin.TabularInline):
     autocomplete_fields = ['product']
     min_num = 1
     max_num = 10
@@ -109,7 +204,10 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(models.Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     autocomplete_fields = ['customer']
     inlines = [OrderItemInline]
-    list_display = ['id', 'placed_at', 'customer']
+    list_display = ['id', 'placed_at', 'customer', 'items_count', 'total_price']
+    list_select_related = ['customer']
+    # maintained from the items, see store.signals.handlers
+    readonly_fields = ['items_count', 'total_price']
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self) -> None:
+        import store.signals.handlers  # noqa: F401
+        from store.search import repair_search_index
+        post_migrate.connect(repair_search_index, sender=self)
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from typing import Callable
+
+from .pricing import final_price
+
+
+def percentile(samples: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of `samples` (which do not need to be sorted).
+    """
+    if not samples:
+        return 0.0
+    ordered: list = sorted(samples)
+    rank: int = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def measure(fn: Callable, repeat: int = 5, number: int = 1) -> dict:
+    """
+    Runs `fn` `number` times per round for `repeat` rounds and returns the best / median round in seconds.
+    """
+    rounds: list = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append(time.perf_counter() - start)
+    return {'best': min(rounds), 'median': statistics.median(rounds)}
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f'{seconds:.2f} s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds * 1e6:.1f} µs'
+
+
+def product_rows(count: int, seed: int = 1) -> list:
+    """
+    `count` synthetic `.values(*ProductReadSerializer.values_fields)` rows, the same for the same `seed`.
+    """
+    rng = random.Random(seed)
+    rows: list = [
+        {
+            'id': pk,
+            'title': f'Product {pk}',
+            'description': None if pk % 7 == 0 else f'Description of product {pk}',
+            'slug': f'product-{pk}',
+            'inventory': rng.randint(0, 100),
+            'unit_price': Decimal(rng.randint(100, 999_999)) / 100,
+            'collection_id': rng.randint(1, 10),
+        }
+        for pk in range(1, count + 1)
+    ]
+    for row in rows:
+        row['final_price'] = final_price(row['unit_price'], rng.choice((0.0, 0.0, 0.1, 0.25)))
+    return rows
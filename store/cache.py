@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from storefront.routers import replica_lag_timeout
+
+
+class ListCache:
+    """
+    Response cache for the catalog list endpoints.
+
+    Entries are keyed on the request scheme, host and path, the normalized query string, the negotiated format and
+    the current generation of every model the response depends on; the bodies contain absolute URLs (pagination
+    links, hyperlinks), so an entry cannot be served under another scheme or host. Writes never delete entries, they bump the generation of
+    the changed model (see store.signals.handlers) so every key built afterwards is new and stale entries simply
+    age out of the backend (LocMemCache is an LRU bounded by MAX_ENTRIES).
+
+    Hit / miss counters are kept per process.
+    """
+    key_prefix: str = 'store:list'
+
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> BaseCache:
+        return caches[self.alias]
+
+    # region Generations
+    def generation_key(self, name: str) -> str:
+        return f'{self.key_prefix}:gen:{name}'
+
+    def get_generations(self, names: tuple) -> list:
+        keys: list = [self.generation_key(name) for name in names]
+        found: dict = self.backend.get_many(keys)
+        generations: list = []
+        for key in keys:
+            if key not in found:
+                # time based seed: a generation that was evicted never comes back with an old value
+                self.backend.add(key, time.time_ns(), timeout=None)
+                found[key] = self.backend.get(key)
+            generations.append(found[key])
+        return generations
+
+    async def aget_generations(self, names: tuple) -> list:
+        keys: list = [self.generation_key(name) for name in names]
+        found: dict = await self.backend.aget_many(keys)
+        generations: list = []
+        for key in keys:
+            if key not in found:
+                await self.backend.aadd(key, time.time_ns(), timeout=None)
+                found[key] = await self.backend.aget(key)
+            generations.append(found[key])
+        return generations
+
+    def invalidate(self, *names: str) -> None:
+        for name in names:
+            key: str = self.generation_key(name)
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                self.backend.set(key, time.time_ns(), timeout=None)
+    # endregion
+
+    def make_key(self, request: Request, dependencies: tuple) -> str:
+        media_type: str = request.accepted_renderer.format if hasattr(request, 'accepted_renderer') else ''
+        return self.build_key(request, request.query_params, media_type, self.get_generations(dependencies))
+
+    async def amake_key(self, request: HttpRequest, dependencies: tuple, media_type: str) -> str:
+        """
+        Key of a plain Django request answered in `media_type`, the same key `make_key()` builds for the DRF
+        request, so the sync and async views share their entries.
+        """
+        return self.build_key(request, request.GET, media_type, await self.aget_generations(dependencies))
+
+    def build_key(self, request: HttpRequest | Request, query_params: QueryDict, media_type: str,
+                  generations: list) -> str:
+        query: str = '&'.join(f'{k}={v}' for k, values in sorted(query_params.lists()) for v in values)
+        url: str = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+        digest: str = hashlib.md5(f'{url}|{media_type}'.encode('utf-8')).hexdigest()
+        return f'{self.key_prefix}:{".".join(str(generation) for generation in generations)}:{digest}'
+
+    def count(self, data) -> None:
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def get(self, key: str):
+        data = self.backend.get(key)
+        self.count(data)
+        return data
+
+    async def aget(self, key: str):
+        data = await self.backend.aget(key)
+        self.count(data)
+        return data
+
+    def set(self, key: str, data) -> None:
+        self.backend.set(key, data, replica_lag_timeout())
+
+    async def aset(self, key: str, data) -> None:
+        await self.backend.aset(key, data, replica_lag_timeout())
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total: int = hits + misses
+        return {
+            'backend': self.alias,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+
+list_cache: ListCache = ListCache(getattr(settings, 'STORE_LIST_CACHE_ALIAS', 'default'))
+
+
+class CachedListMixin:
+    """
+    Serves `list()` from `list_cache`. `cache_dependencies` names the generations (see
+    store.signals.handlers) that invalidate the cached responses of the view.
+    """
+    cache_dependencies: tuple = ()
+
+    def get_cache_dependencies(self) -> tuple:
+        return self.cache_dependencies
+
+    def use_list_cache(self) -> bool:
+        """
+        False for responses that must not be shared, e.g. ones containing per-user data.
+        """
+        return True
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        if not self.use_list_cache():
+            return super().list(request, *args, **kwargs)
+        key: str = list_cache.make_key(request, self.get_cache_dependencies())
+        data = list_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response: Response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            list_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,75 @@
+"""
+Checkout: turns a Cart into an Order in one transaction.
+
+1. The cart row is locked (SELECT ... FOR UPDATE), so two checkouts of the same cart cannot both place an order,
+   and the item writes of the cart API, which take the same lock, wait until the order is placed.
+2. Inventory is decremented with one conditional `UPDATE ... SET inventory = inventory - n WHERE inventory >= n`
+   per product, in primary key order. The condition makes overselling impossible without reading the stock
+   first, and the fixed order means concurrent checkouts lock the product rows in the same order and cannot
+   deadlock each other.
+3. The Order, with its totals, and all its OrderItems (bulk_create) are written with the unit prices of the
+   products at checkout.
+4. The cart is deleted.
+
+Any failure rolls all of it back.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import Cart, CartItem, Customer, Order, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class CartNotFound(CheckoutError):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, shortages: list) -> None:
+        super().__init__(f'Insufficient stock for products {", ".join(str(row["product_id"]) for row in shortages)}')
+        # [{'product_id', 'requested', 'available'}]
+        self.shortages = shortages
+
+
+def checkout(cart_id, customer: Customer) -> tuple[Order, list]:
+    """
+    Places an order for the content of the cart and returns it with its items.
+    Raises CartNotFound, EmptyCart or InsufficientStock, in which case nothing was written.
+    """
+    with transaction.atomic():
+        if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+            raise CartNotFound(cart_id)
+        items: list = list(CartItem.objects
+                           .filter(cart_id=cart_id)
+                           .order_by('product_id')
+                           .values_list('product_id', 'quantity', 'product__unit_price'))
+        if not items:
+            raise EmptyCart(cart_id)
+
+        quantities: dict = {product_id: quantity for product_id, quantity, _ in items}
+        short: list = Product.objects.decrement_inventory(quantities)
+        if short:
+            available: dict = dict(Product.objects.filter(pk__in=short).values_list('pk', 'inventory'))
+            # leaving the atomic block with the exception also rolls back the decrements that succeeded
+            raise InsufficientStock([
+                {'product_id': pk, 'requested': quantities[pk], 'available': available.get(pk, 0)} for pk in short
+            ])
+
+        order: Order = Order.objects.create(
+            customer=customer,
+            total_price=sum((quantity * unit_price for _, quantity, unit_price in items), Decimal('0')),
+            items_count=sum(quantities.values()))
+        order_items: list = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, unit_price=unit_price)
+            for product_id, quantity, unit_price in items
+        ])
+        Cart.objects.filter(pk=cart_id).delete()
+    return order, order_items
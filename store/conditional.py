@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from django.http import HttpRequest, HttpResponse, HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
+
+
+def make_etag(pk, version: datetime) -> str:
+    # Strong validator: the object id and the microsecond timestamp of its last write
+    return quote_etag(f'{pk}-{int(version.timestamp() * 1_000_000):x}')
+
+
+def set_validators(response: HttpResponseBase, pk, version: datetime) -> None:
+    response['ETag'] = make_etag(pk, version)
+    response['Last-Modified'] = http_date(version.timestamp())
+
+
+def get_conditional_response_for(request: HttpRequest, pk, version: datetime) -> HttpResponseBase | None:
+    """
+    The 304 / 412 answer to the conditional headers of `request` for version `version` of object `pk`,
+    None when the request should be handled normally.
+    """
+    validators = HttpResponse()
+    set_validators(validators, pk, version)
+    response = get_conditional_response(
+        request,
+        etag=validators['ETag'],
+        last_modified=int(version.timestamp()),
+        response=validators,
+    )
+    return None if response is validators else response
+
+
+class ConditionalResponse(Exception):
+    """
+    Raised from `initial()` to short-circuit a request with a 304 / 412 response.
+    """
+
+    def __init__(self, response: HttpResponseBase) -> None:
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class ConditionalRequestMixin:
+    """
+    ETag / Last-Modified support for detail views.
+
+    The version of the object is read with a single primary key lookup of `version_field` before the handler runs,
+    so a 304 (If-None-Match / If-Modified-Since on GET/HEAD) or a 412 (If-Match / If-Unmodified-Since on
+    PUT/PATCH/DELETE) is answered without loading or serializing the object.
+    """
+    version_field: str = 'last_update'
+
+    def use_validators(self) -> bool:
+        """
+        False for representations that can change without `version_field` changing.
+        """
+        return True
+
+    def get_version(self) -> datetime | None:
+        model = self.get_queryset().model
+        return (model._default_manager
+                .filter(**{self.lookup_field: self.get_lookup_value()})
+                .values_list(self.version_field, flat=True)
+                .first())
+
+    def get_lookup_value(self):
+        return self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+
+    def set_validators(self, response: HttpResponseBase, version: datetime) -> None:
+        set_validators(response, self.get_lookup_value(), version)
+
+    def initial(self, request: Request, *args, **kwargs) -> None:
+        super().initial(request, *args, **kwargs)
+        if not self.use_validators():
+            return
+        self.version = version = self.get_version()
+        if version is None:
+            # Let the handler raise its usual 404
+            return
+
+        response: HttpResponseBase | None = get_conditional_response_for(request._request,
+                                                                         self.get_lookup_value(), version)
+        if response is not None:
+            raise ConditionalResponse(response)
+
+    def handle_exception(self, exc: Exception) -> HttpResponseBase:
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request: Request, response: HttpResponseBase, *args, **kwargs) -> HttpResponseBase:
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (response.status_code == 200 and request.method in ('GET', 'HEAD', 'PUT', 'PATCH')
+                and self.use_validators()):
+            # A PUT / PATCH has just changed the version, read it again
+            version: datetime | None = getattr(self, 'version', None)
+            if request.method in ('PUT', 'PATCH'):
+                version = self.get_version()
+            if version is not None:
+                self.set_validators(response, version)
+        return response
@@ -0,0 +1,233 @@
+import asyncio
+import importlib
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from store.benchmarks import format_seconds, percentile
+from store.models import Collection, Product
+
+
+@contextmanager
+def async_views(enabled: bool):
+    """
+    Switches STORE_ASYNC_VIEWS and reloads the store URLconf, which picks the views at import time.
+    """
+    with override_settings(STORE_ASYNC_VIEWS=enabled):
+        try:
+            reload_urls()
+            yield
+        finally:
+            reload_urls()
+
+
+def reload_urls() -> None:
+    importlib.reload(importlib.import_module('store.urls'))
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = ('Compares the sync (WSGI) and async (ASGI, STORE_ASYNC_VIEWS) catalog read endpoints in-process: checks '
+            'that both modes answer the same, then measures throughput and latency at high concurrency with a '
+            'simulated database round trip added to every query. The list cache is disabled unless --with-cache.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+        parser.add_argument('--wsgi-threads', type=int, default=None,
+                            help='Worker threads of the WSGI server, defaults to --concurrency')
+        parser.add_argument('--db-latency', type=float, default=0.005, help='Seconds added to every query')
+        parser.add_argument('--with-cache', action='store_true')
+
+    def handle(self, *args, **options) -> None:
+        product_id: int | None = Product.objects.order_by('id').values_list('id', flat=True).first()
+        collection_id: int | None = Collection.objects.order_by('id').values_list('id', flat=True).first()
+        if product_id is None or collection_id is None:
+            raise CommandError('No products, run generate_data first')
+        paths: list = [('/', 'page_size=20'), (f'/{product_id}/', ''), ('/collection/', ''),
+                       (f'/collection/{collection_id}/', '')]
+
+        overrides: dict = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': ['localhost'],
+            # the same middleware in both modes: the debug toolbar can only run synchronously
+            'MIDDLEWARE': [name for name in settings.MIDDLEWARE if not name.startswith('debug_toolbar.')],
+        }
+        if not options['with_cache']:
+            overrides['CACHES'] = {**settings.CACHES, settings.STORE_LIST_CACHE_ALIAS: {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(**overrides):
+            responses: dict = {}
+            for mode in ('wsgi', 'asgi'):
+                with async_views(mode == 'asgi'):
+                    responses[mode] = (self.run_wsgi(paths, len(paths), 1, 1) if mode == 'wsgi' else
+                                       self.run_asgi(paths, len(paths), 1))[3]
+            for path, query in paths:
+                if responses['wsgi'][path] != responses['asgi'][path]:
+                    raise CommandError(f'{path}?{query}: the WSGI and ASGI responses differ')
+            self.stdout.write(f'{len(paths)} endpoints answer the same in both modes')
+
+            self.latency: float = options['db_latency']
+            self.stdout.write(f'{options["requests"]} requests, {options["concurrency"]} concurrent clients, '
+                              f'{format_seconds(self.latency)} added to every query')
+            connection_created.connect(self.add_latency)
+            try:
+                for mode in ('wsgi', 'asgi'):
+                    with async_views(mode == 'asgi'):
+                        self.report(mode, paths, options)
+            finally:
+                connection_created.disconnect(self.add_latency)
+                for connection in connections.all(initialized_only=True):
+                    if self.sleep in connection.execute_wrappers:
+                        connection.execute_wrappers.remove(self.sleep)
+
+    # region Measurements
+    def add_latency(self, sender, connection, **kwargs) -> None:
+        # connection_created is sent again every time the (per thread) connection reconnects
+        if self.sleep not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.sleep)
+
+    def sleep(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def report(self, mode: str, paths: list, options: dict) -> None:
+        if mode == 'wsgi':
+            workers: int = options['wsgi_threads'] or options['concurrency']
+            wall, timings, errors, _ = self.run_wsgi(paths, options['requests'], options['concurrency'], workers)
+            label: str = f'WSGI, {workers} threads'
+        else:
+            wall, timings, errors, _ = self.run_asgi(paths, options['requests'], options['concurrency'])
+            label = 'ASGI, event loop'
+        self.stdout.write(f'{label:<20} {len(timings) / wall:>8,.0f} req/s  '
+                          f'p50 {format_seconds(percentile(timings, 50))}, '
+                          f'p95 {format_seconds(percentile(timings, 95))}, '
+                          f'p99 {format_seconds(percentile(timings, 99))}'
+                          + (f', {errors} errors' if errors else ''))
+    # endregion
+
+    # region In-process servers
+    @staticmethod
+    def wsgi_environ(path: str, query: str) -> dict:
+        return {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    def run_wsgi(self, paths: list, requests: int, concurrency: int, workers: int) -> tuple:
+        """
+        `requests` GETs cycling through `paths` from `concurrency` clients, served by at most `workers` threads at
+        once like a threaded WSGI server: the timings include the wait for a free worker.
+        Returns (wall time, timings, error count, {path: last body}).
+        """
+        application = get_wsgi_application()
+        timings: list = []
+        bodies: dict = {}
+        errors: list = []
+        lock = threading.Lock()
+        server = threading.Semaphore(workers)
+        counter = iter(range(requests))
+
+        def client() -> None:
+            local: list = []
+            for index in counter:
+                path, query = paths[index % len(paths)]
+                result: dict = {}
+
+                def start_response(status: str, headers: list, exc_info=None) -> None:
+                    result['status'] = int(status.split()[0])
+
+                started: float = time.perf_counter()
+                with server:
+                    response = application(self.wsgi_environ(path, query), start_response)
+                    body: bytes = b''.join(response)
+                    response.close()
+                local.append(time.perf_counter() - started)
+                with lock:
+                    if result['status'] != 200:
+                        errors.append(result['status'])
+                    bodies[path] = body
+            with lock:
+                timings.extend(local)
+
+        threads: list = [threading.Thread(target=client) for _ in range(concurrency)]
+        started: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, timings, len(errors), bodies
+
+    @staticmethod
+    async def call_asgi(application, path: str, query: str) -> tuple[int, bytes]:
+        scope: dict = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        body_sent = asyncio.Event()
+        disconnected = asyncio.Event()
+        parts: list = []
+        result: dict = {}
+
+        async def receive() -> dict:
+            if not body_sent.is_set():
+                body_sent.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django listens for the client going away until the response is sent
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message: dict) -> None:
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                parts.append(message.get('body', b''))
+
+        await application(scope, receive, send)
+        return result['status'], b''.join(parts)
+
+    def run_asgi(self, paths: list, requests: int, concurrency: int) -> tuple:
+        """
+        `requests` GETs cycling through `paths`, `concurrency` of them in flight in one event loop.
+        Returns (wall time, timings, error count, {path: last body}).
+        """
+        application = get_asgi_application()
+        timings: list = []
+        bodies: dict = {}
+        errors: list = []
+        counter = iter(range(requests))
+
+        async def worker() -> None:
+            for index in counter:
+                path, query = paths[index % len(paths)]
+                started: float = time.perf_counter()
+                status, body = await self.call_asgi(application, path, query)
+                timings.append(time.perf_counter() - started)
+                if status != 200:
+                    errors.append(status)
+                bodies[path] = body
+
+        async def main() -> float:
+            started: float = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return time.perf_counter() - started
+
+        wall: float = asyncio.run(main())
+        return wall, timings, len(errors), bodies
+    # endregion
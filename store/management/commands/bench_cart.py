@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from store.benchmarks import format_seconds, percentile
+from store.models import Cart, CartItem, Product
+
+
+class Command(BaseCommand):
+    help = ('Load-tests the cart API in-process: many threads add products to the same cart at once, then checks '
+            'that no add was lost and reports throughput and latency percentiles.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--adds', type=int, default=200, help='Adds per thread')
+        parser.add_argument('--products', type=int, default=5, help='Distinct products the threads add')
+        parser.add_argument('--reads', type=int, default=200, help='Cart GETs timed after the adds')
+
+    def handle(self, *args, **options) -> None:
+        product_ids: list = list(Product.objects.order_by('id').values_list('id', flat=True)[:options['products']])
+        if not product_ids:
+            raise CommandError('No products, run generate_data first')
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            self.run(product_ids, options)
+
+    def run(self, product_ids: list, options: dict) -> None:
+        client = Client(HTTP_HOST='localhost')
+        cart_id: str = client.post('/carts/').json()['id']
+        url: str = f'/carts/{cart_id}/items/'
+        timings: list = []
+        errors: list = []
+        lock = threading.Lock()
+
+        def worker(offset: int) -> None:
+            worker_client = Client(HTTP_HOST='localhost')
+            local: list = []
+            try:
+                for index in range(options['adds']):
+                    body: str = json.dumps({'product_id': product_ids[(offset + index) % len(product_ids)],
+                                            'quantity': 1})
+                    started: float = time.perf_counter()
+                    response = worker_client.post(url, body, content_type='application/json')
+                    local.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        with lock:
+                            errors.append(response.status_code)
+            finally:
+                connections.close_all()
+            with lock:
+                timings.extend(local)
+
+        threads: list = [threading.Thread(target=worker, args=(offset,)) for offset in range(options['threads'])]
+        started: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall: float = time.perf_counter() - started
+
+        expected: int = options['threads'] * options['adds']
+        stored: int = sum(CartItem.objects.filter(cart_id=cart_id).values_list('quantity', flat=True))
+        self.stdout.write(f'{options["threads"]} threads x {options["adds"]} adds to one cart '
+                          f'({len(product_ids)} products): {len(timings) / wall:,.0f} adds/s, '
+                          f'p50 {format_seconds(percentile(timings, 50))}, '
+                          f'p95 {format_seconds(percentile(timings, 95))}, '
+                          f'p99 {format_seconds(percentile(timings, 99))}')
+
+        reads: list = []
+        for _ in range(options['reads']):
+            started = time.perf_counter()
+            client.get(f'/carts/{cart_id}/')
+            reads.append(time.perf_counter() - started)
+        self.stdout.write(f'GET cart x{options["reads"]}: p50 {format_seconds(percentile(reads, 50))}, '
+                          f'p95 {format_seconds(percentile(reads, 95))}')
+        Cart.objects.filter(pk=cart_id).delete()
+
+        if errors or stored != expected:
+            raise CommandError(f'{len(errors)} failed adds, cart quantity {stored} instead of {expected}')
+        self.stdout.write(self.style.SUCCESS(f'no lost updates: cart quantity {stored} == {expected} adds'))
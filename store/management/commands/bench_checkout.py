@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from store.benchmarks import format_seconds, percentile
+from store.models import Cart, CartItem, Customer, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = ('Load-tests checkout in-process: many threads check out prepared carts that all compete for the same '
+            'scarce products, then checks that no inventory went negative and that every sold unit belongs to '
+            'exactly one order. The orders are deleted and the inventory restored afterwards.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--carts', type=int, default=50, help='Carts checked out per thread')
+        parser.add_argument('--products', type=int, default=5, help='Distinct products in every cart')
+        parser.add_argument('--stock', type=int, default=100,
+                            help='Inventory given to the first product, so that it runs out during the run')
+
+    def handle(self, *args, **options) -> None:
+        settings_dict: dict = connections['default'].settings_dict
+        if connections['default'].vendor == 'sqlite' and \
+                settings_dict.get('OPTIONS', {}).get('transaction_mode') != 'IMMEDIATE':
+            # a deferred SQLite transaction that starts writing after a read fails at once with "database is
+            # locked" when another connection writes, instead of waiting for the busy timeout
+            raise CommandError("On SQLite, set DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'")
+        products: list = list(Product.objects.order_by('id').values_list('id', 'inventory')[:options['products']])
+        customer: Customer = Customer.objects.order_by('id').first()
+        if not products or customer is None:
+            raise CommandError('No products or customers, run generate_data first')
+        inventory: dict = dict(products)
+        product_ids: list = list(inventory)
+        contested: int = product_ids[0]
+        # every cart takes one unit of each product: the contested one sells out, the others have enough
+        Product.objects.filter(pk=contested).update(inventory=options['stock'])
+        Product.objects.filter(pk__in=product_ids[1:]).update(inventory=options['threads'] * options['carts'])
+        carts: list = self.create_carts(product_ids, options['threads'] * options['carts'])
+        self.order_ids: list = []
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+                self.run(carts, customer, contested, options)
+        finally:
+            OrderItem.objects.filter(order_id__in=self.order_ids).delete()
+            Order.objects.filter(pk__in=self.order_ids).delete()
+            Cart.objects.filter(pk__in=carts).delete()
+            for pk, quantity in inventory.items():
+                Product.objects.filter(pk=pk).update(inventory=quantity)
+
+    @staticmethod
+    def create_carts(product_ids: list, count: int) -> list:
+        carts: list = Cart.objects.bulk_create([Cart() for _ in range(count)])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product_id=product_id, quantity=1)
+                                      for cart in carts for product_id in product_ids])
+        return [cart.pk for cart in carts]
+
+    def run(self, carts: list, customer: Customer, contested: int, options: dict) -> None:
+        body: str = json.dumps({'customer_id': customer.pk})
+        statuses: dict = {}
+        timings: list = []
+        lock = threading.Lock()
+
+        def worker(cart_ids: list) -> None:
+            client = Client(HTTP_HOST='localhost')
+            local: list = []
+            try:
+                for cart_id in cart_ids:
+                    started: float = time.perf_counter()
+                    response = client.post(f'/carts/{cart_id}/checkout/', body, content_type='application/json')
+                    local.append(time.perf_counter() - started)
+                    with lock:
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                        if response.status_code == 201:
+                            self.order_ids.append(response.json()['id'])
+            finally:
+                connections.close_all()
+            with lock:
+                timings.extend(local)
+
+        threads: list = [threading.Thread(target=worker, args=(carts[index::options['threads']],))
+                         for index in range(options['threads'])]
+        started: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall: float = time.perf_counter() - started
+
+        self.stdout.write(f'{options["threads"]} threads x {options["carts"]} checkouts '
+                          f'({options["products"]} products per cart, {options["stock"]} units of the contested '
+                          f'one): {len(timings) / wall:,.0f} checkouts/s, '
+                          f'p50 {format_seconds(percentile(timings, 50))}, '
+                          f'p95 {format_seconds(percentile(timings, 95))}, '
+                          f'p99 {format_seconds(percentile(timings, 99))}')
+        self.stdout.write(f'responses: {", ".join(f"{status} x{count}" for status, count in sorted(statuses.items()))}')
+
+        left: int = Product.objects.get(pk=contested).inventory
+        ordered: int = len(self.order_ids)
+        if left < 0 or ordered != options['stock'] - left or set(statuses) - {201, 409}:
+            raise CommandError(f'{ordered} orders placed, {left} units left of {options["stock"]}')
+        self.stdout.write(self.style.SUCCESS(f'no oversell: {ordered} orders + {left} units left == '
+                                             f'{options["stock"]} in stock'))
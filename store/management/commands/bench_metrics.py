@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from store.benchmarks import format_seconds, measure
+from storefront.metrics import MetricsMiddleware, Registry
+
+
+class Command(BaseCommand):
+    help = 'Measures the per-request overhead of storefront.metrics.MetricsMiddleware.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--requests', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        response = HttpResponse(b'x' * 2048)
+
+        def view(request) -> HttpResponse:
+            return response
+
+        # keep the numbers of this run out of the live registry
+        middleware = MetricsMiddleware(view, registry=Registry())
+
+        number: int = options['requests']
+        bare: dict = measure(lambda: view(request), repeat=options['repeat'], number=number)
+        wrapped: dict = measure(lambda: middleware(request), repeat=options['repeat'], number=number)
+        overhead: float = (wrapped['best'] - bare['best']) / number
+        self.stdout.write(f'{number} requests x {options["repeat"]} rounds')
+        self.stdout.write(f'  without middleware {format_seconds(bare["best"] / number):>10} per request')
+        self.stdout.write(f'  with middleware    {format_seconds(wrapped["best"] / number):>10} per request')
+        self.stdout.write(f'  overhead           {format_seconds(overhead):>10} per request')
@@ -0,0 +1,122 @@
+import random
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.benchmarks import format_seconds, percentile
+from store.models import Customer, Order, OrderItem, Product
+from store.pagination import OrderPagination
+from store.serializers import OrderHistorySerializer
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the customer order history endpoint for a customer with thousands of orders: walks every '
+            'page through the keyset cursors, checks that no query reads store_orderitem, then times the same pages '
+            'with the totals summed from the items as before. Runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--orders', type=int, default=5000, help='Orders of the benchmark customer')
+        parser.add_argument('--items', type=int, default=5, help='Items per order')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options) -> None:
+        products: list = list(Product.objects.order_by('id').values_list('id', 'unit_price')[:100])
+        if not products:
+            raise CommandError('No products, run generate_data first')
+        with transaction.atomic():
+            customer: Customer = self.create_customer(products, options)
+            staff: User = User.objects.create(username=f'bench-{uuid4().hex[:12]}', is_staff=True)
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+                urls: list = self.walk(customer, staff, options)
+            self.compare(customer, urls)
+            transaction.set_rollback(True)
+
+    def create_customer(self, products: list, options: dict) -> Customer:
+        rng = random.Random(options['seed'])
+        customer: Customer = Customer.objects.create(first_name='Bench', last_name='History', phone='0',
+                                                     email=f'bench-{uuid4().hex}@example.com')
+        started: float = time.perf_counter()
+        orders: list = Order.objects.bulk_create([Order(customer=customer) for _ in range(options['orders'])])
+        # placed_at is auto_now_add: spread the orders over time once they exist
+        now = timezone.now()
+        for index, order in enumerate(orders):
+            order.placed_at = now - timedelta(hours=index * 7 + rng.randint(0, 6))
+        Order.objects.bulk_update(orders, ['placed_at'], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=rng.randint(1, 5), unit_price=unit_price)
+            for order in orders
+            for product_id, unit_price in rng.sample(products, k=min(options['items'], len(products)))
+        ], batch_size=5000)
+        self.stdout.write(f'customer with {len(orders):,} orders x {options["items"]} items created in '
+                          f'{time.perf_counter() - started:.2f} s')
+        return customer
+
+    def walk(self, customer: Customer, staff: User, options: dict) -> list:
+        """
+        Follows the next links from the first page to the last, returns the URL of every page.
+        """
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(staff)
+        url: str | None = f'/customers/{customer.pk}/orders/?page_size={options["page_size"]}'
+        urls: list = []
+        timings: list = []
+        orders: int = 0
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                started: float = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: {response.status_code}')
+                urls.append(url)
+                data: dict = response.json()
+                orders += len(data['results'])
+                url = data['next']
+        if orders != options['orders']:
+            raise CommandError(f'{orders} orders listed, expected {options["orders"]}')
+        reading_items: list = [query['sql'] for query in queries.captured_queries
+                               if 'store_orderitem' in query['sql']]
+        if reading_items:
+            raise CommandError(f'the history read store_orderitem: {reading_items[0]}')
+        self.stdout.write(f'{len(urls)} pages over HTTP, none reading store_orderitem: '
+                          f'first {format_seconds(timings[0])}, last {format_seconds(timings[-1])}, '
+                          f'p50 {format_seconds(percentile(timings, 50))}, '
+                          f'p95 {format_seconds(percentile(timings, 95))}')
+        return urls
+
+    def compare(self, customer: Customer, urls: list) -> None:
+        """
+        Times the page queries alone, reading the maintained totals vs summing the items of each order.
+        """
+        line_total = ExpressionWrapper(F('orderitem__quantity') * F('orderitem__unit_price'),
+                                       output_field=DecimalField(max_digits=12, decimal_places=2))
+        fields: list = [name for name in OrderHistorySerializer.Meta.fields
+                        if name not in ('total_price', 'items_count')]
+        variants: dict = {
+            'maintained totals': Order.objects.filter(customer=customer).values(*OrderHistorySerializer.Meta.fields),
+            'summed from items': (Order.objects.filter(customer=customer).values(*fields)
+                                  .annotate(total_price=Sum(line_total), items_count=Sum('orderitem__quantity'))),
+        }
+        factory = APIRequestFactory()
+        for name, queryset in variants.items():
+            timings: list = []
+            for url in urls:
+                paginator = OrderPagination()
+                request = Request(factory.get(url))
+                started: float = time.perf_counter()
+                paginator.process_page(list(paginator.page_queryset(queryset, request)))
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f'  {name:<18} total {format_seconds(sum(timings)):>10}  '
+                              f'p50 {format_seconds(percentile(timings, 50)):>10}  '
+                              f'p95 {format_seconds(percentile(timings, 95)):>10} per page')
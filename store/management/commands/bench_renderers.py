@@ -0,0 +1,71 @@
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.benchmarks import format_seconds, measure, product_rows
+from store.renderers import MessagePackParser, MessagePackRenderer, ORJSONRenderer, msgpack
+from store.serializers import ProductReadSerializer
+from storefront.compression import BROTLI_QUALITY, brotli
+
+
+class Command(BaseCommand):
+    help = ('Renders and parses the same serialized product list in every format (DRF JSON, orjson, MessagePack '
+            'when msgpack is installed), checks that they carry the same data, then times the response '
+            'compressions (gzip, brotli when installed).')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options) -> None:
+        request = Request(APIRequestFactory().get('/'))
+        data: list = ProductReadSerializer(product_rows(options['rows'], options['seed']), many=True,
+                                           context={'request': request}).data
+        # format -> (renderer, parser of its own)
+        formats: dict = {
+            'json': (JSONRenderer(), JSONParser()),
+            'orjson': (ORJSONRenderer(), None),
+        }
+        if msgpack is not None:
+            formats['msgpack'] = (MessagePackRenderer(), MessagePackParser())
+        else:
+            self.stdout.write('msgpack is not installed, MessagePack skipped')
+
+        rendered: dict = {name: renderer.render(data) for name, (renderer, _) in formats.items()}
+        if rendered['orjson'] != rendered['json']:
+            raise CommandError('ORJSONRenderer output differs from JSONRenderer')
+        expected: list = json.loads(rendered['json'])
+        for name, (_, parser) in formats.items():
+            if parser is not None and parser.parse(io.BytesIO(rendered[name])) != expected:
+                raise CommandError(f'{name} does not parse back to the rendered data')
+
+        self.stdout.write(f'{len(data):,} products, {options["repeat"]} rounds (same data in every format)')
+        for name, (renderer, parser) in formats.items():
+            render = measure(lambda: renderer.render(data), repeat=options['repeat'])
+            line: str = (f'  {name:<8} {len(rendered[name]):>12,} bytes  '
+                         f'render {format_seconds(render["best"]):>10}')
+            if parser is not None:
+                parse = measure(lambda: parser.parse(io.BytesIO(rendered[name])), repeat=options['repeat'])
+                line += f'  parse {format_seconds(parse["best"]):>10}'
+            self.stdout.write(line)
+
+        # what CompressionMiddleware does to the JSON response
+        content: bytes = rendered['orjson']
+        codecs: dict = {'gzip': lambda: compress_string(content, max_random_bytes=100)}
+        if brotli is not None:
+            codecs[f'brotli {BROTLI_QUALITY}'] = lambda: brotli.compress(content, quality=BROTLI_QUALITY)
+        else:
+            self.stdout.write('brotli is not installed, brotli skipped')
+        self.stdout.write('compression of the JSON response')
+        for name, compress in codecs.items():
+            timing = measure(compress, repeat=options['repeat'])
+            size: int = len(compress())
+            self.stdout.write(f'  {name:<10} {size:>12,} bytes ({size / len(content):.0%})  '
+                              f'{format_seconds(timing["best"]):>10}')
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from store.benchmarks import format_seconds, measure
+from store.models import Product
+from store.pagination import KeysetPagination
+from store.search import get_backend, search_products
+from store.serializers import ProductReadSerializer
+
+DEFAULT_QUERIES: tuple = ('organic', 'organic bread', 'choc', 'sp', 'vanilla yogurt', 'golden cinnamon cookies')
+
+
+class Command(BaseCommand):
+    help = ('Measures full-text product search latency (first page, a deep page reached by keyset cursors) '
+            'against the icontains scan it replaces. Load data first, e.g. generate_data --scale 100 for 1M '
+            'products.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('queries', nargs='*', default=list(DEFAULT_QUERIES))
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--depth', type=int, default=10, help='Page number of the deep page')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options) -> None:
+        database: str = options['database']
+        products = Product.objects.using(database)
+        total: int = products.count()
+        if not total:
+            raise CommandError('No products, run generate_data first')
+        page_size: int = options['page_size']
+        rows = products.values(*ProductReadSerializer.values_fields)
+        self.stdout.write(f'{total:,} products, {type(get_backend(connections[database])).__name__}, '
+                          f'page size {page_size}, {options["repeat"]} rounds, best / median')
+
+        for query in options['queries']:
+            searched = search_products(rows, query).order_by('-rank', '-id')
+
+            def first_page() -> list:
+                return list(searched[:page_size])
+
+            # walk to the deep page once, then time fetching it from its cursor
+            deep = searched
+            page: list = first_page()
+            for _ in range(options['depth'] - 1):
+                if len(page) < page_size:
+                    break
+                cursor: dict = {'v': page[-1]['rank'], 'id': page[-1]['id']}
+                deep = searched.filter(KeysetPagination.seek_condition('rank', True, cursor))
+                page = list(deep[:page_size])
+
+            def deep_page() -> list:
+                return list(deep[:page_size])
+
+            terms: list = query.split()
+            scan = rows
+            for term in terms:
+                scan = scan.filter(Q(title__icontains=term) | Q(description__icontains=term))
+            scan = scan.order_by('-id')
+
+            def icontains_page() -> list:
+                return list(scan[:page_size])
+
+            matches: int = searched.count()
+            self.stdout.write(f'{query!r}: {matches:,} matches')
+            for name, fn in (('first page', first_page), (f'page {options["depth"]}', deep_page),
+                             ('icontains first page', icontains_page)):
+                timing: dict = measure(fn, repeat=options['repeat'])
+                self.stdout.write(f'  {name:<22} {format_seconds(timing["best"]):>10}  '
+                                  f'{format_seconds(timing["median"]):>10}')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.benchmarks import format_seconds, measure, product_rows
+from store.models import Product
+from store.serializers import ProductReadSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares ProductSerializer with the ProductReadSerializer fast path on in-memory rows.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options) -> None:
+        rows: list = product_rows(options['rows'], options['seed'])
+        products: list = [Product(**row) for row in rows]
+        request = Request(APIRequestFactory().get('/'))
+        context: dict = {'request': request}
+        renderer = JSONRenderer()
+
+        def model_path() -> bytes:
+            return renderer.render(ProductSerializer(products, many=True, context=context).data)
+
+        def read_path() -> bytes:
+            return renderer.render(ProductReadSerializer(rows, many=True, context=context).data)
+
+        if model_path() != read_path():
+            raise CommandError('ProductReadSerializer output differs from ProductSerializer')
+
+        self.stdout.write(f'{len(rows)} rows, serialize + render, {options["repeat"]} rounds (output identical)')
+        results: dict = {
+            'ProductSerializer': measure(model_path, repeat=options['repeat']),
+            'ProductReadSerializer': measure(read_path, repeat=options['repeat']),
+        }
+        for name, timing in results.items():
+            self.stdout.write(f'  {name:<24} best {format_seconds(timing["best"]):>10}  '
+                              f'median {format_seconds(timing["median"]):>10}')
+        speedup: float = results['ProductSerializer']['best'] / results['ProductReadSerializer']['best']
+        self.stdout.write(f'  speedup x{speedup:.1f}')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from store.benchmarks import format_seconds, measure
+from store.models import Product
+from tags.models import TaggedItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compares per-product TaggedItemManager.get_tags_for() calls with one get_tags_for_many() call for '
+            'pages of products, with and without the (content_type, object_id) index. Load data first, e.g. '
+            'generate_data --scale 4 for ~100k tagged items.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--without-index', action='store_true',
+                            help='Also measure with the index dropped (slow: every lookup scans the table)')
+
+    def handle(self, *args, **options) -> None:
+        tagged_items: int = TaggedItem.objects.count()
+        if not tagged_items:
+            raise CommandError('No tagged items, run generate_data first')
+        product_ids: list = list(Product.objects.order_by('-id').values_list('id', flat=True)
+                                 [:max(options['page_sizes'])])
+        self.stdout.write(f'{tagged_items:,} tagged items, {options["repeat"]} rounds, best / median')
+
+        self.run(product_ids, options, 'with index')
+        # measure again without the index, then put it back by rolling the DDL back
+        connection = connections[TaggedItem.objects.db]
+        if not options['without_index'] or not connection.features.can_rollback_ddl:
+            return
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for index in TaggedItem._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                self.run(product_ids, options, 'without index')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, product_ids: list, options: dict, label: str) -> None:
+        self.stdout.write(label)
+        for page_size in options['page_sizes']:
+            page: list = product_ids[:page_size]
+
+            def one_by_one() -> dict:
+                return {pk: [item.tag for item in TaggedItem.objects.get_tags_for(Product, pk)] for pk in page}
+
+            def batched() -> dict:
+                return TaggedItem.objects.get_tags_for_many(Product, page)
+
+            slow: dict = measure(one_by_one, repeat=options['repeat'])
+            fast: dict = measure(batched, repeat=options['repeat'])
+            self.stdout.write(
+                f'  {page_size:>5} products  get_tags_for x{page_size:<5} {format_seconds(slow["best"]):>10} '
+                f'{format_seconds(slow["median"]):>10}  get_tags_for_many {format_seconds(fast["best"]):>10} '
+                f'{format_seconds(fast["median"]):>10}  x{slow["best"] / fast["best"]:.1f}')
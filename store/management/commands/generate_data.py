@@ -0,0 +1,474 @@
+import io
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, models, transaction
+
+from likes.models import LikeCounter, LikedItem
+from store.models import (Address, Cart, CartItem, Collection, Customer, DailyCollectionSales, DailyProductSales,
+                          DailySales, Order, OrderItem, Product, Promotion, RollupWatermark)
+from store.pricing import final_price
+from store.search import get_backend
+from tags.models import Tag, TaggedItem
+
+# Row counts at --scale 1, everything else is derived from these
+BASE_COUNTS: dict = {
+    'users': 1_000,
+    'collections': 20,
+    'promotions': 30,
+    'products': 10_000,
+    'customers': 5_000,
+    'orders': 20_000,  # ~5 OrderItems each: --scale 200 gives ~20M OrderItems
+    'carts': 2_000,
+    'tags': 100,
+}
+
+# Fixed reference point so the same seed always produces the same rows
+EPOCH: datetime = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+WORDS: tuple = (
+    'organic', 'fresh', 'classic', 'premium', 'spicy', 'sweet', 'crunchy', 'smoked', 'roasted', 'wild',
+    'golden', 'dark', 'light', 'mini', 'family', 'deluxe', 'original', 'herbal', 'tropical', 'rustic',
+    'apple', 'berry', 'cheddar', 'cocoa', 'coffee', 'garlic', 'ginger', 'honey', 'lemon', 'mango',
+    'mint', 'olive', 'pepper', 'salmon', 'tomato', 'vanilla', 'walnut', 'basil', 'cinnamon', 'coconut',
+)
+NOUNS: tuple = (
+    'bread', 'biscuits', 'cereal', 'chips', 'cookies', 'crackers', 'juice', 'muffins', 'noodles', 'pasta',
+    'sauce', 'soup', 'spread', 'tea', 'yogurt', 'shampoo', 'soap', 'candle', 'notebook', 'toy',
+)
+COLLECTION_TITLES: tuple = (
+    'Grocery', 'Beauty', 'Cleaning', 'Stationary', 'Pets', 'Baking', 'Spices', 'Toys', 'Magazines', 'Drinks',
+    'Frozen', 'Bakery', 'Dairy', 'Snacks', 'Produce', 'Household', 'Garden', 'Health', 'Baby', 'Deli',
+)
+FIRST_NAMES: tuple = (
+    'Ava', 'Liam', 'Noah', 'Emma', 'Olivia', 'Mia', 'Lucas', 'Amir', 'Sofia', 'Yusuf', 'Hana', 'Leo',
+    'Zara', 'Ethan', 'Isla', 'Omar', 'Nora', 'Kai', 'Maya', 'Ivan', 'Aisha', 'Mateo', 'Chloe', 'Arjun',
+)
+LAST_NAMES: tuple = (
+    'Smith', 'Khan', 'Garcia', 'Chen', 'Ahmed', 'Rossi', 'Kowalski', 'Nguyen', 'Silva', 'Haddad',
+    'Murphy', 'Ivanova', 'Tanaka', 'Okafor', 'Larsen', 'Costa', 'Novak', 'Ali', 'Fischer', 'Moreau',
+)
+CITIES: tuple = ('Dhaka', 'Toronto', 'Berlin', 'Lagos', 'Osaka', 'Lisbon', 'Austin', 'Dublin', 'Sydney', 'Pune')
+STREETS: tuple = ('Main St', 'Oak Ave', 'Lake Rd', 'Hill St', 'Park Ln', 'River Rd', 'Elm St', 'King St')
+TAG_WORDS: tuple = ('sale', 'new', 'bestseller', 'vegan', 'gluten-free', 'local', 'imported', 'gift', 'eco', 'kids')
+
+
+class Loader:
+    """
+    Inserts rows into a table as fast as the backend allows and drops / rebuilds the secondary indexes around
+    the load.
+    """
+    batch_size: int = 10_000
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def load(self, table: str, columns: list, rows: Iterable) -> int:
+        raise NotImplementedError
+
+    def drop_indexes(self, table: str) -> list:
+        raise NotImplementedError
+
+    def create_indexes(self, definitions: list) -> None:
+        with self.connection.cursor() as cursor:
+            for sql in definitions:
+                cursor.execute(sql)
+
+    def analyze(self, tables: list) -> None:
+        with self.connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'ANALYZE {self.connection.ops.quote_name(table)}')
+
+
+class SQLiteLoader(Loader):
+    """
+    Batched executemany() in one transaction, with fsyncs turned off for the connection.
+    """
+
+    def load(self, table: str, columns: list, rows: Iterable) -> int:
+        quote = self.connection.ops.quote_name
+        sql: str = (f'INSERT INTO {quote(table)} ({", ".join(quote(column) for column in columns)}) '
+                    f'VALUES ({", ".join("?" for _ in columns)})')
+        count: int = 0
+        raw = self.connection.connection
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            raw.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    def drop_indexes(self, table: str) -> list:
+        with self.connection.cursor() as cursor:
+            # indexes backing PRIMARY KEY / UNIQUE constraints have no sql and stay. Triggers (the full-text
+            # index sync) go too, the search index is rebuilt in one pass after the load.
+            cursor.execute("SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                           "AND tbl_name = %s AND sql IS NOT NULL", [table])
+            indexes: list = [(kind, name, sql) for kind, name, sql in cursor.fetchall()]
+            for kind, name, _ in indexes:
+                cursor.execute(f'DROP {kind.upper()} {self.connection.ops.quote_name(name)}')
+        return [sql for _, _, sql in indexes]
+
+    def tune(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.execute('PRAGMA temp_store = MEMORY')
+
+
+class PostgresLoader(Loader):
+    """
+    COPY ... FROM STDIN fed by a generator, with psycopg2 (copy_expert) or psycopg 3 (cursor.copy).
+    """
+
+    def load(self, table: str, columns: list, rows: Iterable) -> int:
+        quote = self.connection.ops.quote_name
+        sql: str = f'COPY {quote(table)} ({", ".join(quote(column) for column in columns)}) FROM STDIN'
+        counter: list = [0]
+
+        def counted(rows: Iterable) -> Iterator:
+            for row in rows:
+                counter[0] += 1
+                yield row
+
+        with self.connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(sql, CopyStream(counted(rows)), size=1 << 16)
+            else:
+                with raw.copy(sql) as copy:
+                    for row in counted(rows):
+                        copy.write_row(row)
+        return counter[0]
+
+    def drop_indexes(self, table: str) -> list:
+        with self.connection.cursor() as cursor:
+            # indexes backing PRIMARY KEY / UNIQUE constraints stay
+            cursor.execute("""
+                SELECT i.relname, pg_get_indexdef(i.oid)
+                FROM pg_index x
+                JOIN pg_class i ON i.oid = x.indexrelid
+                JOIN pg_class t ON t.oid = x.indrelid
+                WHERE t.relname = %s
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)
+            """, [table])
+            indexes: list = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX {self.connection.ops.quote_name(name)}')
+        return [sql for _, sql in indexes]
+
+    def tune(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute('SET synchronous_commit = off')
+            cursor.execute("SET maintenance_work_mem = '512MB'")
+
+
+class CopyStream(io.RawIOBase):
+    """
+    Readable file over a row generator, encoded in COPY text format, for psycopg2's copy_expert().
+    """
+
+    def __init__(self, rows: Iterator) -> None:
+        self.rows = rows
+        self.buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    @staticmethod
+    def encode(value) -> str:
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+    def readinto(self, buffer) -> int:
+        encode = self.encode
+        while len(self.buffer) < len(buffer):
+            lines: list = ['\t'.join(map(encode, row)) for row in islice(self.rows, 1000)]
+            if not lines:
+                break
+            self.buffer += ('\n'.join(lines) + '\n').encode('utf-8')
+        size: int = min(len(buffer), len(self.buffer))
+        buffer[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class Command(BaseCommand):
+    help = ('Generates deterministic synthetic data for the store, tags and likes apps at a configurable scale '
+            'and bulk loads it (COPY on PostgreSQL, batched executemany on SQLite).')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplier for the base row counts (1 = 10k products, ~100k order items)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete the existing store, tags and likes rows first, otherwise the rows are '
+                                 'added after the existing ones')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Do not drop and rebuild the secondary indexes around the load')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options) -> None:
+        self.connection = connections[options['database']]
+        self.seed: int = options['seed']
+        self.counts: dict = {name: max(1, int(count * options['scale'])) for name, count in BASE_COUNTS.items()}
+        loaders: dict = {'sqlite': SQLiteLoader, 'postgresql': PostgresLoader}
+        if self.connection.vendor not in loaders:
+            raise CommandError(f'Unsupported database backend: {self.connection.vendor}')
+        self.loader: Loader = loaders[self.connection.vendor](self.connection)
+
+        if options['flush']:
+            self.flush()
+        self.start_ids: dict = {}
+        self.product_prices: list = []
+
+        self.product_type_id: int = ContentType.objects.db_manager(options['database']).get_for_model(Product).id
+        plan: list = self.plan()
+        tables: list = [model._meta.db_table for model, _, _ in plan]
+        total_started: float = time.perf_counter()
+        total_rows: int = 0
+
+        self.loader.tune()
+        with transaction.atomic(using=options['database']):
+            dropped: list = []
+            if not options['keep_indexes']:
+                for table in tables:
+                    dropped += self.loader.drop_indexes(table)
+
+            for model, columns, rows in plan:
+                started: float = time.perf_counter()
+                count: int = self.loader.load(model._meta.db_table, columns, rows())
+                elapsed: float = time.perf_counter() - started
+                total_rows += count
+                self.stdout.write(f'{model._meta.db_table:<28} {count:>12,} rows  {elapsed:8.2f} s  '
+                                  f'{count / elapsed if elapsed else 0:>12,.0f} rows/s')
+
+            if dropped:
+                started: float = time.perf_counter()
+                self.loader.create_indexes(dropped)
+                get_backend(self.connection).rebuild(self.connection)
+                self.stdout.write(f'rebuilt {len(dropped)} indexes in {time.perf_counter() - started:.2f} s')
+            self.reset_sequences([model for model, _, _ in plan])
+
+        self.loader.analyze(tables)
+        call_command('repair_counters', database=options['database'], stdout=self.stdout)
+        call_command('rollup_sales', rebuild=True, lag=0, database=options['database'], stdout=self.stdout)
+        elapsed: float = time.perf_counter() - total_started
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_rows:,} rows in {elapsed:.2f} s ({total_rows / elapsed:,.0f} rows/s)'))
+
+    # region Helpers
+    def flush(self) -> None:
+        models_to_flush: list = [DailySales, DailyCollectionSales, DailyProductSales, RollupWatermark, LikeCounter,
+                                 LikedItem, TaggedItem, Tag, CartItem, Cart, OrderItem, Order, Address, Customer,
+                                 Product.promotions.through, Collection, Product, Promotion]
+        quote = self.connection.ops.quote_name
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            # featured_product and collection reference each other
+            cursor.execute(f'UPDATE {quote(Collection._meta.db_table)} SET '
+                           f'{quote(Collection._meta.get_field("featured_product").column)} = NULL')
+            for model in models_to_flush:
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+
+    def next_id(self, model) -> int:
+        last = model._base_manager.using(self.connection.alias).aggregate(last=models.Max('pk'))['last']
+        return (last or 0) + 1
+
+    def reset_sequences(self, models_to_reset: list) -> None:
+        statements: list = self.connection.ops.sequence_reset_sql(no_style(), models_to_reset)
+        with self.connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def rng(self, name: str) -> random.Random:
+        # one independent stream per table: changing one generator never shifts the rows of another
+        return random.Random(f'{self.seed}:{name}')
+
+    def columns(self, model, *names: str) -> list:
+        return [model._meta.get_field(name).column for name in names]
+
+    def datetime(self, value: datetime):
+        return self.connection.ops.adapt_datetimefield_value(value)
+
+    def uuid(self, value: uuid.UUID):
+        return Cart._meta.pk.get_db_prep_value(value, self.connection)
+
+    def ids(self, model, count: int) -> range:
+        start: int = self.next_id(model)
+        self.start_ids[model] = start
+        return range(start, start + count)
+    # endregion
+
+    def plan(self) -> list:
+        """
+        (model, columns, row generator) in foreign key order. Ids are assigned here, so every generator can
+        reference the rows of the tables before it without reading them back.
+        """
+        counts: dict = self.counts
+        self.user_ids: range = self.ids(User, counts['users'])
+        self.collection_ids: range = self.ids(Collection, counts['collections'])
+        self.promotion_ids: range = self.ids(Promotion, counts['promotions'])
+        self.product_ids: range = self.ids(Product, counts['products'])
+        self.customer_ids: range = self.ids(Customer, counts['customers'])
+        self.address_ids: range = self.ids(Address, counts['customers'])
+        self.order_ids: range = self.ids(Order, counts['orders'])
+        self.order_item_start: int = self.next_id(OrderItem)
+        self.cart_item_start: int = self.next_id(CartItem)
+        # carts have random UUID keys, drawn from the seeded generator to stay deterministic. The stream starts from
+        # where the ids of the database are, so loading again without --flush draws other keys.
+        rng = self.rng(f'cart_ids:{self.cart_item_start}')
+        self.cart_ids: list = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(counts['carts'])]
+        self.tag_ids: range = self.ids(Tag, counts['tags'])
+        self.tagged_item_start: int = self.next_id(TaggedItem)
+        self.liked_item_start: int = self.next_id(LikedItem)
+
+        return [
+            (User, self.columns(User, 'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+                                'email', 'is_staff', 'is_active', 'date_joined'), self.users),
+            (Collection, self.columns(Collection, 'id', 'title', 'last_update', 'products_count'),
+             self.collections),
+            (Promotion, self.columns(Promotion, 'id', 'description', 'discount'), self.promotions),
+            (Product, self.columns(Product, 'id', 'title', 'slug', 'description', 'unit_price', 'final_price',
+                                   'inventory', 'last_update', 'collection'), self.products),
+            (Product.promotions.through, ['product_id', 'promotion_id'], self.product_promotions),
+            (Customer, self.columns(Customer, 'id', 'first_name', 'last_name', 'email', 'phone', 'birth_date',
+                                    'membership', 'orders_count'), self.customers),
+            (Address, self.columns(Address, 'id', 'street', 'city', 'customer'), self.addresses),
+            (Order, self.columns(Order, 'id', 'placed_at', 'last_update', 'payment_status', 'customer',
+                                 'total_price', 'items_count'), self.orders),
+            (OrderItem, self.columns(OrderItem, 'id', 'order', 'product', 'quantity', 'unit_price'),
+             self.order_items),
+            (Cart, self.columns(Cart, 'id', 'created_at'), self.carts),
+            (CartItem, self.columns(CartItem, 'id', 'cart', 'product', 'quantity'), self.cart_items),
+            (Tag, self.columns(Tag, 'id', 'label'), self.tags),
+            (TaggedItem, self.columns(TaggedItem, 'id', 'tag', 'content_type', 'object_id'), self.tagged_items),
+            (LikedItem, self.columns(LikedItem, 'id', 'user', 'content_type', 'object_id'), self.liked_items),
+        ]
+
+    # region Row generators
+    def users(self) -> Iterator[tuple]:
+        rng = self.rng('users')
+        joined = self.datetime(EPOCH - timedelta(days=1000))
+        for pk in self.user_ids:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            # '!' is Django's unusable password marker
+            yield (pk, '!', False, f'shopper{pk}', first, last, f'shopper{pk}@example.com', False, True, joined)
+
+    def collections(self) -> Iterator[tuple]:
+        now = self.datetime(EPOCH)
+        for index, pk in enumerate(self.collection_ids):
+            title: str = COLLECTION_TITLES[index % len(COLLECTION_TITLES)]
+            if index >= len(COLLECTION_TITLES):
+                title = f'{title} {index // len(COLLECTION_TITLES) + 1}'
+            # products_count is recounted by repair_counters once everything is loaded
+            yield pk, title, now, 0
+
+    def promotions(self) -> Iterator[tuple]:
+        rng = self.rng('promotions')
+        for pk in self.promotion_ids:
+            discount: float = rng.choice((0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.5))
+            yield pk, f'{int(discount * 100)}% off {rng.choice(NOUNS)}', discount
+
+    def products(self) -> Iterator[tuple]:
+        rng = self.rng('products')
+        prices: list = self.product_prices
+        for pk in self.product_ids:
+            words: list = [rng.choice(WORDS), rng.choice(WORDS), rng.choice(NOUNS)]
+            title: str = ' '.join(words).title()
+            description: str | None = None if rng.random() < 0.1 else ' '.join(rng.choices(WORDS + NOUNS, k=12))
+            price: Decimal = Decimal(rng.randint(100, 99_999)) / 100
+            prices.append(price)
+            updated = self.datetime(EPOCH - timedelta(seconds=rng.randint(0, 365 * 86400)))
+            # without promotions: repair_counters reprices the promoted products once they are linked
+            yield (pk, title, f'{"-".join(words)}-{pk}', description, price, final_price(price),
+                   rng.randint(0, 150), updated, rng.choice(self.collection_ids))
+
+    def product_promotions(self) -> Iterator[tuple]:
+        rng = self.rng('product_promotions')
+        for pk in self.product_ids:
+            if rng.random() < 0.05:
+                for promotion_id in rng.sample(self.promotion_ids, k=min(rng.randint(1, 2), len(self.promotion_ids))):
+                    yield pk, promotion_id
+
+    def customers(self) -> Iterator[tuple]:
+        rng = self.rng('customers')
+        for pk in self.customer_ids:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            birth_date = None if rng.random() < 0.3 else self.connection.ops.adapt_datefield_value(
+                (EPOCH - timedelta(days=rng.randint(18 * 365, 80 * 365))).date())
+            # orders_count is recounted by repair_counters once the orders are loaded
+            yield (pk, first, last, f'{first}.{last}.{pk}@example.com'.lower(),
+                   f'+1-{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}', birth_date,
+                   rng.choices('BSG', weights=(80, 15, 5))[0], 0)
+
+    def addresses(self) -> Iterator[tuple]:
+        rng = self.rng('addresses')
+        for pk, customer_id in zip(self.address_ids, self.customer_ids):
+            yield pk, f'{rng.randint(1, 999)} {rng.choice(STREETS)}', rng.choice(CITIES), customer_id
+
+    def orders(self) -> Iterator[tuple]:
+        rng = self.rng('orders')
+        for pk in self.order_ids:
+            placed_at = self.datetime(EPOCH - timedelta(seconds=rng.randint(0, 2 * 365 * 86400)))
+            # the totals are computed by repair_counters once the items are loaded
+            yield (pk, placed_at, placed_at, rng.choices('CPF', weights=(85, 10, 5))[0], rng.choice(self.customer_ids),
+                   0, 0)
+
+    def order_items(self) -> Iterator[tuple]:
+        rng = self.rng('order_items')
+        prices: list = self.product_prices
+        first_product: int = self.product_ids.start
+        pk: int = self.order_item_start
+        for order_id in self.order_ids:
+            for product_id in rng.sample(self.product_ids, k=min(rng.randint(1, 9), len(self.product_ids))):
+                yield pk, order_id, product_id, rng.randint(1, 5), prices[product_id - first_product]
+                pk += 1
+
+    def carts(self) -> Iterator[tuple]:
+        rng = self.rng('carts')
+        for pk in self.cart_ids:
+            yield self.uuid(pk), self.datetime(EPOCH - timedelta(seconds=rng.randint(0, 30 * 86400)))
+
+    def cart_items(self) -> Iterator[tuple]:
+        rng = self.rng('cart_items')
+        pk: int = self.cart_item_start
+        for cart_id in self.cart_ids:
+            cart_id = self.uuid(cart_id)
+            for product_id in rng.sample(self.product_ids, k=min(rng.randint(0, 6), len(self.product_ids))):
+                yield pk, cart_id, product_id, rng.randint(1, 4)
+                pk += 1
+
+    def tags(self) -> Iterator[tuple]:
+        for index, pk in enumerate(self.tag_ids):
+            label: str = TAG_WORDS[index % len(TAG_WORDS)]
+            yield pk, label if index < len(TAG_WORDS) else f'{label}-{index // len(TAG_WORDS)}'
+
+    def tagged_items(self) -> Iterator[tuple]:
+        rng = self.rng('tagged_items')
+        pk: int = self.tagged_item_start
+        for product_id in self.product_ids:
+            for tag_id in rng.sample(self.tag_ids, k=min(rng.randint(0, 5), len(self.tag_ids))):
+                yield pk, tag_id, self.product_type_id, product_id
+                pk += 1
+
+    def liked_items(self) -> Iterator[tuple]:
+        rng = self.rng('liked_items')
+        pk: int = self.liked_item_start
+        for user_id in self.user_ids:
+            # distinct products per user, likes are unique per (user, object)
+            for product_id in rng.sample(self.product_ids, k=min(rng.randint(0, 40), len(self.product_ids))):
+                yield pk, user_id, self.product_type_id, product_id
+                pk += 1
+    # endregion
@@ -0,0 +1,123 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from likes.models import LikeCounter, LikedItem
+from store.models import Collection, Customer, Order, Product
+from store.pricing import final_price_expression
+
+
+def repair_collection_products_count(database: str, dry_run: bool) -> int:
+    counts = (Product.objects.using(database)
+              .filter(collection=OuterRef('pk'))
+              .order_by()
+              .values('collection')
+              .annotate(count=Count('pk'))
+              .values('count'))
+    drifted = (Collection.objects.using(database)
+               .annotate(actual=Coalesce(Subquery(counts), 0))
+               .exclude(products_count=F('actual')))
+    found: int = drifted.count()
+    if found and not dry_run:
+        Collection.objects.using(database).filter(pk__in=drifted.values('pk')).update(
+            products_count=Coalesce(Subquery(counts), 0))
+    return found
+
+
+def repair_customer_orders_count(database: str, dry_run: bool) -> int:
+    counts = (Order.objects.using(database)
+              .filter(customer=OuterRef('pk'))
+              .order_by()
+              .values('customer')
+              .annotate(count=Count('pk'))
+              .values('count'))
+    drifted = (Customer.objects.using(database)
+               .annotate(actual=Coalesce(Subquery(counts), 0))
+               .exclude(orders_count=F('actual')))
+    found: int = drifted.count()
+    if found and not dry_run:
+        Customer.objects.using(database).filter(pk__in=drifted.values('pk')).update(
+            orders_count=Coalesce(Subquery(counts), 0))
+    return found
+
+
+def repair_product_final_prices(database: str, dry_run: bool) -> int:
+    final_price = final_price_expression(Product)
+    drifted = (Product.objects.using(database)
+               .alias(actual=final_price)
+               .exclude(final_price=F('actual')))
+    found: int = drifted.count()
+    if found and not dry_run:
+        Product.objects.using(database).filter(pk__in=drifted.values('pk')).update(final_price=final_price)
+    return found
+
+
+def repair_order_totals(database: str, dry_run: bool) -> int:
+    totals: dict = Order.objects.totals_from_items()
+    drifted = (Order.objects.using(database)
+               .alias(actual_total_price=totals['total_price'], actual_items_count=totals['items_count'])
+               .filter(~Q(total_price=F('actual_total_price')) | ~Q(items_count=F('actual_items_count'))))
+    found: int = drifted.count()
+    if found and not dry_run:
+        Order.objects.using(database).filter(pk__in=drifted.values('pk')).refresh_totals()
+    return found
+
+
+def repair_like_counters(database: str, dry_run: bool) -> int:
+    likes = (LikedItem.objects.using(database)
+             .filter(content_type=OuterRef('content_type'), object_id=OuterRef('object_id'))
+             .order_by()
+             .values('content_type')
+             .annotate(count=Count('pk'))
+             .values('count'))
+    drifted = (LikeCounter.objects.using(database)
+               .annotate(actual=Coalesce(Subquery(likes), 0))
+               .exclude(count=F('actual')))
+    # liked objects without a counter row at all
+    missing = (LikedItem.objects.using(database)
+               .exclude(Exists(LikeCounter.objects.using(database).filter(content_type=OuterRef('content_type'),
+                                                                          object_id=OuterRef('object_id'))))
+               .order_by()
+               .values_list('content_type', 'object_id')
+               .annotate(count=Count('pk')))
+    found: int = drifted.count()
+    if dry_run:
+        return found + missing.count()
+    if found:
+        LikeCounter.objects.using(database).filter(pk__in=drifted.values('pk')).update(
+            count=Coalesce(Subquery(likes), 0))
+    created: list = LikeCounter.objects.using(database).bulk_create(
+        [LikeCounter(content_type_id=content_type_id, object_id=object_id, count=count)
+         for content_type_id, object_id, count in missing],
+        batch_size=5000)
+    return found + len(created)
+
+
+class Command(BaseCommand):
+    help = 'Recounts the denormalized counters and repairs the rows that drifted.'
+
+    # counter name -> function(database, dry_run) returning the number of drifted rows
+    repairers: dict = {
+        'collection.products_count': repair_collection_products_count,
+        'product.final_price': repair_product_final_prices,
+        'order.totals': repair_order_totals,
+        'customer.orders_count': repair_customer_orders_count,
+        'likes.likecounter': repair_like_counters,
+    }
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('counters', nargs='*', metavar='counter',
+                            help=f'Counters to repair (default: all): {", ".join(self.repairers)}')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted rows')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options) -> None:
+        unknown: set = set(options['counters']) - set(self.repairers)
+        if unknown:
+            raise CommandError(f'Unknown counters: {", ".join(sorted(unknown))}')
+        for name in options['counters'] or self.repairers:
+            with transaction.atomic(using=options['database']):
+                drifted: int = self.repairers[name](options['database'], options['dry_run'])
+            verb: str = 'found' if options['dry_run'] else 'repaired'
+            self.stdout.write(f'{name}: {drifted} drifted rows {verb}')
@@ -0,0 +1,185 @@
+import json
+import platform
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import Resolver404, resolve
+
+from store.benchmarks import percentile
+from store.cache import list_cache
+
+DEFAULT_LOG: Path = Path(settings.BASE_DIR) / 'benchmarks' / 'store_requests.jsonl'
+
+
+class Command(BaseCommand):
+    help = ('Replays a JSONL request log against the API in-process and reports latency percentiles, throughput, '
+            'SQL query count and response bytes per endpoint. Each log line is an object with "method", "path" '
+            '(query string included) and optionally "body" (JSON) and "headers".')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('log', nargs='?', default=str(DEFAULT_LOG), help=f'Request log (default: {DEFAULT_LOG})')
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of client threads')
+        parser.add_argument('--repeat', type=int, default=10, help='How many times every thread replays the log')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed passes over the log before measuring')
+        parser.add_argument('--clear-cache', action='store_true', help='Invalidate the list cache before the run')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a results file written by an earlier run')
+        parser.add_argument('--max-regression', type=float, default=None,
+                            help='Fail when an endpoint p95 is more than this many percent above the baseline')
+
+    def handle(self, *args, **options) -> None:
+        # Measure what production runs: DEBUG off also keeps the debug toolbar out of the way
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            self.run(options)
+
+    def run(self, options: dict) -> None:
+        entries: list = self.read_log(Path(options['log']))
+        if options['clear_cache']:
+            list_cache.invalidate(*{'product', 'collection', 'promotion'})
+
+        for _ in range(options['warmup']):
+            self.replay(Client(**self.client_defaults()), entries, defaultdict(list))
+
+        samples: dict = defaultdict(list)  # endpoint -> [(seconds, queries, bytes, status)]
+        lock = threading.Lock()
+
+        def worker() -> None:
+            client = Client(**self.client_defaults())
+            local: dict = defaultdict(list)
+            try:
+                for _ in range(options['repeat']):
+                    self.replay(client, entries, local)
+            finally:
+                connections.close_all()
+            with lock:
+                for endpoint, values in local.items():
+                    samples[endpoint] += values
+
+        threads: list = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        started: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall: float = time.perf_counter() - started
+
+        results: dict = self.summarize(samples, wall, options)
+        self.print_results(results)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'results written to {options["output"]}')
+        if options['baseline']:
+            baseline: dict = json.loads(Path(options['baseline']).read_text())
+            regressions: list = self.compare(baseline, results, options['max_regression'])
+            if regressions:
+                raise CommandError('p95 regressions: ' + ', '.join(regressions))
+
+    # region Replay
+    @staticmethod
+    def client_defaults() -> dict:
+        return {'HTTP_HOST': 'localhost'}
+
+    @staticmethod
+    def read_log(path: Path) -> list:
+        if not path.exists():
+            raise CommandError(f'Request log not found: {path}')
+        entries: list = []
+        for number, line in enumerate(path.read_text().splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                entry: dict = json.loads(line)
+                method: str = entry.get('method', 'GET').upper()
+                path_and_query: str = entry['path']
+            except (ValueError, KeyError, AttributeError):
+                raise CommandError(f'{path}:{number}: expected an object with at least a "path"')
+            try:
+                view_name: str = resolve(path_and_query.split('?', 1)[0]).view_name
+            except Resolver404:
+                raise CommandError(f'{path}:{number}: {path_and_query} does not resolve')
+            headers: dict = {f'HTTP_{name.upper().replace("-", "_")}': value
+                             for name, value in entry.get('headers', {}).items()}
+            entries.append((f'{method} {view_name}', method, path_and_query, entry.get('body'), headers))
+        if not entries:
+            raise CommandError(f'{path} has no requests')
+        return entries
+
+    @staticmethod
+    def replay(client: Client, entries: list, samples: dict) -> None:
+        for endpoint, method, path, body, headers in entries:
+            kwargs: dict = dict(headers)
+            if body is not None:
+                kwargs.update(data=json.dumps(body), content_type='application/json')
+            with CaptureQueriesContext(connection) as queries:
+                started: float = time.perf_counter()
+                response = client.generic(method, path, **kwargs)
+                if response.streaming:
+                    size: int = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size: int = len(response.content)
+                elapsed: float = time.perf_counter() - started
+            samples[endpoint].append((elapsed, len(queries), size, response.status_code))
+    # endregion
+
+    # region Reporting
+    @staticmethod
+    def summarize(samples: dict, wall: float, options: dict) -> dict:
+        endpoints: dict = {}
+        for endpoint, values in sorted(samples.items()):
+            latencies: list = [value[0] for value in values]
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': sum(1 for value in values if value[3] >= 500),
+                'p50_ms': round(percentile(latencies, 50) * 1e3, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1e3, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1e3, 3),
+                'throughput_rps': round(len(values) / wall, 1),
+                'queries_avg': round(sum(value[1] for value in values) / len(values), 2),
+                'bytes_avg': round(sum(value[2] for value in values) / len(values)),
+            }
+        total: int = sum(len(values) for values in samples.values())
+        return {
+            'meta': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'concurrency': options['concurrency'],
+                'repeat': options['repeat'],
+                'log': str(options['log']),
+            },
+            'total': {'requests': total, 'seconds': round(wall, 3), 'throughput_rps': round(total / wall, 1)},
+            'endpoints': endpoints,
+        }
+
+    def print_results(self, results: dict) -> None:
+        self.stdout.write(f'{"endpoint":<42} {"reqs":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                          f'{"req/s":>8} {"queries":>8} {"bytes":>8}')
+        for endpoint, stats in results['endpoints'].items():
+            self.stdout.write(f'{endpoint:<42} {stats["requests"]:>6} {stats["p50_ms"]:>8.2f} '
+                              f'{stats["p95_ms"]:>8.2f} {stats["p99_ms"]:>8.2f} {stats["throughput_rps"]:>8.1f} '
+                              f'{stats["queries_avg"]:>8.2f} {stats["bytes_avg"]:>8}')
+        total: dict = results['total']
+        self.stdout.write(f'{total["requests"]} requests in {total["seconds"]} s ({total["throughput_rps"]} req/s)')
+
+    def compare(self, baseline: dict, results: dict, max_regression: float | None) -> list:
+        regressions: list = []
+        self.stdout.write(f'\n{"endpoint":<42} {"p95 ms":>18} {"queries":>14} {"bytes":>18}')
+        for endpoint, stats in results['endpoints'].items():
+            before: dict | None = baseline.get('endpoints', {}).get(endpoint)
+            if before is None:
+                self.stdout.write(f'{endpoint:<42} (new)')
+                continue
+            change: float = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            self.stdout.write(f'{endpoint:<42} {before["p95_ms"]:>7.2f} → {stats["p95_ms"]:<7.2f}'
+                              f'{change:+6.0f}% {before["queries_avg"]:>5} → {stats["queries_avg"]:<5} '
+                              f'{before["bytes_avg"]:>7} → {stats["bytes_avg"]:<7}')
+            if max_regression is not None and change > max_regression:
+                regressions.append(f'{endpoint} {change:+.0f}%')
+        return regressions
+    # endregion
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store import rollups
+
+
+class Command(BaseCommand):
+    help = ('Updates the daily sales rollups (see store.rollups) with the orders changed since the last run, '
+            'or rebuilds them from scratch (--rebuild). --check compares them with the raw order tables.')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every day')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the raw tables, exits with an error on mismatches')
+        parser.add_argument('--start', help='First day (YYYY-MM-DD) compared by --check')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD) compared by --check')
+        parser.add_argument('--lag', type=float, default=60,
+                            help='Seconds before now where the run stops, longer than any order transaction')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options) -> None:
+        database: str = options['database']
+        started: float = time.perf_counter()
+        if options['check']:
+            self.check_rollups(options)
+        elif options['rebuild']:
+            written: int = rollups.rebuild(database, options['lag'])
+            self.stdout.write(f'rebuilt: {written:,} rollup rows in {time.perf_counter() - started:.2f} s')
+        else:
+            days, written = rollups.update(database, options['lag'])
+            self.stdout.write(f'{len(days)} days recomputed, {written:,} rollup rows in '
+                              f'{time.perf_counter() - started:.2f} s')
+        self.stdout.write(f'watermark: {rollups.get_watermark(database)}')
+
+    def check_rollups(self, options: dict) -> None:
+        bounds: dict = {}
+        for name in ('start', 'end'):
+            if options[name] is not None:
+                bounds[name] = parse_date(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f'--{name} must be a YYYY-MM-DD date')
+        mismatches: dict = rollups.check(**bounds, using=options['database'])
+        for model, rows in mismatches.items():
+            self.stdout.write(f'{model._meta.db_table}: {len(rows)} mismatched rows')
+            for key, stored, expected in rows[:5]:
+                self.stdout.write(f'  {key}: stored {self.totals(stored)}, expected {self.totals(expected)}')
+        if any(mismatches.values()):
+            raise CommandError('The rollups differ from the raw tables, run rollup_sales (--rebuild)')
+        self.stdout.write(self.style.SUCCESS('The rollups match the raw tables'))
+
+    @staticmethod
+    def totals(row: dict | None) -> str:
+        if row is None:
+            return 'nothing'
+        return f'{row["revenue"]} revenue, {row["units"]} units, {row["orders_count"]} orders'
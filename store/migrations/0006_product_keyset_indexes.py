@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:21
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_auto_20210625_1631'),
+    ]
+
+    operations = [
+        # state only: the field options (blank, validators, related_name) changed since 0005 without a migration
+        # of their own. They are recorded here and leave the tables as they are.
+        migrations.AlterField(
+            model_name='collection',
+            name='featured_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.product'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='birth_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='description',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='inventory',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='promotions',
+            field=models.ManyToManyField(blank=True, to='store.promotion'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=6, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['title', 'id'], name='store_product_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['unit_price', 'id'], name='store_product_price_id_idx'),
+        ),
+    ]
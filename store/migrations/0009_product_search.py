@@ -0,0 +1,69 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:02
+
+from django.db import migrations
+
+# The DDL is spelled out here instead of coming from store.search, so that this migration keeps doing what it did
+# when it was written whatever later happens to store.search and Product.
+# vendor -> (forwards, backwards)
+STATEMENTS: dict = {
+    # generated tsvector column, title weighted A and description B, with a GIN index
+    'postgresql': (
+        [
+            'ALTER TABLE "store_product" ADD COLUMN IF NOT EXISTS "search_vector" tsvector GENERATED ALWAYS AS ('
+            "setweight(to_tsvector('english', coalesce(\"title\", '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(\"description\", '')), 'B')) STORED",
+            'CREATE INDEX IF NOT EXISTS "store_product_search_idx" ON "store_product" USING GIN ("search_vector")',
+        ],
+        [
+            'DROP INDEX IF EXISTS "store_product_search_idx"',
+            'ALTER TABLE "store_product" DROP COLUMN IF EXISTS "search_vector"',
+        ],
+    ),
+    # FTS5 external-content table kept in sync by triggers, filled from the existing products
+    'sqlite': (
+        [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts USING fts5(title, description, "
+            "content='store_product', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2', "
+            "prefix='2 3')",
+            'CREATE TRIGGER IF NOT EXISTS store_product_fts_insert AFTER INSERT ON store_product BEGIN '
+            'INSERT INTO store_product_fts (rowid, title, description) VALUES (new.id, new.title, new.description); '
+            'END',
+            'CREATE TRIGGER IF NOT EXISTS store_product_fts_delete AFTER DELETE ON store_product BEGIN '
+            "INSERT INTO store_product_fts (store_product_fts, rowid, title, description) VALUES ('delete', old.id, "
+            'old.title, old.description); END',
+            'CREATE TRIGGER IF NOT EXISTS store_product_fts_update AFTER UPDATE OF title, description ON '
+            'store_product BEGIN '
+            "INSERT INTO store_product_fts (store_product_fts, rowid, title, description) VALUES ('delete', old.id, "
+            'old.title, old.description); '
+            'INSERT INTO store_product_fts (rowid, title, description) VALUES (new.id, new.title, new.description); '
+            'END',
+            "INSERT INTO store_product_fts (store_product_fts) VALUES ('rebuild')",
+        ],
+        [
+            'DROP TRIGGER IF EXISTS store_product_fts_insert',
+            'DROP TRIGGER IF EXISTS store_product_fts_delete',
+            'DROP TRIGGER IF EXISTS store_product_fts_update',
+            'DROP TABLE IF EXISTS store_product_fts',
+        ],
+    ),
+}
+
+
+def run_statements(direction: int):
+    def run(apps, schema_editor):
+        # other backends have no index, search falls back to icontains
+        for sql in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[direction]:
+            schema_editor.execute(sql, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+    # PostgreSQL: generated tsvector column + GIN index, SQLite: FTS5 table + triggers (see store.search)
+
+    dependencies = [
+        ('store', '0008_collection_products_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(0), run_statements(1)),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:10
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # A bigint primary key cannot be cast to a UUID, and carts are short-lived, so the cart tables are recreated
+    # instead of altered: existing carts are dropped.
+
+    dependencies = [
+        ('store', '0009_product_search'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CartItem',
+        ),
+        migrations.DeleteModel(
+            name='Cart',
+        ),
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveSmallIntegerField(
+                    validators=[django.core.validators.MinValueValidator(1)])),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items',
+                                           to='store.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cart', 'product'),
+                                                        name='store_cartitem_unique_product')],
+            },
+        ),
+    ]
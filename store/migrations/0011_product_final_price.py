@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+from store.pricing import final_price_expression
+
+
+def price_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Product.objects.update(final_price=final_price_expression(Product))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_cart_uuid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8),
+        ),
+        migrations.RunPython(price_products, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['final_price', 'id'], name='store_product_final_id_idx'),
+        ),
+    ]
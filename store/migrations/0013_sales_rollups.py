@@ -0,0 +1,94 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_placed_at(apps, schema_editor):
+    # existing orders were last changed when they were placed, as far as anyone knows
+    Order = apps.get_model('store', 'Order')
+    Order.objects.update(last_update=F('placed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollectionSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('units', models.PositiveIntegerField()),
+                ('orders_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('units', models.PositiveIntegerField()),
+                ('orders_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('units', models.PositiveIntegerField()),
+                ('orders_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_placed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['last_update'], name='store_order_last_update_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at'], name='store_order_placed_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycollectionsales',
+            name='collection',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.collection'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('day',), name='store_dailysales_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycollectionsales',
+            constraint=models.UniqueConstraint(fields=('day', 'collection'), name='store_dailycollsales_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='store_dailyprodsales_unique'),
+        ),
+    ]
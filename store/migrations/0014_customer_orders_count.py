@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:39
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_orders(apps, schema_editor):
+    Customer = apps.get_model('store', 'Customer')
+    Order = apps.get_model('store', 'Order')
+    counts = (Order.objects
+              .filter(customer=OuterRef('pk'))
+              .order_by()
+              .values('customer')
+              .annotate(count=Count('pk'))
+              .values('count'))
+    Customer.objects.update(orders_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_orders, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['first_name', 'last_name', 'id'], name='store_customer_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='store_customer_first_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='store_customer_last_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_customer_orders_count'),
+    ]
+
+    operations = [
+        # the (collection, id) index replaces the single column index of the foreign key
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'id'], name='store_product_coll_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='collection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='store.collection'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['last_update', 'id'], name='store_product_update_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'title', 'id'], name='store_product_coll_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'unit_price', 'id'], name='store_product_coll_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'final_price', 'id'], name='store_product_coll_final_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'last_update', 'id'], name='store_product_coll_update_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('inventory__lt', 10)), fields=['id'], name='store_product_low_stock_idx'),
+        ),
+    ]
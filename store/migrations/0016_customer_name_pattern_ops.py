@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:12
+
+from django.db import migrations
+
+# The lower() indexes of 0014 use the default operator class, which orders by the database collation: LIKE 'x%'
+# can only use them under the C collation. text_pattern_ops compares byte-wise, so that the prefix searches of
+# store.admin.CustomerAdmin use them whatever the collation. Index.opclasses cannot be given with expressions
+# and OpClass() has no meaning on SQLite (whose BINARY collation already suits LIKE), hence the raw DDL.
+# vendor -> (forwards, backwards)
+STATEMENTS: dict = {
+    'postgresql': (
+        [
+            'DROP INDEX IF EXISTS "store_customer_first_lower_idx"',
+            'CREATE INDEX "store_customer_first_lower_idx" ON "store_customer" (LOWER("first_name") text_pattern_ops)',
+            'DROP INDEX IF EXISTS "store_customer_last_lower_idx"',
+            'CREATE INDEX "store_customer_last_lower_idx" ON "store_customer" (LOWER("last_name") text_pattern_ops)',
+        ],
+        [
+            'DROP INDEX IF EXISTS "store_customer_first_lower_idx"',
+            'CREATE INDEX "store_customer_first_lower_idx" ON "store_customer" (LOWER("first_name"))',
+            'DROP INDEX IF EXISTS "store_customer_last_lower_idx"',
+            'CREATE INDEX "store_customer_last_lower_idx" ON "store_customer" (LOWER("last_name"))',
+        ],
+    ),
+}
+
+
+def run_statements(direction: int):
+    def run(apps, schema_editor):
+        for sql in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[direction]:
+            schema_editor.execute(sql, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+    # PostgreSQL only: the model state keeps the plain Index(Lower(...)) of 0014
+
+    dependencies = [
+        ('store', '0015_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(0), run_statements(1)),
+    ]
@@ -1,16 +1,75 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from uuid import uuid4
+
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
+
+from . import pricing
+from .signals import bulk_changed
+
+
+# products with less inventory are low on stock: the admin's inventory filter and the partial low stock index
+LOW_INVENTORY: int = 10
+
+
+class PromotionQuerySet(models.QuerySet):
+    def for_products(self, product_ids) -> dict:
+        """
+        {product id: [{'id', 'description', 'discount'}]} of the promotions of many products, by promotion id, with
+        one query and an empty list for the products without promotions.
+        """
+        product_ids = list(product_ids)
+        promotions: dict = {product_id: [] for product_id in product_ids}
+        if not product_ids:
+            return promotions
+        rows = (self.filter(product__in=product_ids)
+                .order_by('id')
+                .values_list('product', 'id', 'description', 'discount'))
+        for product_id, pk, description, discount in rows:
+            promotions[product_id].append({'id': pk, 'description': description, 'discount': discount})
+        return promotions
 
 
 class Promotion(models.Model):
     description = models.CharField(max_length=255)
     discount = models.FloatField()
 
+    objects = PromotionQuerySet.as_manager()
+
+
+class MaintainedFieldsMixin:
+    """
+    `maintained_fields` are kept by the database with UPDATEs that are relative (`F('count') + delta`) or recompute
+    them from related rows. Saving an existing instance leaves them out of its UPDATE, which would otherwise write
+    back the values loaded with the instance over the changes made since; only new rows get them from the instance.
+    """
+    maintained_fields: tuple = ()
+
+    def save(self, **kwargs) -> None:
+        if not self._state.adding and self.pk is not None and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                # every loaded field, as Model.save() does for instances with deferred fields
+                deferred: set = self.get_deferred_fields()
+                update_fields = [field.name for field in self._meta.concrete_fields
+                                 if not field.primary_key and field.attname not in deferred]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.maintained_fields]
+        super().save(**kwargs)
 
-class Collection(models.Model):
+
+class Collection(MaintainedFieldsMixin, models.Model):
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
+    # also touched whenever one of its products changes, see store.signals.handlers
+    last_update = models.DateTimeField(auto_now=True)
+    # maintained incrementally by store.signals.handlers, `manage.py repair_counters` fixes any drift
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+
+    maintained_fields: tuple = ('products_count',)
 
     def __str__(self) -> str:
         return self.title
@@ -19,6 +78,85 @@ class Collection(models.Model):
         ordering = ['title']
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    `update()` and `bulk_create()` skip the model signals, so they report the change through `bulk_changed`
+    together with the ids of the collections whose products were touched and the change of each
+    collection's product count. Both also keep `final_price` in step with `unit_price`.
+    """
+
+    def count_by_collection(self) -> Counter:
+        rows = self.order_by().values_list('collection_id').annotate(count=models.Count('pk'))
+        return Counter(dict(rows))
+
+    def update(self, **kwargs) -> int:
+        moves_products: bool = 'collection' in kwargs or 'collection_id' in kwargs
+        reprices: bool = 'unit_price' in kwargs and 'final_price' not in kwargs
+        with transaction.atomic(using=self.db, savepoint=False):
+            if moves_products or reprices:
+                pks: list = list(self.values_list('pk', flat=True))
+            if moves_products:
+                before: Counter = self.model.objects.using(self.db).filter(pk__in=pks).count_by_collection()
+                rows: int = super().update(**kwargs)
+                after: Counter = self.model.objects.using(self.db).filter(pk__in=pks).count_by_collection()
+                collection_ids: set = set(before) | set(after)
+                deltas: dict = {pk: after[pk] - before[pk] for pk in collection_ids if after[pk] != before[pk]}
+            else:
+                collection_ids: set = set(self.values_list('collection_id', flat=True).distinct())
+                rows: int = super().update(**kwargs)
+                deltas: dict = {}
+            if reprices and rows:
+                # the final prices are computed from the unit prices just written
+                models.QuerySet.update(self.model.objects.using(self.db).filter(pk__in=pks),
+                                       final_price=pricing.final_price_expression(self.model))
+            if rows:
+                bulk_changed.send(sender=self.model, collection_ids=collection_ids, count_deltas=deltas)
+        return rows
+
+    def refresh_final_prices(self) -> int:
+        """
+        Recomputes `final_price` from the unit prices and promotions (see store.pricing) with one UPDATE of the
+        products whose price changed, which also get a new `last_update`. Returns how many changed.
+        """
+        final_price = pricing.final_price_expression(self.model)
+        changed = self.alias(computed_final_price=final_price).exclude(final_price=models.F('computed_final_price'))
+        return changed.update(final_price=final_price, last_update=timezone.now())
+
+    def decrement_inventory(self, quantities: dict) -> list:
+        """
+        Takes {product id: quantity} out of stock with one conditional UPDATE per product, in primary key order
+        so that concurrent callers lock the rows in the same order. Returns the ids of the products that did not
+        have enough stock (their inventory is left as is); the caller decides whether to roll the others back.
+        """
+        short: list = []
+        now = timezone.now()
+        with transaction.atomic(using=self.db, savepoint=False):
+            for pk in sorted(quantities):
+                quantity: int = quantities[pk]
+                products = self.filter(pk=pk, inventory__gte=quantity)
+                # plain QuerySet.update(): one bulk_changed for all the rows is sent below
+                if not models.QuerySet.update(products, inventory=models.F('inventory') - quantity,
+                                              last_update=now):
+                    short.append(pk)
+            updated: list = [pk for pk in quantities if pk not in short]
+            if updated:
+                collection_ids: set = set(self.filter(pk__in=updated).values_list('collection_id', flat=True))
+                bulk_changed.send(sender=self.model, collection_ids=collection_ids, count_deltas={})
+        return short
+
+    def bulk_create(self, objs, *args, **kwargs) -> list:
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = list(objs)
+            for obj in objs:
+                # new products have no promotions yet
+                obj.final_price = pricing.final_price(obj.unit_price)
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if objs:
+                deltas: Counter = Counter(obj.collection_id for obj in objs)
+                bulk_changed.send(sender=self.model, collection_ids=set(deltas), count_deltas=deltas)
+        return objs
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField()
@@ -27,19 +165,62 @@ class Product(models.Model):
         max_digits=6,
         decimal_places=2,
         validators=[MinValueValidator(1)])
+    # unit price after the best promotion, with tax: maintained by store.signals.handlers (see store.pricing)
+    final_price = models.DecimalField(max_digits=8, decimal_places=2, default=0, editable=False)
     inventory = models.IntegerField(validators=[MinValueValidator(0)])
     last_update = models.DateTimeField(auto_now=True)
-    collection = models.ForeignKey(Collection, on_delete=models.PROTECT)
+    # indexed by the (collection, id) index below, which also serves the lookups of the foreign key
+    collection = models.ForeignKey(Collection, on_delete=models.PROTECT, db_index=False)
     promotions = models.ManyToManyField(Promotion, blank=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the collection the row was loaded with, so moving a product can update both collections
+        instance._loaded_collection_id = instance.__dict__.get('collection_id')
+        # ... and the unit price, so that saving a new one reprices the product
+        instance._loaded_unit_price = instance.__dict__.get('unit_price')
+        return instance
+
     class Meta:
         ordering = ['title']
+        indexes = [
+            # back the keyset pagination orderings of the product list (see store.pagination)
+            models.Index(fields=['title', 'id'], name='store_product_title_id_idx'),
+            models.Index(fields=['unit_price', 'id'], name='store_product_price_id_idx'),
+            models.Index(fields=['final_price', 'id'], name='store_product_final_id_idx'),
+            models.Index(fields=['last_update', 'id'], name='store_product_update_id_idx'),
+            # ... and of the products of one collection (`?collection=`)
+            models.Index(fields=['collection', 'id'], name='store_product_coll_id_idx'),
+            models.Index(fields=['collection', 'title', 'id'], name='store_product_coll_title_idx'),
+            models.Index(fields=['collection', 'unit_price', 'id'], name='store_product_coll_price_idx'),
+            models.Index(fields=['collection', 'final_price', 'id'], name='store_product_coll_final_idx'),
+            models.Index(fields=['collection', 'last_update', 'id'], name='store_product_coll_update_idx'),
+            # the few products low on stock (`?inventory_lt=`, the admin's inventory filter)
+            models.Index(fields=['id'], condition=models.Q(inventory__lt=LOW_INVENTORY),
+                         name='store_product_low_stock_idx'),
+        ]
+
+
+class CustomerQuerySet(models.QuerySet):
+    def add_orders(self, deltas: dict) -> None:
+        """
+        Applies {customer id: change} to `orders_count` with one UPDATE per distinct change.
+        """
+        by_delta: dict = defaultdict(set)
+        for pk, delta in deltas.items():
+            if delta:
+                by_delta[delta].add(pk)
+        for delta, pks in by_delta.items():
+            self.filter(pk__in=pks).update(orders_count=models.F('orders_count') + delta)
 
 
-class Customer(models.Model):
+class Customer(MaintainedFieldsMixin, models.Model):
     MEMBERSHIP_BRONZE = 'B'
     MEMBERSHIP_SILVER = 'S'
     MEMBERSHIP_GOLD = 'G'
@@ -56,15 +237,75 @@ class Customer(models.Model):
     birth_date = models.DateField(null=True, blank=True)
     membership = models.CharField(
         max_length=1, choices=MEMBERSHIP_CHOICES, default=MEMBERSHIP_BRONZE)
+    # maintained by OrderQuerySet and store.signals.handlers, `manage.py repair_counters` fixes any drift
+    orders_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CustomerQuerySet.as_manager()
+    maintained_fields: tuple = ('orders_count',)
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
     class Meta:
         ordering = ['first_name', 'last_name']
+        indexes = [
+            # the default ordering, which the admin changelist pages through
+            models.Index(fields=['first_name', 'last_name', 'id'], name='store_customer_name_idx'),
+            # prefix searches on the lowercased names (see store.admin.CustomerAdmin), text_pattern_ops on
+            # PostgreSQL (migration 0016) so that LIKE 'prefix%' can use them under any collation
+            models.Index(Lower('first_name'), name='store_customer_first_lower_idx'),
+            models.Index(Lower('last_name'), name='store_customer_last_lower_idx'),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    `bulk_create()` and `update()` skip the model signals, so they keep `Customer.orders_count` in step
+    themselves.
+    """
+
+    def count_by_customer(self) -> Counter:
+        return Counter(dict(self.order_by().values_list('customer_id').annotate(count=models.Count('pk'))))
 
+    def bulk_create(self, objs, *args, **kwargs) -> list:
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Customer.objects.using(self.db).add_orders(Counter(obj.customer_id for obj in objs))
+        return objs
 
-class Order(models.Model):
+    def update(self, **kwargs) -> int:
+        if 'customer' not in kwargs and 'customer_id' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            orders = self.model.objects.using(self.db).filter(pk__in=list(self.values_list('pk', flat=True)))
+            before: Counter = orders.count_by_customer()
+            rows: int = super().update(**kwargs)
+            after: Counter = orders.count_by_customer()
+            Customer.objects.using(self.db).add_orders({pk: after[pk] - before[pk] for pk in set(before) | set(after)})
+        return rows
+
+    @staticmethod
+    def totals_from_items() -> dict:
+        """
+        {field: expression} of `total_price` and `items_count` computed from the items of the outer order row.
+        """
+        items = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+        line_total = models.ExpressionWrapper(models.F('quantity') * models.F('unit_price'),
+                                              output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        totals = items.annotate(total=models.Sum(line_total)).values('total')
+        counts = items.annotate(count=models.Sum('quantity')).values('count')
+        return {'total_price': Coalesce(models.Subquery(totals), Decimal('0')),
+                'items_count': Coalesce(models.Subquery(counts), 0)}
+
+    def refresh_totals(self) -> int:
+        """
+        Recomputes `total_price` and `items_count` of the orders from their items with one UPDATE, touching
+        `last_update` (the sales rollups reaggregate the orders changed since their watermark).
+        """
+        return self.update(**self.totals_from_items(), last_update=timezone.now())
+
+
+class Order(MaintainedFieldsMixin, models.Model):
     PAYMENT_STATUS_PENDING = 'P'
     PAYMENT_STATUS_COMPLETE = 'C'
     PAYMENT_STATUS_FAILED = 'F'
@@ -78,6 +319,58 @@ class Order(models.Model):
     payment_status = models.CharField(
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # sum of quantity * unit_price and of quantity over the items, maintained by OrderItemQuerySet and
+    # store.signals.handlers, `manage.py repair_counters order.totals` fixes any drift
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    items_count = models.PositiveIntegerField(default=0, editable=False)
+    # also touched whenever the items change, see OrderQuerySet.refresh_totals()
+    last_update = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+    maintained_fields: tuple = ('total_price', 'items_count')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # moving an order to another customer updates the order counts of both
+        instance._loaded_customer_id = instance.__dict__.get('customer_id')
+        return instance
+
+    class Meta:
+        indexes = [
+            # backs the keyset pagination of a customer's order history (see store.views.CustomerOrderList)
+            models.Index(fields=['customer', 'placed_at', 'id'], name='store_order_cust_placed_idx'),
+            # the orders changed since the watermark and the orders of a day, for the sales rollups (store.rollups)
+            models.Index(fields=['last_update'], name='store_order_last_update_idx'),
+            models.Index(fields=['placed_at'], name='store_order_placed_at_idx'),
+        ]
+
+
+class OrderItemQuerySet(models.QuerySet):
+    """
+    `bulk_create()` and `update()` skip the model signals, so they refresh the totals of the orders they touched
+    themselves, with one UPDATE.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs) -> list:
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            order_ids: set = {obj.order_id for obj in objs}
+            if order_ids:
+                Order.objects.using(self.db).filter(pk__in=order_ids).refresh_totals()
+        return objs
+
+    def update(self, **kwargs) -> int:
+        with transaction.atomic(using=self.db, savepoint=False):
+            pks: list = list(self.values_list('pk', flat=True))
+            items = self.model.objects.using(self.db).filter(pk__in=pks)
+            order_ids: set = set(items.values_list('order_id', flat=True))
+            rows: int = super().update(**kwargs)
+            if 'order' in kwargs or 'order_id' in kwargs:
+                order_ids |= set(items.values_list('order_id', flat=True))
+            if rows:
+                Order.objects.using(self.db).filter(pk__in=order_ids).refresh_totals()
+        return rows
 
 
 class OrderItem(models.Model):
@@ -86,6 +379,15 @@ class OrderItem(models.Model):
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
+    objects = OrderItemQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # moving an item to another order refreshes the totals of both
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        return instance
+
 
 class Address(models.Model):
     street = models.CharField(max_length=255)
@@ -94,11 +396,132 @@ class Address(models.Model):
         Customer, on_delete=models.CASCADE)
 
 
+class CartQuerySet(models.QuerySet):
+    def summary(self, cart_id) -> list:
+        """
+        One row per item of the cart (a single row with null item fields for an empty cart) with the product
+        data, the line total and the cart totals, computed by the database in a single query.
+        """
+        line_total = models.ExpressionWrapper(models.F('items__quantity') * models.F('items__product__unit_price'),
+                                              output_field=models.DecimalField(max_digits=14, decimal_places=2))
+        return list(self
+                    .filter(pk=cart_id)
+                    .values('id', 'created_at')
+                    .annotate(product_id=models.F('items__product_id'),
+                              title=models.F('items__product__title'),
+                              unit_price=models.F('items__product__unit_price'),
+                              quantity=models.F('items__quantity'),
+                              line_total=line_total,
+                              total=models.Window(models.Sum(line_total)),
+                              items_count=models.Window(models.Sum('items__quantity')))
+                    .order_by('items__id'))
+
+
 class Cart(models.Model):
+    # not guessable: knowing the id of a cart is what gives access to it
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
+
+class CartItemQuerySet(models.QuerySet):
+    """
+    Quantity changes are single `INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE` statements on the unique
+    (cart, product) constraint (PostgreSQL, SQLite 3.35+), so concurrent adds to the same cart never lose an
+    update and never hit the constraint.
+    """
+    def upsert(self, cart_id, product_id: int, quantity: int, add: bool) -> int | None:
+        """
+        Adds `quantity` to (add=True) or sets it as (add=False) the quantity of the product in the cart and
+        returns the new quantity. Returns None, writing nothing, when the cart or the product does not exist or
+        the quantity would exceed CartItem.MAX_QUANTITY.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        table: str = quote(meta.db_table)
+        cart, product, quantity_column = (quote(meta.get_field(name).column)
+                                          for name in ('cart', 'product', 'quantity'))
+        # the referenced tables and their primary keys
+        (cart_table, cart_pk), (product_table, product_pk) = (
+            (quote(related._meta.db_table), f'{quote(related._meta.db_table)}.{quote(related._meta.pk.column)}')
+            for related in (Cart, Product))
+        new_quantity: str = (f'{table}.{quantity_column} + excluded.{quantity_column}' if add
+                             else f'excluded.{quantity_column}')
+        with connection.cursor() as cursor:
+            # the ids are selected from the cart and product rows, so a missing one inserts nothing instead of
+            # violating a foreign key, which would only be reported when the outermost transaction commits
+            cursor.execute(
+                f'INSERT INTO {table} ({cart}, {product}, {quantity_column}) '
+                f'SELECT {cart_pk}, {product_pk}, %s FROM {cart_table}, {product_table} '
+                f'WHERE {cart_pk} = %s AND {product_pk} = %s '
+                f'ON CONFLICT ({cart}, {product}) DO UPDATE SET {quantity_column} = {new_quantity} '
+                f'WHERE {new_quantity} <= %s '
+                f'RETURNING {quantity_column}',
+                [quantity, meta.get_field('cart').get_db_prep_value(cart_id, connection), product_id,
+                 self.model.MAX_QUANTITY])
+            row: tuple | None = cursor.fetchone()
+        return row[0] if row else None
+
 
 class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
+    MAX_QUANTITY = 10_000
+
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    quantity = models.PositiveSmallIntegerField()
+    quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
+
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='store_cartitem_unique_product'),
+        ]
+
+
+# region Sales rollups
+# Daily revenue, units and order counts, aggregated from the orders by store.rollups (`manage.py rollup_sales`)
+# and served by store.views.SalesReport. Not maintained on write: they are as fresh as their watermark.
+class SalesRollup(models.Model):
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+    units = models.PositiveIntegerField()
+    orders_count = models.PositiveIntegerField()
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='store_dailysales_unique_day'),
+        ]
+
+
+class DailyCollectionSales(SalesRollup):
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'collection'], name='store_dailycollsales_unique'),
+        ]
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='store_dailyprodsales_unique'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """
+    How far a rollup job got: every order changed before `value` is aggregated.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+# endregion
@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import FloatField, Q
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination keyed on (sort key, id).
+
+    Every page is fetched with a `WHERE (key, id) > (last key, last id) ORDER BY key, id LIMIT n` style query,
+    so page N costs the same as page 1 as long as (key, id) is indexed. There is no total count and no OFFSET.
+    The cursor is an opaque, url-safe token; clients should only follow the `next` / `previous` links.
+    """
+    page_size: int = 10
+    max_page_size: int = 100
+    page_size_query_param: str = 'page_size'
+    cursor_query_param: str = 'cursor'
+    ordering_query_param: str = 'ordering'
+    # Allowed orderings, the first one is the default. A leading '-' means descending.
+    orderings: tuple = ('-id',)
+    # Fields of sort keys that are annotations rather than model fields, used to parse their cursor values
+    cursor_fields: dict = {}
+    invalid_cursor_message: str = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> list:
+        return self.process_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset: QuerySet, request: Request, view=None) -> QuerySet:
+        """
+        Applies ordering, the cursor condition and the LIMIT without evaluating the queryset.
+        `process_page()` must then be called with the fetched rows.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+
+        field, descending = self.ordering.lstrip('-'), self.ordering.startswith('-')
+        reverse: bool = self.cursor is not None and self.cursor['r']
+        # Walking backwards flips the direction of both the comparison and the ORDER BY
+        backwards: bool = descending != reverse
+
+        if self.cursor is not None:
+            queryset = queryset.filter(self.seek_condition(field, backwards, self.cursor))
+
+        order_by: list = [field] if field == 'id' else [field, 'id']
+        if backwards:
+            order_by = ['-' + name for name in order_by]
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def process_page(self, rows: list) -> list:
+        reverse: bool = self.cursor is not None and self.cursor['r']
+        has_more: bool = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # region Request parsing
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request: Request) -> str:
+        ordering: str = request.query_params.get(self.ordering_query_param, '')
+        return ordering if ordering in self.orderings else self.orderings[0]
+
+    def decode_cursor(self, request: Request) -> dict | None:
+        encoded: str | None = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor: dict = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['o'] != self.ordering or not isinstance(cursor['r'], bool):
+                raise ValueError
+            cursor['id'] = int(cursor['id'])
+            if 'v' in cursor:
+                field_name: str = self.ordering.lstrip('-')
+                cursor['v'] = self.get_cursor_field(field_name).to_python(cursor['v'])
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_cursor_field(self, name: str):
+        if name in self.cursor_fields:
+            return self.cursor_fields[name]
+        return self.model._meta.get_field(name)
+    # endregion
+
+    # region Cursor building
+    @staticmethod
+    def seek_condition(field: str, backwards: bool, cursor: dict) -> Q:
+        op: str = 'lt' if backwards else 'gt'
+        if field == 'id':
+            return Q(**{f'id__{op}': cursor['id']})
+        return Q(**{f'{field}__{op}': cursor['v']}) | Q(**{field: cursor['v'], f'id__{op}': cursor['id']})
+
+    @staticmethod
+    def get_value(row, name: str):
+        # Rows may be model instances or dicts coming from `.values()`
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        field: str = self.ordering.lstrip('-')
+        cursor: dict = {'o': self.ordering, 'r': reverse, 'id': self.get_value(row, 'id')}
+        if field != 'id':
+            cursor['v'] = str(self.get_value(row, field))
+        encoded: bytes = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'))
+        return encoded.decode('ascii')
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1], reverse=False))
+
+    def get_previous_link(self) -> str | None:
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.page[0], reverse=True))
+    # endregion
+
+
+class ProductPagination(KeysetPagination):
+    orderings = ('-id', 'id', 'title', '-title', 'unit_price', '-unit_price', 'final_price', '-final_price',
+                 'last_update', '-last_update')
+
+
+class CollectionPagination(KeysetPagination):
+    orderings = ('id', '-id', 'title', '-title')
+
+
+class OrderPagination(KeysetPagination):
+    orderings = ('-placed_at', 'placed_at')
+
+
+class ProductSearchPagination(KeysetPagination):
+    # rank is the relevance annotation added by store.search.search_products()
+    orderings = ('-rank',)
+    cursor_fields = {'rank': FloatField()}
@@ -0,0 +1,93 @@
+"""
+Effective product prices.
+
+The final price of a product is its unit price less the best (largest) discount among its promotions, plus tax,
+each step rounded half up to the cent:
+
+    discounted = round_half_up(unit_price * (1 - best discount))
+    final price = round_half_up(discounted * TAX_MULTIPLIER)
+
+final_price_expression() computes it in the database for a whole queryset as one annotation (a correlated
+subquery for the best discount, arithmetic for the rest); final_price() is the same computation in Python for
+a single product. Both work in integer cents and basis points, so they agree to the cent on every backend:
+PostgreSQL's numeric and SQLite's REAL decimals only meet integer arithmetic, and half up rounding of n / d is
+the integer division (2n + d) // 2d.
+
+Promotion.discount is a fraction (0.15 for 15% off), taken in whole basis points and clamped to [0, 1].
+The result is stored in Product.final_price, which the product endpoints read, filter and sort on; it is kept
+current by store.signals.handlers and `manage.py repair_counters product.final_price`.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+
+# 1.1 exactly: the float-derived Decimal(1.10) used before is off by less than 1e-16, which can never move the
+# cents rounding of a 2 decimal price, so the results are identical with a constant built once.
+TAX_MULTIPLIER: Decimal = Decimal('1.10')
+CENTS: Decimal = Decimal('0.00')
+BASIS_POINTS: int = 10_000
+
+
+class CentsToDecimal(models.Func):
+    """
+    Integer cents to a 2 decimal price: exact numeric arithmetic on PostgreSQL, and on SQLite a division, whose
+    result is the REAL nearest to the price, the same value a decimal literal of the price compares equal to.
+    """
+    template = '(%(expressions)s * 0.01)'
+    output_field = models.DecimalField(max_digits=8, decimal_places=2)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(expressions)s / 100.0)', **extra_context)
+
+
+def round_half_up_division(numerator, denominator: int):
+    """
+    round_half_up(numerator / denominator) for a non-negative integer expression.
+    """
+    return models.ExpressionWrapper((numerator * 2 + denominator) / (denominator * 2),
+                                    output_field=models.BigIntegerField())
+
+
+def best_discount_expression(product_model) -> models.Expression:
+    """
+    Best discount of the outer product row in basis points, 0 without promotions.
+    """
+    links = product_model.promotions.through.objects
+    best = (links
+            .filter(product_id=models.OuterRef('pk'))
+            .order_by()
+            .values('product_id')
+            .annotate(best=models.Max(Round(models.F('promotion__discount') * BASIS_POINTS)))
+            .values('best'))
+    discount = Cast(Coalesce(models.Subquery(best), 0.0), models.BigIntegerField())
+    return Least(Greatest(discount, 0, output_field=models.BigIntegerField()), BASIS_POINTS,
+                 output_field=models.BigIntegerField())
+
+
+def final_price_expression(product_model) -> models.Expression:
+    """
+    Final price of the product rows of `product_model` (the model class, historical ones included).
+    """
+    numerator, denominator = TAX_MULTIPLIER.as_integer_ratio()
+    cents = Cast(Round(models.F('unit_price') * 100), models.BigIntegerField())
+    discounted = round_half_up_division(cents * (BASIS_POINTS - best_discount_expression(product_model)),
+                                        BASIS_POINTS)
+    return CentsToDecimal(round_half_up_division(discounted * numerator, denominator))
+
+
+def to_basis_points(discount: float) -> int:
+    return min(max(int(Decimal(repr(discount)).scaleb(4).quantize(1, rounding=ROUND_HALF_UP)), 0), BASIS_POINTS)
+
+
+def final_price(unit_price: Decimal, discount: float = 0.0) -> Decimal:
+    """
+    Final price of a product of `unit_price` whose best promotion is `discount`.
+    """
+    discounted: Decimal = (unit_price * (BASIS_POINTS - to_basis_points(discount)) / BASIS_POINTS).quantize(
+        CENTS, rounding=ROUND_HALF_UP)
+    return price_with_tax(discounted)
+
+
+def price_with_tax(unit_price: Decimal) -> Decimal:
+    return (unit_price * TAX_MULTIPLIER).quantize(CENTS, rounding=ROUND_HALF_UP)
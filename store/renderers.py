@@ -0,0 +1,76 @@
+"""
+Fast renderers and parsers for the REST framework views (see REST_FRAMEWORK in the settings).
+
+- ORJSONRenderer renders JSON with orjson, byte for byte the output of DRF's JSONRenderer: compact separators,
+  UTF-8 with U+2028 / U+2029 escaped, Decimals as numbers (COERCE_DECIMAL_TO_STRING is off), datetimes in ISO 8601
+  with 'Z' for UTC. Types orjson does not know are converted by DRF's own encoder. Indented output (the browsable
+  API, `Accept: application/json; indent=4`) and non-default UNICODE_JSON / COMPACT_JSON / STRICT_JSON settings
+  are rendered by JSONRenderer itself.
+- MessagePackRenderer / MessagePackParser: `application/msgpack`, selected by the Accept / Content-Type headers,
+  with the same values as the JSON representation. They need the optional `msgpack` package, and the settings
+  only enable them when it is installed.
+"""
+from decimal import Decimal
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # optional: no MessagePack representation
+    msgpack = None
+
+drf_default = JSONEncoder().default
+
+
+def encode_default(value):
+    """
+    What DRF's JSONEncoder turns the types the packers do not serialize themselves into. Decimals, a few per
+    product, are checked first.
+    """
+    if type(value) is Decimal:
+        return float(value)
+    return drf_default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    options: int = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if data is None:
+            return b''
+        if (self.ensure_ascii or not self.compact or not self.strict
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered: bytes = orjson.dumps(data, default=encode_default, option=self.options)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the json module renders
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped like JSONRenderer does, so that the output is a strict JavaScript subset
+        return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type: str = 'application/msgpack'
+    format: str = 'msgpack'
+    charset: str | None = None
+    render_style: str = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type: str = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc or type(exc).__name__}')
@@ -0,0 +1,183 @@
+"""
+Sales rollups: revenue, units and order count per day in total (DailySales), per collection
+(DailyCollectionSales) and per product (DailyProductSales), aggregated from the order items.
+
+Rollups are maintained a whole day at a time: the rows of a day are deleted and recomputed from the raw tables
+with one INSERT ... SELECT per rollup table, so the aggregation never leaves the database and reprocessing a
+day is idempotent, whether its orders are new, edited or had items deleted.
+
+- update() recomputes only the days of the orders changed (Order.last_update) since the watermark, and moves
+  the watermark. It stops `lag` seconds before now: an order written by a transaction that commits later than
+  that is only seen by a later run, instead of never.
+- rebuild() recomputes every day and resets the watermark.
+- check() compares the rollups of a date range with the same aggregation of the raw tables.
+
+Days are in settings.TIME_ZONE. Sales belong to the collection a product was in when their day was last
+aggregated; moving a product to another collection reattributes past days on rebuild() only.
+"""
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCollectionSales, DailyProductSales, DailySales, Order, OrderItem, RollupWatermark
+from .pricing import CENTS
+
+WATERMARK: str = 'sales'
+# rollup model -> {rollup field: OrderItem path} of its key besides the day
+ROLLUPS: dict = {
+    DailySales: {},
+    DailyCollectionSales: {'collection_id': 'product__collection_id'},
+    DailyProductSales: {'product_id': 'product_id'},
+}
+# days recomputed per statement
+DAYS_PER_BATCH: int = 31
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start: datetime = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def placed_on(days) -> models.Q:
+    """
+    Condition on placed_at being on one of `days`, as ranges that the placed_at index can serve.
+    """
+    condition = models.Q()
+    for day in days:
+        start, end = day_bounds(day)
+        condition |= models.Q(order__placed_at__gte=start, order__placed_at__lt=end)
+    return condition
+
+
+def aggregate(model, days=None, using: str = DEFAULT_DB_ALIAS) -> models.QuerySet:
+    """
+    The rows of the rollup `model` (without ids) computed from the order items of `days`, or of all days.
+    """
+    items = OrderItem.objects.using(using)
+    if days is not None:
+        items = items.filter(placed_on(days))
+    keys: dict = ROLLUPS[model]
+    line_total = models.ExpressionWrapper(models.F('quantity') * models.F('unit_price'),
+                                          output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    return (items
+            .order_by()
+            .values(*[path for name, path in keys.items() if name == path],
+                    day=TruncDate('order__placed_at'),
+                    **{name: models.F(path) for name, path in keys.items() if name != path})
+            .annotate(revenue=models.Sum(line_total), units=models.Sum('quantity'),
+                      orders_count=models.Count('order_id', distinct=True)))
+
+
+def insert_from_select(model, rows: models.QuerySet) -> int:
+    """
+    INSERT INTO <model table> (...) SELECT <rows>, mapping the selected columns by name.
+    """
+    connection = connections[rows.db]
+    compiler = rows.query.get_compiler(using=rows.db)
+    sql, params = compiler.as_sql()
+    quote = connection.ops.quote_name
+    columns: list = [model._meta.get_field(alias or expression.target.attname).column
+                     for expression, _, alias in compiler.select]
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) {sql}',
+                       params)
+        return cursor.rowcount
+
+
+def recompute(days=None, using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Replaces the rollup rows of `days` (all rows when None) with freshly aggregated ones. Returns the number of
+    rows written.
+    """
+    written: int = 0
+    for model in ROLLUPS:
+        rollups = model.objects.using(using)
+        if days is not None:
+            rollups = rollups.filter(day__in=days)
+        rollups.delete()
+        written += insert_from_select(model, aggregate(model, days, using))
+    return written
+
+
+def get_watermark(using: str = DEFAULT_DB_ALIAS) -> datetime | None:
+    return RollupWatermark.objects.using(using).filter(name=WATERMARK).values_list('value', flat=True).first()
+
+
+def set_watermark(value: datetime, using: str = DEFAULT_DB_ALIAS) -> None:
+    RollupWatermark.objects.using(using).update_or_create(name=WATERMARK, defaults={'value': value})
+
+
+def rebuild(using: str = DEFAULT_DB_ALIAS, lag: float = 0) -> int:
+    """
+    Recomputes every day. Returns the number of rollup rows written.
+    """
+    with transaction.atomic(using=using):
+        upto: datetime = timezone.now() - timedelta(seconds=lag)
+        written: int = recompute(using=using)
+        set_watermark(upto, using)
+    return written
+
+
+def update(using: str = DEFAULT_DB_ALIAS, lag: float = 60) -> tuple[list, int]:
+    """
+    Recomputes the days of the orders changed since the watermark (everything when there is none yet).
+    Returns (recomputed days, rollup rows written).
+    """
+    with transaction.atomic(using=using):
+        # serializes concurrent runs on the watermark row
+        watermark: RollupWatermark | None = (RollupWatermark.objects.using(using).select_for_update()
+                                             .filter(name=WATERMARK).first())
+        upto: datetime = timezone.now() - timedelta(seconds=lag)
+        if watermark is None:
+            return [], rebuild(using, lag)
+        if upto <= watermark.value:
+            return [], 0
+        days: list = sorted(Order.objects.using(using)
+                            .filter(last_update__gt=watermark.value, last_update__lte=upto)
+                            .order_by()
+                            .values_list(TruncDate('placed_at'), flat=True)
+                            .distinct())
+        written: int = 0
+        days_iter = iter(days)
+        while batch := list(islice(days_iter, DAYS_PER_BATCH)):
+            written += recompute(batch, using)
+        set_watermark(upto, using)
+    return days, written
+
+
+def check(start: date | None = None, end: date | None = None, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """
+    {rollup model: [(key, stored row, expected row)]} of the rollup rows of the days from `start` to `end`
+    (inclusive, open ended when None) that differ from the raw tables. The days of orders changed after the
+    watermark, and of deleted orders, differ until the next update() / rebuild().
+    """
+    mismatches: dict = {}
+    for model, keys in ROLLUPS.items():
+        key_fields: list = ['day', *keys]
+        stored = model.objects.using(using)
+        expected = aggregate(model, using=using)
+        if start is not None:
+            stored = stored.filter(day__gte=start)
+            expected = expected.filter(order__placed_at__gte=day_bounds(start)[0])
+        if end is not None:
+            stored = stored.filter(day__lte=end)
+            expected = expected.filter(order__placed_at__lt=day_bounds(end)[1])
+        stored_rows: dict = {tuple(row[name] for name in key_fields): row
+                             for row in stored.values(*key_fields, 'revenue', 'units', 'orders_count')}
+        expected_rows: dict = {tuple(row[name] for name in key_fields): row for row in expected}
+        mismatches[model] = [
+            (key, stored_rows.get(key), expected_rows.get(key))
+            for key in sorted(set(stored_rows) | set(expected_rows))
+            if not same_totals(stored_rows.get(key), expected_rows.get(key))
+        ]
+    return mismatches
+
+
+def same_totals(stored: dict | None, expected: dict | None) -> bool:
+    if stored is None or expected is None:
+        return stored is expected
+    return (stored['revenue'].quantize(CENTS) == expected['revenue'].quantize(CENTS)
+            and stored['units'] == expected['units'] and stored['orders_count'] == expected['orders_count'])
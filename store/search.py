@@ -0,0 +1,209 @@
+"""
+Ranked full-text search over Product.title and Product.description.
+
+The index lives in the database and is maintained by the database itself, so it stays in sync with save(),
+delete(), QuerySet.update(), bulk_create() / bulk_update() and raw SQL alike:
+
+- PostgreSQL: a generated (STORED) `search_vector` tsvector column, title weighted A and description B, with a
+  GIN index. Queries use `to_tsquery` with prefix terms and rank with `ts_rank_cd`.
+- SQLite: an FTS5 external-content table `store_product_fts` kept in sync by triggers on store_product. Queries
+  use MATCH with prefix terms and rank with `bm25` (negated, so that a higher rank is always better).
+
+Other backends fall back to an unranked `icontains` scan.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.query import QuerySet
+
+from .models import Product
+
+# Terms beyond this are ignored, every term is ANDed and matched as a prefix
+MAX_TERMS: int = 8
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def parse_terms(query: str) -> list:
+    return TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """
+    Fallback for databases without a full-text index: every term must appear in the title or the description.
+    """
+
+    def install(self, connection) -> None:
+        pass
+
+    def uninstall(self, connection) -> None:
+        pass
+
+    def rebuild(self, connection) -> None:
+        pass
+
+    def repair(self, connection) -> None:
+        pass
+
+    def filter(self, queryset: QuerySet, terms: list) -> QuerySet:
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+    def search(self, queryset: QuerySet, terms: list) -> QuerySet:
+        """
+        Like filter(), but in a form that rank() can be annotated on.
+        """
+        return self.filter(queryset, terms)
+
+    def rank(self, terms: list):
+        return Value(1.0, output_field=FloatField())
+
+
+class PostgresSearchBackend(SearchBackend):
+    config: str = 'english'
+    column: str = 'search_vector'
+    index: str = 'store_product_search_idx'
+
+    def install(self, connection) -> None:
+        quote = connection.ops.quote_name
+        table: str = quote(Product._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {quote(self.column)} tsvector GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('{self.config}', coalesce({quote('title')}, '')), 'A') || "
+                f"setweight(to_tsvector('{self.config}', coalesce({quote('description')}, '')), 'B')) STORED")
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {quote(self.index)} ON {table} '
+                           f'USING GIN ({quote(self.column)})')
+
+    def uninstall(self, connection) -> None:
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {quote(self.index)}')
+            cursor.execute(f'ALTER TABLE {quote(Product._meta.db_table)} DROP COLUMN IF EXISTS {quote(self.column)}')
+
+    def tsquery(self, terms: list) -> str:
+        # terms are \w+ only, so they need no escaping inside the tsquery syntax
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def vector(self) -> str:
+        return f'"{Product._meta.db_table}"."{self.column}"'
+
+    def filter(self, queryset: QuerySet, terms: list) -> QuerySet:
+        return queryset.filter(RawSQL(f'{self.vector()} @@ to_tsquery(%s, %s)', [self.config, self.tsquery(terms)],
+                                      output_field=BooleanField()))
+
+    def rank(self, terms: list):
+        return RawSQL(f'ts_rank_cd({self.vector()}, to_tsquery(%s, %s))', [self.config, self.tsquery(terms)],
+                      output_field=FloatField())
+
+
+class SQLiteSearchBackend(SearchBackend):
+    table: str = 'store_product_fts'
+    # bm25 weights of the title and description columns
+    weights: tuple = (10.0, 1.0)
+
+    def create_statements(self) -> list:
+        content: str = Product._meta.db_table
+        fts: str = self.table
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(title, description, content='{content}', "
+            f"content_rowid='id', tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {content} BEGIN '
+            f'INSERT INTO {fts} (rowid, title, description) VALUES (new.id, new.title, new.description); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {content} BEGIN '
+            f"INSERT INTO {fts} ({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, "
+            f'old.description); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF title, description ON {content} BEGIN '
+            f"INSERT INTO {fts} ({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, "
+            f'old.description); '
+            f'INSERT INTO {fts} (rowid, title, description) VALUES (new.id, new.title, new.description); END',
+        ]
+
+    def install(self, connection) -> None:
+        """
+        Idempotent. Rebuilds the index when a trigger was missing, e.g. after a migration remade store_product
+        (SQLite drops the triggers of a table together with it).
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                           [f'{self.table}_{suffix}' for suffix in ('insert', 'delete', 'update')])
+            triggers: int = cursor.fetchone()[0]
+            for sql in self.create_statements():
+                cursor.execute(sql)
+        if triggers < 3:
+            self.rebuild(connection)
+
+    def uninstall(self, connection) -> None:
+        with connection.cursor() as cursor:
+            for suffix in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {self.table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def rebuild(self, connection) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('rebuild')")
+
+    def repair(self, connection) -> None:
+        if self.table in connection.introspection.table_names():
+            self.install(connection)
+
+    def match(self, terms: list) -> str:
+        # terms are \w+ only; quoting keeps FTS5 keywords (AND, OR, NOT, NEAR) literal
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def filter(self, queryset: QuerySet, terms: list) -> QuerySet:
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+                                             [self.match(terms)]))
+
+    def search(self, queryset: QuerySet, terms: list) -> QuerySet:
+        # bm25() only works in the query that runs the MATCH, so the FTS table is joined instead of filtered on
+        # with a subquery. extra() is the only way to add a join without a relation.
+        return queryset.extra(tables=[self.table],
+                              where=[f'{self.table}.rowid = "{Product._meta.db_table}"."id"',
+                                     f'{self.table} MATCH %s'],
+                              params=[self.match(terms)])
+
+    def rank(self, terms: list):
+        weights: str = ', '.join(str(weight) for weight in self.weights)
+        return RawSQL(f'-bm25({self.table}, {weights})', [], output_field=FloatField())
+
+
+backends: dict = {
+    'postgresql': PostgresSearchBackend(),
+    'sqlite': SQLiteSearchBackend(),
+}
+
+
+def get_backend(connection) -> SearchBackend:
+    return backends.get(connection.vendor, SearchBackend())
+
+
+def filter_products(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Products matching every term of `query` (as a prefix), unranked. An empty query matches nothing.
+    """
+    terms: list = parse_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_backend(connections[queryset.db]).filter(queryset, terms)
+
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    `filter_products()` annotated with `rank` (higher is more relevant), for ordering by ('-rank', '-id').
+    """
+    terms: list = parse_terms(query)
+    if not terms:
+        return queryset.none()
+    backend: SearchBackend = get_backend(connections[queryset.db])
+    return backend.search(queryset, terms).annotate(rank=backend.rank(terms))
+
+
+def repair_search_index(sender, using: str = 'default', **kwargs) -> None:
+    """
+    post_migrate receiver: puts back what a later migration may have dropped (see SQLiteSearchBackend.install).
+    """
+    connection = connections[using]
+    get_backend(connection).repair(connection)
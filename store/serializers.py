@@ -1,7 +1,14 @@
-from decimal import Decimal, ROUND_HALF_UP
+from datetime import date
+from decimal import Decimal
+from operator import itemgetter
+
+from urllib.parse import urlparse
+
+from django.urls import Resolver404, resolve, reverse
 from rest_framework import serializers
 
-from .models import Product, Collection
+from .models import CartItem, Collection, Customer, Order, Product
+from .pricing import CENTS, price_with_tax
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -11,26 +18,60 @@ class CollectionSerializer(serializers.ModelSerializer):
 
     products_count: int = serializers.IntegerField(read_only=True) # read-only won't be included in the POST request
 
+    def get_fields(self) -> dict:
+        fields: dict = super().get_fields()
+        # `?expand=featured_product`: the product inline, from the row joined by the view
+        if 'featured_product' in self.context.get('expand', ()):
+            fields['featured_product'] = ProductSerializer(read_only=True)
+        # `?fields=`: only the listed fields
+        if 'fields' in self.context:
+            fields = {name: field for name, field in fields.items() if name in self.context['fields']}
+        return fields
+
 
 class ProductSerializer(serializers.ModelSerializer):
     price: Decimal = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2,
                                               min_value=Decimal('0.01'))
     price_with_tax: Decimal = serializers.SerializerMethodField(method_name='get_price_with_tax')
+    # after the best promotion, with tax (see store.pricing)
+    final_price: Decimal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     collection = serializers.HyperlinkedRelatedField(
         queryset=Collection.objects.all(),
         view_name='store:collection_detail'
     )
+    # only rendered when the view puts the batched lookups in the context (`?include=tags,likes`):
+    # {product id: [Tag]} and {product id: (likes_count, liked_by_me)}
+    tags: list = serializers.SerializerMethodField()
+    likes_count: int = serializers.SerializerMethodField()
+    liked_by_me: bool = serializers.SerializerMethodField()
 
     class Meta:
         model: Product = Product
-        fields: list = ['id', 'title', 'description', 'slug', 'inventory', 'price', 'price_with_tax', 'collection']
+        fields: list = ['id', 'title', 'description', 'slug', 'inventory', 'price', 'price_with_tax', 'final_price',
+                        'collection', 'tags', 'likes_count', 'liked_by_me']
+
+    def get_fields(self) -> dict:
+        fields: dict = super().get_fields()
+        if 'tags' not in self.context:
+            del fields['tags']
+        if 'likes' not in self.context:
+            del fields['likes_count'], fields['liked_by_me']
+        return fields
 
     @staticmethod
     def get_price_with_tax(obj: Product) -> Decimal:
         # Calculate price with tax and set to 2 decimal places
-        price_with_tax: Decimal = obj.unit_price * Decimal(1.10)
-        return price_with_tax.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+        return price_with_tax(obj.unit_price)
+
+    def get_tags(self, obj: Product) -> list:
+        return [tag.label for tag in self.context['tags'].get(obj.id, ())]
+
+    def get_likes_count(self, obj: Product) -> int:
+        return self.context['likes'].get(obj.id, (0, False))[0]
+
+    def get_liked_by_me(self, obj: Product) -> bool:
+        return self.context['likes'].get(obj.id, (0, False))[1]
 
     # region Example of overriding methods
     # I can override the create method to customize the creation of a new object
@@ -49,6 +90,233 @@ class ProductSerializer(serializers.ModelSerializer):
     #     return instance  # It's called by the serializer.save() method, if we try to update an existing object'
     # endregion
 
+class CollectionReferenceField(serializers.Field):
+    """
+    Accepts a collection hyperlink (as rendered by ProductSerializer) or a plain id and returns the id without
+    touching the database. Batch endpoints check that the collections exist with one query for the whole batch.
+    """
+    default_error_messages = {
+        'invalid': 'Expected a collection URL or id.',
+    }
+
+    def to_internal_value(self, data) -> int:
+        if isinstance(data, int) and not isinstance(data, bool):
+            return data
+        if isinstance(data, str):
+            if data.isdigit():
+                return int(data)
+            try:
+                match = resolve(urlparse(data).path)
+            except Resolver404:
+                self.fail('invalid')
+            if match.view_name == 'store:collection_detail':
+                return int(match.kwargs['pk'])
+        self.fail('invalid')
+
+    def to_representation(self, value: int) -> int:
+        return value
+
+
+class ProductBulkSerializer(serializers.ModelSerializer):
+    """
+    Validates one item of a bulk create / update batch, see store.views.ProductBulk.
+    """
+    price: Decimal = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2,
+                                              min_value=Decimal('0.01'))
+    collection: int = CollectionReferenceField(source='collection_id')
+
+    class Meta:
+        model: Product = Product
+        fields: list = ['title', 'description', 'slug', 'inventory', 'price', 'collection']
+
+
+class CartItemSerializer(serializers.Serializer):
+    """
+    Input of the cart item endpoints, see store.views.CartItemList / CartItemDetail.
+    """
+    product_id: int = serializers.IntegerField(min_value=1)
+    quantity: int = serializers.IntegerField(min_value=1, max_value=CartItem.MAX_QUANTITY)
+
+
+def cart_representation(rows: list) -> dict:
+    """
+    Builds the cart document from the `Cart.objects.summary()` rows.
+    """
+    first: dict = rows[0]
+    items: list = [
+        {
+            'product_id': row['product_id'],
+            'title': row['title'],
+            'unit_price': row['unit_price'],
+            'quantity': row['quantity'],
+            'total_price': row['line_total'].quantize(CENTS),
+        }
+        for row in rows if row['product_id'] is not None
+    ]
+    return {
+        'id': first['id'],
+        'created_at': first['created_at'],
+        'items': items,
+        'items_count': first['items_count'] or 0,
+        'total_price': first['total'].quantize(CENTS) if first['total'] is not None else CENTS,
+    }
+
+
+class CheckoutSerializer(serializers.Serializer):
+    customer_id: int = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all(), source='customer')
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    """
+    An order of the customer order history, from `.values(*fields)` rows of store_order alone.
+    """
+    total_price: Decimal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model: Order = Order
+        fields: list = ['id', 'placed_at', 'payment_status', 'items_count', 'total_price']
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    """
+    Totals of a sales report row, from `.values()` rows of the sales rollups.
+    """
+    revenue: Decimal = serializers.DecimalField(max_digits=16, decimal_places=2)
+    units: int = serializers.IntegerField()
+    orders_count: int = serializers.IntegerField()
+
+
+class DaySalesSerializer(SalesTotalsSerializer):
+    day: date = serializers.DateField()
+
+
+class CollectionSalesSerializer(SalesTotalsSerializer):
+    collection_id: int = serializers.IntegerField()
+    title: str = serializers.CharField()
+
+
+class ProductSalesSerializer(SalesTotalsSerializer):
+    product_id: int = serializers.IntegerField()
+    title: str = serializers.CharField()
+
+
+def order_representation(order: Order, order_items: list) -> dict:
+    return {
+        'id': order.id,
+        'placed_at': order.placed_at,
+        'payment_status': order.payment_status,
+        'customer_id': order.customer_id,
+        'items': [
+            {
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'unit_price': item.unit_price,
+                'total_price': (item.quantity * item.unit_price).quantize(CENTS),
+            }
+            for item in order_items
+        ],
+        'total_price': sum((item.quantity * item.unit_price for item in order_items), CENTS).quantize(CENTS),
+    }
+
+
+class ProductReadSerializer:
+    """
+    Read-only fast path for ProductSerializer.
+
+    Builds the exact same representation from `.values(*ProductReadSerializer.values_fields)` rows with a
+    precompiled (output name, accessor) list: no model instances, no field machinery and a single `reverse()`
+    per serializer for the collection links instead of one per row.
+    """
+    values_fields: tuple = ('id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'final_price',
+                            'collection_id')
+    # output field -> the columns it is built from, so that `?fields=` reads only those
+    columns: dict = {
+        'id': ('id',),
+        'title': ('title',),
+        'description': ('description',),
+        'slug': ('slug',),
+        'inventory': ('inventory',),
+        'price': ('unit_price',),
+        'price_with_tax': ('unit_price',),
+        'final_price': ('final_price',),
+        'collection': ('collection_id',),
+    }
+    # `?expand=collection` joins the collection in the same query
+    collection_columns: tuple = ('collection__title', 'collection__products_count')
+
+    def __init__(self, instance=None, many: bool = False, context: dict = None) -> None:
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.fields = self.compile_fields()
+
+    @classmethod
+    def get_values_fields(cls, fields: set | None = None, expand: set = frozenset()) -> tuple:
+        """
+        The columns to read for the output `fields` (all when None) and `expand`ed relations, always with the id.
+        """
+        names: list = ['id']
+        for name, columns in cls.columns.items():
+            if fields is None or name in fields:
+                names.extend(column for column in columns if column not in names)
+        if 'collection' in expand:
+            names.extend(cls.collection_columns)
+        return tuple(names)
+
+    def compile_fields(self) -> list:
+        get_collection_id = itemgetter('collection_id')
+        get_unit_price = itemgetter('unit_price')
+        fields: list = [
+            ('id', itemgetter('id')),
+            ('title', itemgetter('title')),
+            ('description', itemgetter('description')),
+            ('slug', itemgetter('slug')),
+            ('inventory', itemgetter('inventory')),
+            ('price', get_unit_price),
+            ('price_with_tax', lambda row: price_with_tax(get_unit_price(row))),
+            ('final_price', itemgetter('final_price')),
+        ]
+        if 'collection' in self.context.get('expand', ()):
+            fields.append(('collection', lambda row: {'id': row['collection_id'], 'title': row['collection__title'],
+                                                      'products_count': row['collection__products_count']}))
+        else:
+            collection_url_prefix, collection_url_suffix = self.get_collection_url_parts()
+            fields.append(('collection', lambda row: f'{collection_url_prefix}{get_collection_id(row)}'
+                                                     f'{collection_url_suffix}'))
+        if 'promotions' in self.context:
+            promotions: dict = self.context['promotions']
+            fields.append(('promotions', lambda row: promotions.get(row['id'], [])))
+        if 'tags' in self.context:
+            tags: dict = self.context['tags']
+            fields.append(('tags', lambda row: [tag.label for tag in tags.get(row['id'], ())]))
+        if 'likes' in self.context:
+            likes: dict = self.context['likes']
+            fields.append(('likes_count', lambda row: likes.get(row['id'], (0, False))[0]))
+            fields.append(('liked_by_me', lambda row: likes.get(row['id'], (0, False))[1]))
+        if 'fields' in self.context:
+            fields = [(name, get) for name, get in fields if name in self.context['fields']]
+        return fields
+
+    def get_collection_url_parts(self) -> tuple[str, str]:
+        assert 'request' in self.context, (
+            '`ProductReadSerializer` requires the request in the serializer context.'
+        )
+        # Reverse a placeholder pk once and split the absolute URL around it
+        url: str = self.context['request'].build_absolute_uri(reverse('store:collection_detail', kwargs={'pk': 0}))
+        prefix, suffix = url.rsplit('0', 1)
+        return prefix, suffix
+
+    def to_representation(self, row: dict) -> dict:
+        return {name: get(row) for name, get in self.fields}
+
+    @property
+    def data(self) -> list | dict:
+        if self.many:
+            to_representation = self.to_representation
+            return [to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
+
+
 # region (old) base Serializers
 # class ProductSerializer(serializers.Serializer):
 #     """
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by store querysets after bulk writes that bypass the per-instance model signals
+# (QuerySet.update(), bulk_create(), bulk_update()). `sender` is the model class.
+bulk_changed = Signal()
@@ -0,0 +1,213 @@
+from collections import Counter, defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Max, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from store import pricing
+from store.cache import list_cache
+from store.models import Collection, Customer, Order, OrderItem, Product, Promotion
+from store.signals import bulk_changed
+from likes.models import LikedItem
+from tags.models import Tag, TaggedItem
+
+# region List cache invalidation
+# model -> generation bumped in store.cache.list_cache when it changes. Generations are bumped once the write is
+# committed: bumped before, a concurrent read of the rows not yet committed would be cached under the new one.
+CACHE_GENERATIONS: dict = {
+    Product: 'product',
+    Collection: 'collection',
+    Promotion: 'promotion',
+    Tag: 'tag',
+    TaggedItem: 'tag',
+    LikedItem: 'like',
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Promotion)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_save, sender=LikedItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=TaggedItem)
+@receiver(post_delete, sender=LikedItem)
+@receiver(bulk_changed, sender=Product)
+@receiver(bulk_changed, sender=Collection)
+def invalidate_list_cache(sender, using: str | None = None, **kwargs) -> None:
+    generation: str = CACHE_GENERATIONS[sender]
+    transaction.on_commit(lambda: list_cache.invalidate(generation), using=using)
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def invalidate_list_cache_on_promotions(sender, action: str, using: str | None = None, **kwargs) -> None:
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: list_cache.invalidate('product'), using=using)
+# endregion
+
+
+# region Collection versions and product counts
+# A collection's last_update (its ETag, see store.conditional) changes whenever one of its products changes,
+# and its products_count follows products being created, deleted or moved to another collection.
+@receiver(post_save, sender=Product)
+def update_collections_on_save(sender, instance: Product, created: bool, **kwargs) -> None:
+    loaded_collection_id: int | None = getattr(instance, '_loaded_collection_id', None)
+    deltas: Counter = Counter()
+    if created:
+        deltas[instance.collection_id] += 1
+    elif loaded_collection_id is not None and loaded_collection_id != instance.collection_id:
+        deltas[loaded_collection_id] -= 1
+        deltas[instance.collection_id] += 1
+    update_collections({instance.collection_id, loaded_collection_id} - {None}, deltas)
+    instance._loaded_collection_id = instance.collection_id
+
+
+@receiver(post_delete, sender=Product)
+def update_collections_on_delete(sender, instance: Product, **kwargs) -> None:
+    collection_id: int = getattr(instance, '_loaded_collection_id', None) or instance.collection_id
+    update_collections({collection_id}, {collection_id: -1})
+
+
+@receiver(bulk_changed, sender=Product)
+def update_collections_on_bulk_change(sender, collection_ids: set = frozenset(), count_deltas: dict = None,
+                                      **kwargs) -> None:
+    update_collections(collection_ids, count_deltas or {})
+
+
+def update_collections(collection_ids: set, count_deltas: dict) -> None:
+    """
+    Touches `last_update` of `collection_ids` and applies `count_deltas` to their products_count
+    with one UPDATE per distinct delta.
+    """
+    now = timezone.now()
+    by_delta: dict = defaultdict(set)
+    for pk in collection_ids:
+        by_delta[count_deltas.get(pk, 0)].add(pk)
+    for delta, pks in by_delta.items():
+        changes: dict = {'last_update': now}
+        if delta:
+            changes['products_count'] = F('products_count') + delta
+        Collection.objects.filter(pk__in=pks).update(**changes)
+# endregion
+
+
+# region Product versions and tags
+# Tags are part of the product representation (`?include=tags`), so tagging changes touch the products'
+# last_update, which is their ETag (see store.conditional).
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def touch_tagged_product(sender, instance: TaggedItem, **kwargs) -> None:
+    if instance.content_type_id == ContentType.objects.get_for_model(Product).id:
+        Product.objects.filter(pk=instance.object_id).update(last_update=timezone.now())
+
+
+@receiver(post_save, sender=Tag)
+def touch_products_of_tag(sender, instance: Tag, created: bool, **kwargs) -> None:
+    if not created:
+        content_type = ContentType.objects.get_for_model(Product)
+        product_ids = TaggedItem.objects.filter(tag=instance, content_type=content_type).values('object_id')
+        Product.objects.filter(pk__in=product_ids).update(last_update=timezone.now())
+# endregion
+
+
+# region Final prices
+# Product.final_price caches the price after the best promotion and tax (see store.pricing). It is recomputed when
+# the unit price, the discount of one of the product's promotions or the set of its promotions changes; a
+# repriced product gets a new last_update, so its ETag follows its price.
+@receiver(pre_save, sender=Product)
+def price_product_on_save(sender, instance: Product, **kwargs) -> None:
+    if 'unit_price' not in instance.__dict__:
+        # deferred and untouched, it is not saved
+        return
+    if instance._state.adding:
+        instance.final_price = pricing.final_price(instance.unit_price)
+    elif instance.unit_price != getattr(instance, '_loaded_unit_price', None):
+        best: float | None = Promotion.objects.filter(product=instance.pk).aggregate(best=Max('discount'))['best']
+        instance.final_price = pricing.final_price(instance.unit_price, best or 0.0)
+    instance._loaded_unit_price = instance.unit_price
+
+
+@receiver(post_save, sender=Promotion)
+def reprice_products_of_promotion(sender, instance: Promotion, created: bool, **kwargs) -> None:
+    if not created:
+        Product.objects.filter(promotions=instance).refresh_final_prices()
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_products_of_promotion(sender, instance: Promotion, **kwargs) -> None:
+    # the links are deleted with the promotion, before post_delete
+    instance._product_ids = list(Product.objects.filter(promotions=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def reprice_products_of_deleted_promotion(sender, instance: Promotion, **kwargs) -> None:
+    product_ids: list = getattr(instance, '_product_ids', [])
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).refresh_final_prices()
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def reprice_products_on_promotions(sender, instance, action: str, reverse: bool, pk_set: set = None,
+                                   **kwargs) -> None:
+    # reverse: `promotion.product_set` changed, `instance` is the promotion and pk_set holds product ids
+    if action == 'pre_clear' and reverse:
+        instance._cleared_product_ids = list(instance.product_set.values_list('pk', flat=True))
+        return
+    if action in ('post_add', 'post_remove'):
+        product_ids = pk_set if reverse else {instance.pk}
+    elif action == 'post_clear':
+        product_ids = getattr(instance, '_cleared_product_ids', []) if reverse else {instance.pk}
+    else:
+        return
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).refresh_final_prices()
+# endregion
+
+
+# region Order totals
+# Order.total_price and items_count follow the items saved or deleted one by one, e.g. through the admin's
+# OrderItemInline; OrderItemQuerySet refreshes them after bulk writes.
+@receiver(post_save, sender=OrderItem)
+def refresh_order_totals_on_save(sender, instance: OrderItem, **kwargs) -> None:
+    loaded_order_id: int | None = getattr(instance, '_loaded_order_id', None)
+    Order.objects.filter(pk__in={instance.order_id, loaded_order_id} - {None}).refresh_totals()
+    instance._loaded_order_id = instance.order_id
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals_on_delete(sender, instance: OrderItem, origin=None, **kwargs) -> None:
+    # items deleted along with their order leave no totals to refresh
+    if isinstance(origin, Order) or (isinstance(origin, QuerySet) and origin.model is Order):
+        return
+    Order.objects.filter(pk=instance.order_id).refresh_totals()
+# endregion
+
+
+# region Customer order counts
+# Customer.orders_count follows orders saved or deleted one by one (checkout, the admin); OrderQuerySet keeps it
+# in step after bulk writes.
+@receiver(post_save, sender=Order)
+def update_orders_count_on_save(sender, instance: Order, created: bool, **kwargs) -> None:
+    loaded_customer_id: int | None = getattr(instance, '_loaded_customer_id', None)
+    deltas: Counter = Counter()
+    if created:
+        deltas[instance.customer_id] += 1
+    elif loaded_customer_id is not None and loaded_customer_id != instance.customer_id:
+        deltas[loaded_customer_id] -= 1
+        deltas[instance.customer_id] += 1
+    Customer.objects.add_orders(deltas)
+    instance._loaded_customer_id = instance.customer_id
+
+
+@receiver(post_delete, sender=Order)
+def update_orders_count_on_delete(sender, instance: Order, **kwargs) -> None:
+    customer_id: int = getattr(instance, '_loaded_customer_id', None) or instance.customer_id
+    Customer.objects.add_orders({customer_id: -1})
+# endregion
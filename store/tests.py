@@ -1,3 +1,1440 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, router, transaction
+from django.db.models import Max, QuerySet
+from django.db.models.signals import post_delete
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from likes.models import LikeCounter, LikedItem
+from storefront import metrics, routers
+from storefront.metrics import ARCHIVE, MetricsMiddleware, Registry
+from tags.models import Tag, TaggedItem
+from . import rollups
+from . import urls as store_urls
+from . import views
+from .cache import list_cache
+from .checkout import InsufficientStock, checkout
+from .models import (LOW_INVENTORY, Cart, CartItem, Collection, Customer, DailyProductSales, DailySales, Order,
+                     OrderItem, Product, Promotion)
+from .pagination import CollectionPagination, ProductPagination
+from .pricing import final_price, final_price_expression
+from .renderers import ORJSONRenderer
+from .search import search_products
+from .serializers import ProductReadSerializer, ProductSerializer
+from .views import PRODUCT_FILTERS, ProductList
+
+
+def create_product(collection: Collection, inventory: int, unit_price: str = '10.00') -> Product:
+    return Product.objects.create(title='Product', slug='product', unit_price=Decimal(unit_price),
+                                  inventory=inventory, collection=collection)
+
+
+def create_cart(*items: tuple) -> Cart:
+    cart: Cart = Cart.objects.create()
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=quantity)
+                                  for product, quantity in items])
+    return cart
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Walks every ordering of the product list forwards through the `next` links and back through the `previous`
+    links, over products that share their sort keys, so the id tie-breaker decides where the pages split.
+    """
+    page_size: int = 4
+
+    def setUp(self) -> None:
+        list_cache.backend.clear()
+        collection: Collection = Collection.objects.create(title='Collection')
+        # 11 products with 3 values of every sort key
+        products: list = Product.objects.bulk_create([
+            Product(title=f'Product {index % 3}', slug='product', unit_price=Decimal(10 + index % 3), inventory=1,
+                    collection=collection)
+            for index in range(11)])
+        for key in range(3):
+            Product.objects.filter(pk__in=[product.pk for product in products[key::3]]).update(
+                last_update=datetime(2024, 5, 1 + key, tzinfo=dt_timezone.utc))
+
+    def walk(self, url: str, link: str) -> list:
+        """
+        [(url, ids)] of the pages from `url` on, following the `link` ('next' or 'previous') links to the end.
+        """
+        pages: list = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            pages.append((url, [row['id'] for row in response.json()['results']]))
+            url = response.json()[link]
+        return pages
+
+    def test_walks_every_ordering_both_ways(self) -> None:
+        for ordering in ProductPagination.orderings:
+            with self.subTest(ordering=ordering):
+                field: str = ordering.lstrip('-')
+                rows = Product.objects.values_list(field, 'id')
+                expected: list = [pk for _, pk in sorted(rows, reverse=ordering.startswith('-'))]
+
+                forward: list = self.walk(
+                    f'{reverse("store:product_list")}?ordering={ordering}&page_size={self.page_size}', 'next')
+                self.assertEqual([len(ids) for _, ids in forward], [4, 4, 3])
+                self.assertEqual([pk for _, ids in forward for pk in ids], expected)
+                backward: list = self.walk(forward[-1][0], 'previous')
+                self.assertEqual([ids for _, ids in reversed(backward)], [ids for _, ids in forward])
+
+    def test_invalid_cursors_are_not_found(self) -> None:
+        url: str = reverse('store:product_list')
+        link: str = self.client.get(url, {'ordering': 'title', 'page_size': 2}).json()['next']
+        cursor: str = parse_qs(urlsplit(link).query)['cursor'][0]
+        # garbage, a cursor of another ordering and a truncated one
+        for query in ({'cursor': 'garbage'}, {'cursor': cursor}, {'ordering': 'title', 'cursor': cursor[:-6]}):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(url, query).status_code, 404)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self) -> None:
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.product: Product = create_product(self.collection, inventory=1)
+        self.url: str = reverse('store:product_detail', kwargs={'pk': self.product.pk})
+
+    def etag(self, url: str) -> str:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_not_modified_and_precondition_failed(self) -> None:
+        etag: str = self.etag(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+        response = self.client.patch(self.url, {'title': 'Renamed'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['ETag'], self.etag(self.url))
+        # the ETag the client had is stale now
+        response = self.client.patch(self.url, {'title': 'Lost update'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).title, 'Renamed')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etags_follow_tags_prices_and_products(self) -> None:
+        collection_url: str = reverse('store:collection_detail', kwargs={'pk': self.collection.pk})
+        changes: dict = {
+            'tagged': lambda: TaggedItem.objects.create(tag=Tag.objects.create(label='Tag'), object_id=self.product.pk,
+                                                        content_type=ContentType.objects.get_for_model(Product)),
+            'tag renamed': lambda: Tag.objects.update_or_create(label='Tag', defaults={'label': 'Renamed'}),
+            'repriced': lambda: self.product.promotions.add(Promotion.objects.create(description='Sale',
+                                                                                     discount=0.5)),
+        }
+        for change, write in changes.items():
+            with self.subTest(change=change):
+                etag: str = self.etag(self.url)
+                write()
+                self.assertNotEqual(self.etag(self.url), etag)
+
+        # the collection's ETag follows its products
+        etag: str = self.etag(collection_url)
+        Product.objects.filter(pk=self.product.pk).update(inventory=5)
+        self.assertNotEqual(self.etag(collection_url), etag)
+
+
+class AsyncViewTests(TestCase):
+    """
+    The async views (STORE_ASYNC_VIEWS) answer exactly like the DRF views of the same URLs.
+    """
+    def setUp(self) -> None:
+        list_cache.backend.clear()
+        self.factory = RequestFactory()
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        for index in range(5):
+            create_product(self.collection, inventory=index, unit_price=f'{10 + index}.00')
+
+    def assertSameResponse(self, sync_view, async_view, url: str, query: dict = None, headers: dict = None,
+                           **kwargs) -> HttpResponseBase:
+        responses: list = []
+        for view in (sync_view, async_to_sync(async_view.as_view())):
+            # both read the rows themselves instead of the entry the other one cached
+            list_cache.backend.clear()
+            response = view(self.factory.get(url, query, headers=headers), **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            responses.append(response)
+        expected, actual = ((response.status_code, response.content, response.get('ETag'),
+                             response.get('Content-Type')) for response in responses)
+        self.assertEqual(actual, expected)
+        return responses[0]
+
+    def test_lists(self) -> None:
+        url: str = reverse('store:product_list')
+        for query in ({}, {'ordering': '-unit_price', 'page_size': 2}, {'collection': self.collection.pk,
+                                                                         'price_min': '11', 'inventory_lt': '4'},
+                      {'price_min': 'invalid'}, {'cursor': 'garbage'}):
+            with self.subTest(query=query):
+                self.assertSameResponse(views.ProductList.as_view(), views.AsyncProductList, url, query)
+        # the next page, through the cursor of the first one
+        link: str = self.client.get(url, {'page_size': 2}).json()['next']
+        self.assertSameResponse(views.ProductList.as_view(), views.AsyncProductList, url,
+                                parse_qs(urlsplit(link).query))
+        self.assertSameResponse(views.CollectionList.as_view(), views.AsyncCollectionList,
+                                reverse('store:collection_list'))
+
+    def test_every_ordering_pages_through(self) -> None:
+        cases: list = [
+            (views.ProductList, views.AsyncProductList, 'store:product_list', ProductPagination, Product),
+            (views.CollectionList, views.AsyncCollectionList, 'store:collection_list', CollectionPagination,
+             Collection),
+        ]
+        for sync_view_class, async_view_class, name, pagination_class, model in cases:
+            url: str = reverse(name)
+            for ordering in pagination_class.orderings:
+                with self.subTest(view=name, ordering=ordering):
+                    query: dict | None = {'ordering': ordering, 'page_size': 2}
+                    seen: list = []
+                    while query is not None:
+                        response = self.assertSameResponse(sync_view_class.as_view(), async_view_class, url, query)
+                        self.assertEqual(response.status_code, 200)
+                        page: dict = json.loads(response.content)
+                        seen += [row['id'] for row in page['results']]
+                        query = page['next'] and parse_qs(urlsplit(page['next']).query)
+                    self.assertCountEqual(seen, model.objects.values_list('pk', flat=True))
+
+    def test_details(self) -> None:
+        product: Product = Product.objects.first()
+        cases: list = [
+            (views.ProductDetail, views.AsyncProductDetail, 'store:product_detail', product.pk),
+            (views.CollectionDetail, views.AsyncCollectionDetail, 'store:collection_detail', self.collection.pk),
+        ]
+        for sync_view_class, async_view_class, name, pk in cases:
+            with self.subTest(view=name):
+                url: str = reverse(name, kwargs={'pk': pk})
+                sync_view = sync_view_class.as_view()
+                etag: str = self.assertSameResponse(sync_view, async_view_class, url, pk=pk)['ETag']
+                response = self.assertSameResponse(sync_view, async_view_class, url, headers={'If-None-Match': etag},
+                                                   pk=pk)
+                self.assertEqual(response.status_code, 304)
+                self.assertSameResponse(sync_view, async_view_class, reverse(name, kwargs={'pk': 0}), pk=0)
+
+
+class ListCacheInvalidationTests(TestCase):
+    def test_generations_are_bumped_on_commit(self) -> None:
+        collection: Collection = Collection.objects.create(title='Collection')
+        before: list = list_cache.get_generations(('product',))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            create_product(collection, inventory=1)
+            Product.objects.update(inventory=2)
+            # not committed yet: a concurrent read would still see the old rows
+            self.assertEqual(list_cache.get_generations(('product',)), before)
+        self.assertTrue(callbacks)
+        self.assertGreater(list_cache.get_generations(('product',))[0], before[0])
+
+    @override_settings(ALLOWED_HOSTS=['public.example.com', 'internal'])
+    def test_entries_are_per_scheme_and_host(self) -> None:
+        list_cache.backend.clear()
+        create_product(Collection.objects.create(title='Collection'), inventory=1)
+        url: str = reverse('store:product_list')
+        links: list = []
+        for host, secure in (('internal', False), ('public.example.com', True), ('public.example.com', False)):
+            with self.subTest(host=host, secure=secure):
+                response = self.client.get(url, headers={'Host': host}, secure=secure)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                links.append(response.json()['results'][0]['collection'])
+        self.assertEqual(len(set(links)), 3)
+        self.assertEqual(self.client.get(url, headers={'Host': 'internal'})['X-Cache'], 'HIT')
+
+    def test_stats_are_for_staff(self) -> None:
+        url: str = reverse('store:list_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('customer', 'customer@example.com', 'password'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self) -> None:
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.title_match: Product = Product.objects.create(
+            title='Organic bread', slug='bread', description='Whole wheat', unit_price=Decimal(1), inventory=1,
+            collection=self.collection)
+        self.description_match: Product = Product.objects.create(
+            title='Rye loaf', slug='rye', description='Organic rye bread, baked daily', unit_price=Decimal(1),
+            inventory=1, collection=self.collection)
+        self.other: Product = Product.objects.create(
+            title='Cheese', slug='cheese', description='Cheddar', unit_price=Decimal(1), inventory=1,
+            collection=self.collection)
+
+    def search(self, query: str, **params) -> list:
+        # the list cache is invalidated on commit, which never comes in a TestCase
+        list_cache.backend.clear()
+        response = self.client.get(reverse('store:product_search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_ranking_and_prefixes(self) -> None:
+        # title matches outrank description matches
+        self.assertEqual(self.search('organic bread'), [self.title_match.pk, self.description_match.pk])
+        self.assertEqual(self.search('orga BRE'), [self.title_match.pk, self.description_match.pk])
+        self.assertEqual(self.search('ched'), [self.other.pk])
+        self.assertEqual(self.search('rye daily'), [self.description_match.pk])
+        self.assertEqual(self.search('bread cheese'), [])
+        # FTS5 keywords are plain terms
+        self.assertEqual(self.search('organic OR cheese'), [])
+        self.assertEqual(self.client.get(reverse('store:product_search'), {'q': ' ?! '}).status_code, 400)
+
+    def test_index_follows_writes(self) -> None:
+        self.title_match.title = 'Sourdough'
+        self.title_match.save()
+        self.assertEqual(self.search('sourd'), [self.title_match.pk])
+        self.assertEqual(self.search('organic'), [self.description_match.pk])
+
+        Product.objects.filter(pk=self.other.pk).update(description='Aged gouda')
+        self.assertEqual(self.search('gouda'), [self.other.pk])
+        self.assertEqual(self.search('cheddar'), [])
+
+        self.description_match.delete()
+        self.assertEqual(self.search('organic'), [])
+
+        url: str = reverse('store:product_bulk')
+        response = self.client.post(url, [{'title': 'Bulk baguette', 'slug': 'baguette', 'inventory': 1,
+                                           'price': '2.00', 'collection': self.collection.pk}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        created: int = response.json()['results'][0]['data']['id']
+        self.assertEqual(self.search('bague'), [created])
+        response = self.client.patch(url, [{'id': created, 'title': 'Bulk brioche'}], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search('bague'), [])
+        self.assertEqual(self.search('brio'), [created])
+
+    def test_pages_follow_the_ranking(self) -> None:
+        Product.objects.bulk_create([
+            Product(title='Organic ' * (1 + index % 3), slug='organic', description='Organic', unit_price=Decimal(1),
+                    inventory=1, collection=self.collection)
+            for index in range(7)])
+        expected: list = list(search_products(Product.objects.all(), 'organic')
+                              .order_by('-rank', '-id').values_list('id', flat=True))
+        list_cache.backend.clear()
+        pages: list = []
+        url: str | None = f'{reverse("store:product_search")}?q=organic&page_size=3'
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.json()['results']])
+            url = response.json()['next']
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+    def test_admin_search_uses_the_index(self) -> None:
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:store_product_changelist'), {'q': 'orga'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({product.pk for product in response.context['cl'].result_list},
+                         {self.title_match.pk, self.description_match.pk})
+        if connection.vendor == 'sqlite':
+            self.assertTrue(any('store_product_fts MATCH' in query['sql'] for query in queries.captured_queries))
+
+
+class ProductTagsTests(TestCase):
+    def setUp(self) -> None:
+        list_cache.backend.clear()
+        collection: Collection = Collection.objects.create(title='Collection')
+        self.tagged, self.untagged = create_product(collection, inventory=1), create_product(collection, inventory=1)
+        content_type: ContentType = ContentType.objects.get_for_model(Product)
+        for label in ('Vegan', 'Organic'):
+            TaggedItem.objects.create(tag=Tag.objects.create(label=label), content_type=content_type,
+                                      object_id=self.tagged.pk)
+        # a tag of another model with the same object id
+        TaggedItem.objects.create(tag=Tag.objects.create(label='Staff'), object_id=self.untagged.pk,
+                                  content_type=ContentType.objects.get_for_model(User))
+
+    def test_batch_lookup(self) -> None:
+        with self.assertNumQueries(1):
+            tags: dict = TaggedItem.objects.get_tags_for_many(Product, [self.tagged.pk, self.untagged.pk])
+        self.assertEqual({pk: [tag.label for tag in labels] for pk, labels in tags.items()},
+                         {self.tagged.pk: ['Organic', 'Vegan'], self.untagged.pk: []})
+        with self.assertNumQueries(0):
+            self.assertEqual(TaggedItem.objects.get_tags_for_many(Product, []), {})
+
+    def test_include_tags(self) -> None:
+        response = self.client.get(reverse('store:product_list'), {'include': 'tags', 'ordering': 'id'})
+        self.assertEqual([row['tags'] for row in response.json()['results']], [['Organic', 'Vegan'], []])
+        for product, labels in ((self.tagged, ['Organic', 'Vegan']), (self.untagged, [])):
+            with self.subTest(product=product.pk):
+                response = self.client.get(reverse('store:product_detail', kwargs={'pk': product.pk}),
+                                           {'include': 'tags'})
+                self.assertEqual(response.json()['tags'], labels)
+        response = self.client.get(reverse('store:product_detail', kwargs={'pk': self.tagged.pk}))
+        self.assertNotIn('tags', response.json())
+
+
+class ProductLikeTests(TestCase):
+    def setUp(self) -> None:
+        list_cache.backend.clear()
+        collection: Collection = Collection.objects.create(title='Collection')
+        self.liked, self.other = create_product(collection, inventory=1), create_product(collection, inventory=1)
+        self.users: list = [User.objects.create_user(f'user{index}', f'user{index}@example.com', 'password')
+                            for index in range(2)]
+        self.url: str = reverse('store:product_like', kwargs={'pk': self.liked.pk})
+
+    def counter(self, product: Product) -> int | None:
+        return (LikeCounter.objects.filter(content_type=ContentType.objects.get_for_model(Product),
+                                           object_id=product.pk)
+                .values_list('count', flat=True).first())
+
+    def test_like_and_unlike_are_idempotent(self) -> None:
+        self.assertIn(self.client.post(self.url).status_code, (401, 403))
+        self.client.force_login(self.users[0])
+        response = self.client.post(self.url)
+        self.assertEqual((response.status_code, response.json()), (201, {'likes_count': 1, 'liked_by_me': True}))
+        response = self.client.post(self.url)
+        self.assertEqual((response.status_code, response.json()), (200, {'likes_count': 1, 'liked_by_me': True}))
+        self.client.force_login(self.users[1])
+        self.assertEqual(self.client.post(self.url).json(), {'likes_count': 2, 'liked_by_me': True})
+        self.assertEqual(self.counter(self.liked), 2)
+
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.counter(self.liked), 1)
+        self.assertEqual(LikedItem.objects.get().user, self.users[0])
+        self.assertEqual(self.client.post(reverse('store:product_like', kwargs={'pk': 0})).status_code, 404)
+
+    def test_batch_lookup(self) -> None:
+        content_type: ContentType = ContentType.objects.get_for_model(Product)
+        LikedItem.objects.create(user=self.users[0], content_type=content_type, object_id=self.liked.pk)
+        LikedItem.objects.create(user=self.users[1], content_type=content_type, object_id=self.liked.pk)
+        ids: list = [self.liked.pk, self.other.pk]
+        with self.assertNumQueries(2):
+            likes: dict = LikedItem.objects.get_likes_for_many(Product, ids, self.users[0])
+        self.assertEqual(likes, {self.liked.pk: (2, True), self.other.pk: (0, False)})
+        with self.assertNumQueries(1):
+            likes = LikedItem.objects.get_likes_for_many(Product, ids, AnonymousUser())
+        self.assertEqual(likes, {self.liked.pk: (2, False), self.other.pk: (0, False)})
+        with self.assertNumQueries(0):
+            self.assertEqual(LikedItem.objects.get_likes_for_many(Product, [], self.users[0]), {})
+
+    def test_repair_counters(self) -> None:
+        content_type: ContentType = ContentType.objects.get_for_model(Product)
+        for product in (self.liked, self.other):
+            LikedItem.objects.create(user=self.users[0], content_type=content_type, object_id=product.pk)
+        # one counter drifted, the other is missing
+        LikeCounter.objects.filter(object_id=self.liked.pk).update(count=5)
+        LikeCounter.objects.filter(object_id=self.other.pk).delete()
+
+        out = io.StringIO()
+        call_command('repair_counters', 'likes.likecounter', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue(), 'likes.likecounter: 2 drifted rows found\n')
+        self.assertEqual((self.counter(self.liked), self.counter(self.other)), (5, None))
+        out = io.StringIO()
+        call_command('repair_counters', 'likes.likecounter', stdout=out)
+        self.assertEqual(out.getvalue(), 'likes.likecounter: 2 drifted rows repaired\n')
+        self.assertEqual((self.counter(self.liked), self.counter(self.other)), (1, 1))
+
+
+class ProductBulkTests(TestCase):
+    def setUp(self) -> None:
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.url: str = reverse('store:product_bulk')
+
+    def item(self, **data) -> dict:
+        return {'title': 'Bulk', 'slug': 'bulk', 'inventory': 1, 'price': '5.00', 'collection': self.collection.pk,
+                **data}
+
+    def statuses(self, response) -> list:
+        return [result['status'] for result in response.json()['results']]
+
+    def test_batches_are_all_or_nothing(self) -> None:
+        items: list = [self.item(), self.item(collection=0), self.item(price='-1')]
+        response = self.client.post(self.url, items, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(response), [424, 400, 400])
+        self.assertEqual(set(response.json()['results'][1]['errors']), {'collection'})
+        self.assertEqual(set(response.json()['results'][2]['errors']), {'price'})
+        self.assertFalse(Product.objects.exists())
+
+        response = self.client.post(self.url + '?atomic=false', items, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.statuses(response), [201, 400, 400])
+        self.assertEqual(Product.objects.get().pk, response.json()['results'][0]['data']['id'])
+
+    def test_updates_reject_unknown_and_duplicate_ids(self) -> None:
+        product: Product = create_product(self.collection, inventory=1)
+        items: list = [{'id': product.pk, 'inventory': 7}, {'id': product.pk, 'inventory': 8},
+                       {'id': product.pk + 1, 'inventory': 9}, {'inventory': 10}]
+        response = self.client.patch(self.url, items, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(response), [424, 400, 400, 400])
+        self.assertEqual(Product.objects.get(pk=product.pk).inventory, 1)
+
+        response = self.client.patch(self.url + '?atomic=false', items, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['results'][0]['data']['inventory'], 7)
+        self.assertEqual(Product.objects.get(pk=product.pk).inventory, 7)
+
+
+class CartItemTests(TestCase):
+    def setUp(self) -> None:
+        self.product: Product = create_product(Collection.objects.create(title='Collection'), inventory=1)
+        self.cart: Cart = Cart.objects.create()
+
+    def add(self, cart_id, product_id: int, quantity: int):
+        return self.client.post(reverse('store:cart_item_list', kwargs={'pk': cart_id}),
+                                {'product_id': product_id, 'quantity': quantity}, content_type='application/json')
+
+    def test_quantities_are_added_up_to_the_maximum(self) -> None:
+        self.assertEqual(self.add(self.cart.pk, self.product.pk, 2).json()['quantity'], 2)
+        self.assertEqual(self.add(self.cart.pk, self.product.pk, 3).json()['quantity'], 5)
+        response = self.add(self.cart.pk, self.product.pk, CartItem.MAX_QUANTITY)
+        self.assertEqual((response.status_code, set(response.json())), (400, {'quantity'}))
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_unknown_cart_or_product_writes_nothing(self) -> None:
+        # in a transaction, as with ATOMIC_REQUESTS: nothing may be left to fail at the commit
+        with transaction.atomic():
+            self.assertEqual(self.add(uuid.uuid4(), self.product.pk, 1).status_code, 404)
+            response = self.add(self.cart.pk, self.product.pk + 1, 1)
+            self.assertEqual((response.status_code, set(response.json())), (400, {'product_id'}))
+            self.assertFalse(CartItem.objects.exists())
+            connection.check_constraints()
+
+
+class CheckoutTests(TestCase):
+    def setUp(self) -> None:
+        self.collection = Collection.objects.create(title='Collection')
+        self.customer = Customer.objects.create(first_name='A', last_name='B', email='a@example.com', phone='1')
+
+    def test_checkout_snapshots_prices_and_deletes_the_cart(self) -> None:
+        product: Product = create_product(self.collection, inventory=5, unit_price='12.50')
+        cart: Cart = create_cart((product, 2))
+
+        order, _ = checkout(cart.pk, self.customer)
+        Product.objects.filter(pk=product.pk).update(unit_price=Decimal('99.00'))
+
+        item: OrderItem = OrderItem.objects.get(order=order)
+        self.assertEqual((item.quantity, item.unit_price), (2, Decimal('12.50')))
+        self.assertEqual(Product.objects.get(pk=product.pk).inventory, 3)
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_insufficient_stock_changes_nothing(self) -> None:
+        plenty: Product = create_product(self.collection, inventory=10)
+        scarce: Product = create_product(self.collection, inventory=1)
+        cart: Cart = create_cart((plenty, 2), (scarce, 3))
+
+        with self.assertRaises(InsufficientStock) as raised:
+            checkout(cart.pk, self.customer)
+
+        self.assertEqual(raised.exception.shortages, [{'product_id': scarce.pk, 'requested': 3, 'available': 1}])
+        self.assertEqual(Product.objects.get(pk=plenty.pk).inventory, 10)
+        self.assertEqual(Product.objects.get(pk=scarce.pk).inventory, 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_order_totals_follow_the_items(self) -> None:
+        first: Product = create_product(self.collection, inventory=10, unit_price='10.10')
+        second: Product = create_product(self.collection, inventory=10, unit_price='3.33')
+        order, _ = checkout(create_cart((first, 2), (second, 3)).pk, self.customer)
+
+        def totals() -> tuple:
+            return Order.objects.values_list('total_price', 'items_count').get(pk=order.pk)
+
+        self.assertEqual((order.total_price, order.items_count), (Decimal('30.19'), 5))
+        self.assertEqual(totals(), (Decimal('30.19'), 5))
+
+        item: OrderItem = OrderItem.objects.get(order=order, product=second)
+        item.quantity = 1
+        item.save()
+        self.assertEqual(totals(), (Decimal('23.53'), 3))
+        OrderItem.objects.filter(order=order).update(quantity=2)
+        self.assertEqual(totals(), (Decimal('26.86'), 4))
+        item.delete()
+        self.assertEqual(totals(), (Decimal('20.20'), 2))
+
+    def test_saving_an_order_keeps_its_totals(self) -> None:
+        product: Product = create_product(self.collection, inventory=10, unit_price='10.00')
+        order, _ = checkout(create_cart((product, 1)).pk, self.customer)
+        # loaded before an item is added, saved after, as the admin's change form does
+        loaded: Order = Order.objects.get(pk=order.pk)
+        OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=Decimal('5.00'))
+        loaded.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        loaded.save()
+        self.assertEqual(Order.objects.values_list('payment_status', 'total_price', 'items_count').get(pk=order.pk),
+                         (Order.PAYMENT_STATUS_COMPLETE, Decimal('20.00'), 3))
+
+    def test_items_deleted_with_their_order_refresh_nothing(self) -> None:
+        product: Product = create_product(self.collection, inventory=10)
+        order, items = checkout(create_cart((product, 1)).pk, self.customer)
+        for origin in (order, Order.objects.filter(pk=order.pk)):
+            with self.subTest(origin=origin), self.assertNumQueries(0):
+                post_delete.send(sender=OrderItem, instance=items[0], origin=origin, using='default')
+
+
+class CollectionCounterTests(TestCase):
+    def test_saving_a_collection_keeps_products_count(self) -> None:
+        collection: Collection = Collection.objects.create(title='Collection')
+        loaded: Collection = Collection.objects.get(pk=collection.pk)
+        create_product(collection, inventory=1)
+        loaded.title = 'Renamed'
+        loaded.save()
+        self.assertEqual(Collection.objects.values_list('title', 'products_count').get(pk=collection.pk),
+                         ('Renamed', 1))
+
+    def test_collection_with_products_is_not_deleted(self) -> None:
+        collection: Collection = Collection.objects.create(title='Collection')
+        create_product(collection, inventory=1)
+        # a counter that drifted
+        Collection.objects.filter(pk=collection.pk).update(products_count=0)
+        response = self.client.delete(reverse('store:collection_detail', kwargs={'pk': collection.pk}))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Collection.objects.filter(pk=collection.pk).exists())
+
+
+class CustomerOrderCountTests(TestCase):
+    def test_orders_count_follows_the_orders(self) -> None:
+        first, second = (Customer.objects.create(first_name=name, last_name='B', email=f'{name}@example.com',
+                                                 phone='1') for name in ('a', 'b'))
+
+        def counts() -> tuple:
+            return tuple(Customer.objects.order_by('pk').values_list('orders_count', flat=True))
+
+        order: Order = Order.objects.create(customer=first)
+        Order.objects.bulk_create([Order(customer=first), Order(customer=second)])
+        self.assertEqual(counts(), (2, 1))
+        order = Order.objects.get(pk=order.pk)
+        order.customer = second
+        order.save()
+        self.assertEqual(counts(), (1, 2))
+        Order.objects.filter(customer=second).update(customer=first)
+        self.assertEqual(counts(), (3, 0))
+        Order.objects.filter(pk=order.pk).delete()
+        self.assertEqual(counts(), (2, 0))
+
+    def test_saving_a_customer_keeps_orders_count(self) -> None:
+        customer: Customer = Customer.objects.create(first_name='A', last_name='B', email='a@example.com', phone='1')
+        # loaded before the order is placed, saved after, as the admin's list_editable membership does
+        loaded: Customer = Customer.objects.get(pk=customer.pk)
+        Order.objects.create(customer=customer)
+        loaded.membership = Customer.MEMBERSHIP_GOLD
+        loaded.save()
+        self.assertEqual(Customer.objects.values_list('membership', 'orders_count').get(pk=customer.pk),
+                         (Customer.MEMBERSHIP_GOLD, 1))
+
+
+class CustomerAdminSearchTests(TestCase):
+    names: tuple = ("O'Brien", 'Obama', 'Zoë', 'Zoey', 'Jean-Luc', 'Jeanne', '100% Cotton', '1000 Lakes', 'a_b', 'ab')
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        Customer.objects.bulk_create([Customer(first_name=name, last_name='Smith', email=f'{i}@example.com',
+                                               phone='1') for i, name in enumerate(cls.names)])
+
+    def search(self, term: str) -> set:
+        queryset, _ = admin.site._registry[Customer].get_search_results(None, Customer.objects.all(), term)
+        return set(queryset.values_list('first_name', flat=True))
+
+    def test_punctuation_and_non_ascii_prefixes(self) -> None:
+        expected: dict = {
+            "o'b": {"O'Brien"},
+            'zoë': {'Zoë'},
+            'jean-': {'Jean-Luc'},
+            '100%': {'100% Cotton'},
+            'a_': {'a_b'},
+            '"jean-l"': {'Jean-Luc'},
+        }
+        for term, names in expected.items():
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), names)
+                # the same rows as the admin's own istartswith search
+                prefix: str = term.strip('"')
+                self.assertEqual(set(Customer.objects.filter(first_name__istartswith=prefix)
+                                     .values_list('first_name', flat=True)), names)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self) -> None:
+        self.collection = Collection.objects.create(title='Collection')
+        self.customer = Customer.objects.create(first_name='A', last_name='B', email='a@example.com', phone='1')
+        self.product: Product = create_product(self.collection, inventory=10, unit_price='2.50')
+
+    def test_update_reaggregates_the_changed_days(self) -> None:
+        order, _ = checkout(create_cart((self.product, 2)).pk, self.customer)
+        # the first run builds everything
+        rollups.update(lag=0)
+        self.assertEqual(DailySales.objects.values_list('revenue', 'units', 'orders_count').get(),
+                         (Decimal('5.00'), 2, 1))
+
+        OrderItem.objects.filter(order=order).update(quantity=3)
+        checkout(create_cart((self.product, 1)).pk, self.customer)
+        days, _ = rollups.update(lag=0)
+        self.assertEqual(days, [timezone.localdate(order.placed_at)])
+        self.assertEqual(DailyProductSales.objects.values_list('revenue', 'units', 'orders_count').get(),
+                         (Decimal('10.00'), 4, 2))
+        self.assertFalse(any(rollups.check().values()))
+        self.assertEqual(rollups.update(lag=0), ([], 0))
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """
+    Many threads check out carts competing for the same stock at once: every unit is sold at most once.
+    """
+    threads: int = 8
+    carts_per_thread: int = 4
+    stock: int = 10
+
+    def setUp(self) -> None:
+        collection = Collection.objects.create(title='Collection')
+        self.customer = Customer.objects.create(first_name='A', last_name='B', email='a@example.com', phone='1')
+        self.contested: Product = create_product(collection, inventory=self.stock)
+        self.other: Product = create_product(collection, inventory=1000)
+        # Items in both orders across carts, so checkouts lock the same rows, in primary key order
+        self.carts: list = [
+            create_cart((self.other, 1), (self.contested, 1)) if index % 2 else
+            create_cart((self.contested, 1), (self.other, 1))
+            for index in range(self.threads * self.carts_per_thread)
+        ]
+
+    def run_checkout(self, cart: Cart, results: list) -> None:
+        # SQLite reports a concurrent writer as "database is locked" instead of waiting for it: retry
+        for attempt in range(100):
+            try:
+                checkout(cart.pk, self.customer)
+                results.append('ordered')
+                return
+            except InsufficientStock:
+                results.append('short')
+                return
+            except OperationalError:
+                if connection.vendor != 'sqlite':
+                    raise
+                time.sleep(0.001 * (attempt + 1))
+        results.append('gave up')
+
+    def test_inventory_never_goes_negative(self) -> None:
+        results: list = []
+        barrier = threading.Barrier(self.threads)
+
+        def worker(carts: list) -> None:
+            try:
+                barrier.wait()
+                for cart in carts:
+                    self.run_checkout(cart, results)
+            finally:
+                connections.close_all()
+
+        threads: list = [threading.Thread(target=worker, args=(self.carts[index::self.threads],))
+                         for index in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ordered: int = results.count('ordered')
+        self.assertEqual(len(results), len(self.carts))
+        self.assertNotIn('gave up', results)
+        self.assertEqual(ordered, self.stock)
+        self.assertEqual(Product.objects.get(pk=self.contested.pk).inventory, 0)
+        self.assertEqual(Product.objects.get(pk=self.other.pk).inventory, 1000 - ordered)
+        self.assertEqual(Order.objects.count(), ordered)
+        self.assertEqual(OrderItem.objects.filter(product=self.contested).count(), self.stock)
+        self.assertEqual(Cart.objects.count(), len(self.carts) - ordered)
+
+
+class PricingTests(TestCase):
+    def setUp(self) -> None:
+        self.collection = Collection.objects.create(title='Collection')
+
+    def final_price(self, product: Product) -> Decimal:
+        return Product.objects.get(pk=product.pk).final_price
+
+    def test_sql_and_python_prices_round_the_same(self) -> None:
+        promotions: list = [Promotion.objects.create(description='Promotion', discount=discount)
+                            for discount in (0.05, 0.125, 0.15, 0.333, 0.5, 1.5)]
+        # every price from 0.01 to 20.00: all the half cent cases of every discount
+        products: list = Product.objects.bulk_create([
+            Product(title='Product', slug='product', unit_price=Decimal(cents) / 100, inventory=1,
+                    collection=self.collection)
+            for cents in range(1, 2001)
+        ])
+        Product.promotions.through.objects.bulk_create([
+            Product.promotions.through(product_id=product.pk, promotion_id=promotions[index % 7].pk)
+            for index, product in enumerate(products) if index % 7 < len(promotions)
+        ])
+
+        rows = (Product.objects
+                .annotate(best=Max('promotions__discount'), computed=final_price_expression(Product))
+                .values_list('unit_price', 'best', 'computed'))
+        mismatches: list = [row for row in rows if row[2] != final_price(row[0], row[1] or 0.0)]
+        self.assertEqual(mismatches, [])
+
+    def test_final_price_follows_prices_and_promotions(self) -> None:
+        product: Product = create_product(self.collection, inventory=1, unit_price='20.00')
+        promotion: Promotion = Promotion.objects.create(description='Promotion', discount=0.1)
+        self.assertEqual(self.final_price(product), Decimal('22.00'))
+
+        product.promotions.add(promotion)
+        self.assertEqual(self.final_price(product), Decimal('19.80'))
+        promotion.discount = 0.25
+        promotion.save()
+        self.assertEqual(self.final_price(product), Decimal('16.50'))
+        Product.objects.filter(pk=product.pk).update(unit_price=Decimal('10.01'))
+        self.assertEqual(self.final_price(product), Decimal('8.26'))
+        promotion.delete()
+        self.assertEqual(self.final_price(product), Decimal('11.01'))
+
+
+class ProductReadSerializerTests(TestCase):
+    """
+    The `.values()` fast path renders the same bytes as ProductSerializer over model instances. Products always
+    have a collection (the foreign key is not nullable), so the edge cases are in the other columns.
+    """
+    def setUp(self) -> None:
+        collection: Collection = Collection.objects.create(title='Collection')
+        products: list = [
+            Product.objects.create(title='Plain', slug='plain', unit_price=Decimal('10.00'), inventory=5,
+                                   collection=collection),
+            Product.objects.create(title='Épée "quoted" \\ ✓', slug='epee', description=None,
+                                   unit_price=Decimal('0.01'), inventory=0, collection=collection),
+            Product.objects.create(title='Empty', slug='empty', description='', unit_price=Decimal('9999.99'),
+                                   inventory=2 ** 31 - 1, collection=collection),
+            Product.objects.create(title='Discounted', slug='discounted', description='Line\nbreak',
+                                   unit_price=Decimal('10.01'), inventory=1, collection=collection),
+        ]
+        products[3].promotions.add(Promotion.objects.create(description='Sale', discount=0.333))
+        tag: Tag = Tag.objects.create(label='Tag')
+        self.tags: dict = {products[0].pk: [tag, tag]}
+        self.likes: dict = {products[0].pk: (3, True), products[1].pk: (1, False)}
+
+    def test_renders_the_bytes_of_product_serializer(self) -> None:
+        request: Request = Request(APIRequestFactory().get('/store/products/'))
+        instances: list = list(Product.objects.order_by('pk'))
+        rows: list = list(Product.objects.order_by('pk').values(*ProductReadSerializer.values_fields))
+        self.assertEqual(len({row['final_price'] for row in rows}), len(rows), 'the products share a final price')
+        contexts: dict = {'plain': {}, 'tags': {'tags': self.tags}, 'likes': {'likes': self.likes}}
+        for name, extra in contexts.items():
+            context: dict = {'request': request, **extra}
+            for renderer in (ORJSONRenderer(), JSONRenderer()):
+                with self.subTest(context=name, renderer=type(renderer).__name__):
+                    expected: bytes = renderer.render(ProductSerializer(instances, many=True, context=context).data)
+                    actual: bytes = renderer.render(ProductReadSerializer(rows, many=True, context=context).data)
+                    self.assertEqual(actual, expected)
+                    expected = renderer.render(ProductSerializer(instances[1], context=context).data)
+                    self.assertEqual(renderer.render(ProductReadSerializer(rows[1], context=context).data), expected)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self) -> None:
+        list_cache.backend.clear()
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.product: Product = create_product(self.collection, inventory=1)
+        self.promotion: Promotion = Promotion.objects.create(description='Sale', discount=0.1)
+        self.product.promotions.add(self.promotion)
+
+    def test_fields_and_expand_shape_the_representation(self) -> None:
+        response = self.client.get(reverse('store:product_list'),
+                                   {'fields': 'id,collection,promotions', 'expand': 'collection,promotions'})
+        self.assertEqual(response.json()['results'], [{
+            'id': self.product.pk,
+            'collection': {'id': self.collection.pk, 'title': 'Collection', 'products_count': 1},
+            'promotions': [{'id': self.promotion.pk, 'description': 'Sale', 'discount': 0.1}],
+        }])
+
+        Collection.objects.filter(pk=self.collection.pk).update(featured_product=self.product)
+        response = self.client.get(reverse('store:collection_detail', kwargs={'pk': self.collection.pk}),
+                                   {'fields': 'title,featured_product', 'expand': 'featured_product'})
+        self.assertEqual(set(response.json()), {'title', 'featured_product'})
+        self.assertEqual(response.json()['featured_product']['id'], self.product.pk)
+        self.assertNotIn('ETag', response)
+
+        response = self.client.get(reverse('store:product_detail', kwargs={'pk': self.product.pk}),
+                                   {'fields': 'id,unknown'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Requests through ReplicaMiddleware, with 'replica' (a test mirror of 'default') as the replica. SimpleTestCase,
+    so that no test transaction is open on 'default': one would pin every read to the primary.
+    """
+    databases: set = {'default', 'replica'}
+
+    def setUp(self) -> None:
+        routers.health.reset()
+        self.addCleanup(routers.health.reset)
+
+    @staticmethod
+    def view(request: HttpRequest) -> JsonResponse:
+        # the databases the reads of a routed model go to, before and after the request writes
+        reads: list = [Product.objects.all().db]
+        if 'write' in request.GET:
+            router.db_for_write(Product)
+            reads.append(Product.objects.all().db)
+        # cached data computed from replica reads expires after the tolerated lag
+        timeout = routers.replica_lag_timeout()
+        return JsonResponse({'reads': reads, 'unrouted': User.objects.all().db,
+                             'lag_timeout': None if timeout is DEFAULT_TIMEOUT else timeout})
+
+    def request(self, method: str = 'get', pinned: bool = False, **query) -> HttpResponse:
+        request: HttpRequest = getattr(RequestFactory(), method)('/', query)
+        if pinned:
+            request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        return routers.ReplicaMiddleware(self.view)(request)
+
+    def test_reads_go_to_the_replica(self) -> None:
+        response = self.request()
+        self.assertEqual(json.loads(response.content), {'reads': ['replica'], 'unrouted': 'default',
+                                                        'lag_timeout': settings.REPLICA_STICKY_SECONDS})
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        # outside of requests
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    def test_writes_pin_to_the_primary(self) -> None:
+        response = self.request(write='1')
+        self.assertEqual(json.loads(response.content)['reads'], ['replica', 'default'])
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        # the next requests of the client read its own writes
+        self.assertEqual(json.loads(self.request(pinned=True).content), {'reads': ['default'], 'unrouted': 'default',
+                                                                      'lag_timeout': None})
+        for method in ('post', 'patch', 'delete'):
+            with self.subTest(method=method):
+                self.assertEqual(json.loads(self.request(method).content)['reads'], ['default'])
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self) -> None:
+        with mock.patch.object(connections['replica'], 'ensure_connection', side_effect=OperationalError):
+            self.assertEqual(json.loads(self.request().content)['reads'], ['default'])
+        # skipped for REPLICA_RETRY_SECONDS without trying to connect again
+        self.assertEqual(json.loads(self.request().content)['reads'], ['default'])
+        routers.health.reset()
+        self.assertEqual(json.loads(self.request().content)['reads'], ['replica'])
+
+
+class MetricsTests(SimpleTestCase):
+    def test_snapshots_of_exited_processes_are_archived(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            worker: Registry = Registry()
+            worker.observe('store:product_list', 200, (0.01, 0.001, 2, 100))
+            # a process that exited, with a pid no process can have
+            (Path(directory) / '999999999-0.json').write_text(json.dumps(worker.snapshot()))
+            live: Registry = Registry()
+            live.observe('store:product_list', 200, (0.01, 0.001, 2, 100))
+            live.flush(directory)
+
+            for _ in range(2):
+                merged: dict = Registry().collect(directory)
+                self.assertEqual(merged['store:product_list'].statuses, {'200': 2})
+            self.assertEqual(sorted(path.name for path in Path(directory).glob('*.json')),
+                             sorted([ARCHIVE, live.snapshot_name()]))
+
+    def test_metrics_are_not_public(self) -> None:
+        url: str = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7',
+                                             HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7',
+                                             HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+
+    def test_metrics_stay_in_process_without_posix_locks(self) -> None:
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            with mock.patch.object(metrics, 'fcntl', None):
+                registry: Registry = Registry()
+                middleware: MetricsMiddleware = MetricsMiddleware(lambda request: HttpResponse(b'x'),
+                                                                  registry=registry)
+                self.assertIsNone(middleware.directory)
+                request: HttpRequest = RequestFactory().get('/')
+                request.resolver_match = None
+                middleware(request)
+                self.assertEqual(registry.snapshot()[metrics.UNRESOLVED]['statuses'], {'200': 1})
+                self.assertEqual(list(Path(directory).iterdir()), [])
+            self.assertEqual(MetricsMiddleware(lambda request: HttpResponse()).directory, directory)
+
+
+class RendererTests(SimpleTestCase):
+    def test_orjson_renders_like_drf(self) -> None:
+        data: ReturnDict = ReturnDict({
+            'price': Decimal('19.99'),
+            'ratio': 0.1,
+            'placed_at': datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=dt_timezone.utc),
+            'day': date(2024, 5, 1),
+            'key': uuid.UUID(int=1),
+            'label': gettext_lazy('Label'),
+            'text': 'caf\u00e9 \u2028 \u2029 \U0001f600',
+            'counts': {1: None, 2: [True, False]},
+            'items': (1, 2),
+        }, serializer=None)
+        for media_type in (None, 'application/json; indent=4'):
+            self.assertEqual(ORJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+
+class ProductExportTests(TestCase):
+    def setUp(self) -> None:
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.other: Collection = Collection.objects.create(title='Other')
+        self.products: list = [
+            Product.objects.create(title='Plain', slug='plain', unit_price=Decimal('10.00'), inventory=1,
+                                   collection=self.collection),
+            Product.objects.create(title='Comma, "quote"', slug='quoted', description='Line\nbreak',
+                                   unit_price=Decimal('2.50'), inventory=0, collection=self.collection),
+            Product.objects.create(title='Other', slug='other', unit_price=Decimal('1.00'), inventory=3,
+                                   collection=self.other),
+        ]
+        self.url: str = reverse('store:product_export')
+
+    def export(self, query: dict = None):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_formats(self) -> None:
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records: list = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([record['id'] for record in records], [product.pk for product in self.products])
+        self.assertEqual(set(records[1]), set(views.ProductExport.columns))
+        self.assertEqual((records[1]['title'], records[1]['description'], records[1]['price']),
+                         ('Comma, "quote"', 'Line\nbreak', 2.5))
+
+        response, content = self.export({'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        rows: list = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], list(views.ProductExport.columns))
+        self.assertEqual(len(rows), 4)
+        # quotes, commas and line breaks survive the round trip
+        self.assertEqual(rows[2][:4], [str(self.products[1].pk), 'Comma, "quote"', 'quoted', 'Line\nbreak'])
+        self.assertIn('"Comma, ""quote"""', content)
+
+        for query in ({'format': 'xml'}, {'collection': 'x'}, {'updated_since': 'yesterday'}):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(self.url, query).status_code, 400)
+
+    def test_filters(self) -> None:
+        _, content = self.export({'collection': [self.other.pk]})
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.products[2].pk])
+        Product.objects.filter(pk=self.products[0].pk).update(last_update=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        _, content = self.export({'format': 'csv', 'collection': [self.collection.pk, self.other.pk],
+                                  'updated_since': '2021-01-01'})
+        self.assertEqual([row[0] for row in csv.reader(io.StringIO(content))][1:],
+                         [str(self.products[1].pk), str(self.products[2].pk)])
+
+    def test_rows_are_streamed_in_batches(self) -> None:
+        view = views.ProductExport.as_view(chunk_size=2, batch_size=2)
+        # the queryset is only ever iterated, never loaded whole
+        with mock.patch.object(QuerySet, '_fetch_all', side_effect=AssertionError('materialized')):
+            with self.assertNumQueries(0):
+                response = view(RequestFactory().get(self.url))
+            self.assertIsInstance(response, StreamingHttpResponse)
+            chunks: list = [chunk.decode('utf-8') for chunk in response.streaming_content]
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [2, 1])
+
+
+class CompressionTests(TestCase):
+    def test_large_responses_are_compressed(self) -> None:
+        collection: Collection = Collection.objects.create(title='Collection')
+        Product.objects.bulk_create([Product(title=f'Product {index}', slug='product', unit_price=Decimal(10),
+                                             inventory=1, collection=collection) for index in range(50)])
+        list_cache.backend.clear()
+        url: str = reverse('store:product_list') + '?page_size=50'
+        plain = self.client.get(url)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+        small = self.client.get(url.replace('page_size=50', 'page_size=1'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+
+class ProductFilterIndexTests(TestCase):
+    """
+    The filter and ordering combinations of the product list that PRODUCT_FILTERS documents as index-served read
+    the expected index in the requested order, searching a range of every filtered column, and sort nothing. On
+    PostgreSQL sequential scans, bitmap scans and sorts are disabled for the check: on test-sized tables they are
+    the cheapest plans whatever the indexes, and with them off the planner picks an ordered index scan if any.
+    """
+    # ordering field -> (index of the ordering, index of the ordering after `collection`), None is the primary key
+    ordering_indexes: dict = {
+        'id': (None, 'store_product_coll_id_idx'),
+        'title': ('store_product_title_id_idx', 'store_product_coll_title_idx'),
+        'unit_price': ('store_product_price_id_idx', 'store_product_coll_price_idx'),
+        'final_price': ('store_product_final_id_idx', 'store_product_coll_final_idx'),
+        'last_update': ('store_product_update_id_idx', 'store_product_coll_update_idx'),
+    }
+    # range filter -> (value, filtered column, which is also an ordering)
+    range_filters: dict = {
+        'price_min': ('1', 'unit_price'),
+        'price_max': ('100', 'unit_price'),
+        'final_price_min': ('1', 'final_price'),
+        'final_price_max': ('100', 'final_price'),
+        'updated_since': ('2000-01-01', 'last_update'),
+    }
+
+    def setUp(self) -> None:
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        for inventory in (1, 50):
+            create_product(self.collection, inventory=inventory)
+
+    def served_queries(self) -> list:
+        """
+        [(query, index, searched columns)] of every index-served combination.
+        """
+        self.assertEqual(set(self.range_filters) | {'collection', 'inventory_lt'}, set(PRODUCT_FILTERS),
+                         'a product filter is not covered by the test')
+        collection: dict = {'collection': self.collection.pk}
+        served: list = []
+        for ordering in ProductPagination.orderings:
+            index, collection_index = self.ordering_indexes[ordering.lstrip('-')]
+            served.append(({'ordering': ordering}, index, ()))
+            served.append(({**collection, 'ordering': ordering}, collection_index, ('collection_id',)))
+        for param, (value, column) in self.range_filters.items():
+            index, collection_index = self.ordering_indexes[column]
+            for ordering in (column, f'-{column}'):
+                served.append(({param: value, 'ordering': ordering}, index, (column,)))
+                served.append(({**collection, param: value, 'ordering': ordering}, collection_index,
+                               ('collection_id', column)))
+        # any bound up to LOW_INVENTORY, the condition of the partial low stock index
+        for ordering in ('id', '-id'):
+            served.append(({'inventory_lt': LOW_INVENTORY // 2, 'ordering': ordering}, 'store_product_low_stock_idx',
+                           ()))
+        return served
+
+    @staticmethod
+    def explain(query: dict) -> str:
+        request: Request = Request(APIRequestFactory().get('/', query))
+        view: ProductList = ProductList(request=request, format_kwarg=None, args=(), kwargs={})
+        queryset = view.pagination_class().page_queryset(view.filter_queryset(view.get_queryset()), request)
+        return queryset.explain()
+
+    def assertServedBy(self, plan: str, index: str | None, columns: tuple) -> None:
+        if connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, r'\bSort\b')
+            self.assertRegex(plan, rf'Index Scan (Backward )?using {index or "store_product_pkey"} on store_product')
+            for column in columns:
+                self.assertRegex(plan, rf'Index Cond: .*\b{column} [<>=]')
+            return
+        self.assertNotIn('TEMP B-TREE', plan)
+        if index is None:
+            # SQLite tables are b-trees keyed by id
+            self.assertRegex(plan, r'(?m)\bSCAN store_product$')
+        elif columns:
+            conditions: str = ' AND '.join(rf'{column}[<>=]\?' for column in columns)
+            self.assertRegex(plan, rf'(?m)\bSEARCH store_product USING INDEX {index} \({conditions}\)$')
+        else:
+            self.assertRegex(plan, rf'(?m)\bSCAN store_product USING INDEX {index}$')
+
+    def test_served_combinations_read_their_index(self) -> None:
+        for query, index, columns in self.served_queries():
+            with self.subTest(query=query), transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        for setting in ('enable_seqscan', 'enable_bitmapscan', 'enable_sort'):
+                            cursor.execute(f'SET LOCAL {setting} = off')
+                plan: str = self.explain(query)
+                self.assertServedBy(plan, index, columns)
+
+
+class QueryCountTests(TestCase):
+    """
+    Query count regression harness: every URL of store.urls, and the changelist, add form and change form of every
+    model registered in the admin, is requested with `small` and then `large` rows in every table, a share of them
+    related to the requested objects (see add_rows()). A request fails when it takes more queries with more rows, or more
+    than its budget; the report names the statements whose count grew, or all of them when over budget.
+
+    Every request is rolled back, so writes see the same data at both sizes. New URLs and admins fail until they
+    get requests in `store_requests()` (for URLs) and a budget in `budgets`.
+    """
+    small: int = 10
+    large: int = 1000
+    # request name -> most queries it may take, including the session and user lookups of the staff client (2)
+    budgets: dict = {
+        'GET product_list': 3,
+        'GET product_list?include=tags,likes&ordering=-final_price&final_price_min=1': 6,
+        'POST product_list': 5,
+        'GET product_list?fields=id,title,price,collection,promotions&expand=collection,promotions': 4,
+        'GET product_list?collection={collection}&price_max=100&inventory_lt=5&ordering=-last_update': 3,
+        'GET product_list?price_min=1&updated_since=2000-01-01&ordering=unit_price': 3,
+        'GET product_search?q=product': 3,
+        'GET product_search?q=product&fields=id,title&expand=promotions': 3,
+        'GET product_detail': 4,
+        'GET product_detail?include=tags,likes': 6,
+        'GET product_detail?expand=collection,promotions': 4,
+        'PATCH product_detail': 7,
+        'POST product_like': 12,
+        'DELETE product_like': 5,
+        'POST product_bulk': 7,
+        'PATCH product_bulk': 8,
+        'GET product_export': 1,
+        'GET product_export?format=csv': 1,
+        'GET collection_list': 3,
+        'GET collection_list?fields=id,title': 3,
+        'GET collection_list?expand=featured_product': 3,
+        'POST collection_list': 3,
+        'GET collection_detail': 4,
+        'GET collection_detail?expand=featured_product': 3,
+        'PATCH collection_detail': 6,
+        'POST cart_list': 4,
+        'GET cart_detail': 3,
+        'POST cart_item_list': 6,
+        'PUT cart_item_detail': 6,
+        'DELETE cart_item_detail': 6,
+        'POST cart_checkout': 19,
+        'GET customer_order_list': 3,
+        'GET sales_report?group=day&start=2000-01-01': 4,
+        'GET sales_report?group=collection&start=2000-01-01': 4,
+        'GET sales_report?group=product&start=2000-01-01': 4,
+        'GET list_cache_stats': 2,
+        'admin group changelist': 5,
+        'admin group search': 5,
+        'admin group add': 5,
+        'admin group change': 7,
+        'admin user changelist': 6,
+        'admin user search': 6,
+        'admin user add': 6,
+        'admin user change': 9,
+        'admin collection changelist': 5,
+        'admin collection search': 5,
+        'admin collection add': 4,
+        'admin collection change': 6,
+        'admin customer changelist': 5,
+        'admin customer search': 4,
+        'admin customer add': 4,
+        'admin customer change': 5,
+        'admin order changelist': 5,
+        'admin order add': 4,
+        'admin order change': 8,
+        'admin product changelist': 6,
+        'admin product search': 5,
+        'admin product add': 5,
+        'admin product change': 10,
+        'admin tag changelist': 5,
+        'admin tag search': 5,
+        'admin tag add': 4,
+        'admin tag change': 5,
+    }
+
+    def setUp(self) -> None:
+        self.user: User = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        self.group: Group = Group.objects.create(name='Group')
+        self.collection: Collection = Collection.objects.create(title='Collection')
+        self.promotions: list = Promotion.objects.bulk_create([Promotion(description=f'Promotion {index}',
+                                                                         discount=0.05 * index)
+                                                               for index in range(1, 4)])
+        self.product: Product = create_product(self.collection, inventory=1_000_000)
+        self.product.promotions.set(self.promotions)
+        Collection.objects.filter(pk=self.collection.pk).update(featured_product=self.product)
+        self.tag: Tag = Tag.objects.create(label='Tag')
+        self.customer: Customer = Customer.objects.create(first_name='Ada', last_name='Lovelace',
+                                                          email='ada@example.com', phone='1')
+        self.order: Order = Order.objects.create(customer=self.customer)
+        others: list = [create_product(self.collection, inventory=1_000_000) for _ in range(2)]
+        self.cart: Cart = create_cart((self.product, 1), *((product, 2) for product in others))
+        self.rows: int = 0
+
+    def add_rows(self, count: int) -> None:
+        """
+        Adds `count` rows to every table, half of the products, orders and tags going to the requested objects.
+        """
+        start: int = self.rows
+        indexes: range = range(start, start + count)
+        collections: list = Collection.objects.bulk_create([Collection(title=f'Collection {index}')
+                                                            for index in indexes])
+        products: list = Product.objects.bulk_create([
+            Product(title=f'Product {index}', slug=f'product-{index}', unit_price=Decimal(10 + index % 90),
+                    inventory=index % 20, collection=self.collection if index % 2 else collections[index - start])
+            for index in indexes])
+        Product.promotions.through.objects.bulk_create([
+            Product.promotions.through(product=product, promotion=self.promotions[index % 3])
+            for index, product in enumerate(products)])
+        Product.objects.filter(pk__in=[product.pk for product in products]).refresh_final_prices()
+        for collection, product in zip(collections, products):
+            collection.featured_product = product
+        Collection.objects.bulk_update(collections, ['featured_product'])
+
+        product_type: ContentType = ContentType.objects.get_for_model(Product)
+        tags: list = Tag.objects.bulk_create([Tag(label=f'Tag {index}') for index in indexes])
+        TaggedItem.objects.bulk_create([
+            TaggedItem(tag=tag, content_type=product_type,
+                       object_id=self.product.pk if index % 2 else products[index - start].pk)
+            for index, tag in zip(indexes, tags)])
+        users: list = User.objects.bulk_create([User(username=f'user{index}') for index in indexes])
+        for index, user in zip(indexes, users):
+            LikedItem.objects.create(user=user, content_type=product_type,
+                                     object_id=self.product.pk if index % 2 else products[index - start].pk)
+
+        customers: list = Customer.objects.bulk_create([
+            Customer(first_name=f'First {index}', last_name=f'Last {index}', email=f'customer{index}@example.com',
+                     phone=str(index))
+            for index in indexes])
+        orders: list = Order.objects.bulk_create([
+            Order(customer=self.customer if index % 2 else customers[index - start]) for index in indexes])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[index - start], quantity=1 + index % 3, unit_price=Decimal(10))
+            for index, order in zip(indexes, orders)])
+        OrderItem.objects.bulk_create([OrderItem(order=self.order, product=product, quantity=1, unit_price=Decimal(10))
+                                       for product in products[:max(count // 10, 1)]])
+        carts: list = Cart.objects.bulk_create([Cart() for _ in indexes])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1)
+                                      for cart, product in zip(carts, products)])
+        rollups.rebuild()
+        self.rows += count
+
+    def store_requests(self) -> dict:
+        """
+        {URL name: [(method, kwargs, query string, data)]} of the requests made to each URL of store.urls. The
+        `{collection}` placeholder of a query string is the collection of the subjects.
+        """
+        product: dict = {'pk': self.product.pk}
+        cart: dict = {'pk': self.cart.pk}
+        return {
+            'product_list': [('get', {}, '', None),
+                             ('get', {}, 'include=tags,likes&ordering=-final_price&final_price_min=1', None),
+                             ('get', {}, 'fields=id,title,price,collection,promotions&expand=collection,promotions',
+                              None),
+                             ('get', {}, 'collection={collection}&price_max=100&inventory_lt=5&ordering=-last_update',
+                              None),
+                             ('get', {}, 'price_min=1&updated_since=2000-01-01&ordering=unit_price', None),
+                             ('post', {}, '', {'title': 'New', 'slug': 'new', 'inventory': 1, 'price': '5.00',
+                                               'collection': f'/collection/{self.collection.pk}/'})],
+            'product_search': [('get', {}, 'q=product', None),
+                               ('get', {}, 'q=product&fields=id,title&expand=promotions', None)],
+            'product_detail': [('get', product, '', None),
+                               ('get', product, 'include=tags,likes', None),
+                               ('get', product, 'expand=collection,promotions', None),
+                               ('patch', product, '', {'title': 'Renamed'})],
+            'product_like': [('post', product, '', None), ('delete', product, '', None)],
+            'product_bulk': [('post', {}, '', [{'title': f'Bulk {index}', 'slug': 'bulk', 'inventory': 1,
+                                                'price': '5.00', 'collection': self.collection.pk}
+                                               for index in range(3)]),
+                             ('patch', {}, '', [{'id': self.product.pk, 'inventory': 5}])],
+            'product_export': [('get', {}, '', None), ('get', {}, 'format=csv', None)],
+            'collection_list': [('get', {}, '', None), ('get', {}, 'fields=id,title', None),
+                                ('get', {}, 'expand=featured_product', None), ('post', {}, '', {'title': 'New'})],
+            'collection_detail': [('get', {'pk': self.collection.pk}, '', None),
+                                  ('get', {'pk': self.collection.pk}, 'expand=featured_product', None),
+                                  ('patch', {'pk': self.collection.pk}, '', {'title': 'Renamed'})],
+            'cart_list': [('post', {}, '', None)],
+            'cart_detail': [('get', cart, '', None)],
+            'cart_item_list': [('post', cart, '', {'product_id': self.product.pk, 'quantity': 1})],
+            'cart_item_detail': [('put', {**cart, 'product_id': self.product.pk}, '', {'quantity': 3}),
+                                 ('delete', {**cart, 'product_id': self.product.pk}, '', None)],
+            'cart_checkout': [('post', cart, '', {'customer_id': self.customer.pk})],
+            'customer_order_list': [('get', {'pk': self.customer.pk}, '', None)],
+            'sales_report': [('get', {}, f'group={group}&start=2000-01-01', None)
+                             for group in ('day', 'collection', 'product')],
+            'list_cache_stats': [('get', {}, '', None)],
+        }
+
+    def requests(self) -> dict:
+        """
+        {request name: (method, path, data)} of every request of the harness.
+        """
+        requests: dict = {}
+        store_requests: dict = self.store_requests()
+        for pattern in store_urls.urlpatterns:
+            self.assertIn(pattern.name, store_requests, f'store:{pattern.name} has no requests in the harness')
+            for method, kwargs, query, data in store_requests[pattern.name]:
+                path: str = reverse(f'store:{pattern.name}', kwargs=kwargs) + (
+                    f'?{query.format(collection=self.collection.pk)}' if query else '')
+                requests[f'{method.upper()} {pattern.name}' + (f'?{query}' if query else '')] = (method, path, data)
+
+        subjects: dict = {Product: self.product, Order: self.order, Customer: self.customer,
+                          Collection: self.collection, Tag: self.tag, User: self.user, Group: self.group}
+        for model, model_admin in admin.site._registry.items():
+            info: tuple = (model._meta.app_label, model._meta.model_name)
+            self.assertIn(model, subjects, f'{model_admin} has no object to request in the harness')
+            requests[f'admin {info[1]} changelist'] = ('get', reverse('admin:%s_%s_changelist' % info), None)
+            if model_admin.search_fields:
+                requests[f'admin {info[1]} search'] = ('get', reverse('admin:%s_%s_changelist' % info) + '?q=a',
+                                                       None)
+            requests[f'admin {info[1]} add'] = ('get', reverse('admin:%s_%s_add' % info), None)
+            requests[f'admin {info[1]} change'] = ('get', reverse('admin:%s_%s_change' % info,
+                                                                  args=[subjects[model].pk]), None)
+        return requests
+
+    def count_queries(self, method: str, path: str, data) -> list:
+        """
+        The statements of one request, made after a warm-up request (ContentType and similar caches) and with an
+        empty list cache. Both are rolled back.
+        """
+        for warm_up in (True, False):
+            with transaction.atomic():
+                list_cache.backend.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(self.client, method)(path, data, content_type='application/json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                transaction.set_rollback(True)
+            self.assertLess(response.status_code, 400, f'{method.upper()} {path}: {response.status_code}')
+        return [query['sql'] for query in queries.captured_queries]
+
+    @staticmethod
+    def statement(sql: str) -> str:
+        # the statement with its values left out, so the same query for other rows counts as the same statement
+        sql = re.sub(r'"s\d+_x\d+"', '"savepoint"', sql)
+        sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+        sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+        return re.sub(r'\(\?(?:, \?)*\)', '(?...)', sql)
+
+    def report(self, name: str, small: list, large: list) -> str | None:
+        budget: int | None = self.budgets.get(name)
+        lines: list = []
+        if budget is None:
+            lines.append(f'{name}: no budget, took {len(small)} / {len(large)} queries')
+        if len(large) > len(small):
+            lines.append(f'{name}: {len(small)} queries with {self.small} rows, {len(large)} with {self.large} rows')
+            small_counts: Counter = Counter(map(self.statement, small))
+            large_counts: Counter = Counter(map(self.statement, large))
+            for statement, count in large_counts.items():
+                if count > small_counts[statement]:
+                    example: str = next(sql for sql in large if self.statement(sql) == statement)
+                    lines.append(f'    {small_counts[statement]} -> {count} x {example[:300]}')
+        if budget is not None and max(len(small), len(large)) > budget:
+            lines.append(f'{name}: {max(len(small), len(large))} queries, over its budget of {budget}')
+            lines.extend(f'    {sql[:300]}' for sql in large)
+        return '\n'.join(lines) or None
+
+    def test_query_counts_do_not_grow_with_rows(self) -> None:
+        self.add_rows(self.small)
+        counts: dict = {name: self.count_queries(*request) for name, request in self.requests().items()}
+        self.add_rows(self.large - self.small)
+        failures: list = []
+        for name, request in self.requests().items():
+            failure: str | None = self.report(name, counts[name], self.count_queries(*request))
+            if failure:
+                failures.append(failure)
+        if failures:
+            self.fail('\n' + '\n'.join(failures))
@@ -1,15 +1,37 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 # URLConf
 app_name = 'store'
 
+# Deployment mode: under ASGI (storefront.asgi) the catalog reads run natively async, the async views hand
+# every other request to the DRF view below them
+if getattr(settings, 'STORE_ASYNC_VIEWS', False):
+    product_list, product_detail = views.AsyncProductList.as_view(), views.AsyncProductDetail.as_view()
+    collection_list, collection_detail = views.AsyncCollectionList.as_view(), views.AsyncCollectionDetail.as_view()
+else:
+    product_list, product_detail = views.ProductList.as_view(), views.ProductDetail.as_view()
+    collection_list, collection_detail = views.CollectionList.as_view(), views.CollectionDetail.as_view()
+
 # region Class-based views URL patterns (New way)
 urlpatterns = [
-    path('', views.ProductList.as_view(), name='product_list'),
-    path('<int:pk>/', views.ProductDetail.as_view(), name='product_detail'),
-    path('collection/', views.CollectionList.as_view(), name='collection_list'),
-    path('collection/<int:pk>/', views.CollectionDetail.as_view(), name='collection_detail'),
+    path('', product_list, name='product_list'),
+    path('search/', views.ProductSearch.as_view(), name='product_search'),
+    path('<int:pk>/', product_detail, name='product_detail'),
+    path('<int:pk>/like/', views.ProductLike.as_view(), name='product_like'),
+    path('bulk/', views.ProductBulk.as_view(), name='product_bulk'),
+    path('export/', views.ProductExport.as_view(), name='product_export'),
+    path('collection/', collection_list, name='collection_list'),
+    path('collection/<int:pk>/', collection_detail, name='collection_detail'),
+    path('carts/', views.CartList.as_view(), name='cart_list'),
+    path('carts/<uuid:pk>/', views.CartDetail.as_view(), name='cart_detail'),
+    path('carts/<uuid:pk>/items/', views.CartItemList.as_view(), name='cart_item_list'),
+    path('carts/<uuid:pk>/items/<int:product_id>/', views.CartItemDetail.as_view(), name='cart_item_detail'),
+    path('carts/<uuid:pk>/checkout/', views.CartCheckout.as_view(), name='cart_checkout'),
+    path('customers/<int:pk>/orders/', views.CustomerOrderList.as_view(), name='customer_order_list'),
+    path('reports/sales/', views.SalesReport.as_view(), name='sales_report'),
+    path('cache/stats/', views.ListCacheStats.as_view(), name='list_cache_stats'),
 ]
 # endregion
 
@@ -1,20 +1,263 @@
-from django.db.models import Count
+import csv
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F, ProtectedError, Sum
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import serializers, status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.request import Request
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.views import APIView
 
-from .models import Product, Collection
-from .serializers import ProductSerializer, CollectionSerializer
+from likes.models import LikedItem
+from tags.models import TaggedItem
+from .cache import CachedListMixin, list_cache
+from .checkout import CartNotFound, EmptyCart, InsufficientStock, checkout
+from .conditional import ConditionalRequestMixin, get_conditional_response_for, set_validators
+from .models import (LOW_INVENTORY, Cart, CartItem, Collection, Customer, DailyCollectionSales, DailyProductSales,
+                     DailySales, Order, Product, Promotion)
+from .pagination import (CollectionPagination, KeysetPagination, OrderPagination, ProductPagination,
+                         ProductSearchPagination)
+from .pricing import price_with_tax
+from .renderers import ORJSONRenderer
+from .rollups import get_watermark
+from .search import parse_terms, search_products
+from .serializers import (CartItemSerializer, CheckoutSerializer, CollectionSalesSerializer, CollectionSerializer,
+                          DaySalesSerializer, OrderHistorySerializer, ProductBulkSerializer, ProductReadSerializer,
+                          ProductSalesSerializer, ProductSerializer, cart_representation, order_representation)
 
 
 # region (Concrete View Classes) more powerful and flexible than APIView.
-class ProductList(ListCreateAPIView):
-    queryset: Product = Product.objects.select_related('collection').order_by('-id')[0:5]
+def parse_names(query_params, param: str, allowed: tuple) -> set | None:
+    """
+    The comma separated names of `?<param>=`, None when the parameter is absent. Raises a ValidationError for
+    names not in `allowed`.
+    """
+    if param not in query_params:
+        return None
+    names: set = {name.strip() for name in query_params[param].split(',')} - {''}
+    unknown: set = names - set(allowed)
+    if unknown:
+        raise serializers.ValidationError(
+            {param: [f'Unknown names: {", ".join(sorted(unknown))}. Choices are: {", ".join(allowed)}.']})
+    return names
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=id,title` limits the representation to the listed `field_names`, and the view reads only the
+    columns they are built from. `?expand=` inlines the listed `expandable` relations instead of their links,
+    each with one join or one query for the whole page, never one per row. Both apply to GET / HEAD only.
+
+    Expanded objects can change without the object itself changing: expanded responses depend on the
+    `expand_dependencies` list cache generations and carry no ETag.
+    """
+    field_names: tuple = ()
+    expandable: tuple = ()
+    # expanded relation -> list cache generation
+    expand_dependencies: dict = {}
+
+    def get_sparse_fields(self) -> set | None:
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        return parse_names(self.request.query_params, 'fields', self.field_names)
+
+    def get_expand(self) -> set:
+        if self.request.method not in ('GET', 'HEAD'):
+            return set()
+        expand: set = parse_names(self.request.query_params, 'expand', self.expandable) or set()
+        fields: set | None = self.get_sparse_fields()
+        # nothing to expand for a relation that is not returned
+        return expand if fields is None else expand & fields
+
+    def get_serializer_context(self) -> dict:
+        context: dict = super().get_serializer_context()
+        fields: set | None = self.get_sparse_fields()
+        if fields is not None:
+            context['fields'] = fields
+        context['expand'] = self.get_expand()
+        return context
+
+    def get_cache_dependencies(self) -> tuple:
+        dependencies: tuple = super().get_cache_dependencies()
+        return dependencies + tuple(self.expand_dependencies[name] for name in sorted(self.get_expand())
+                                    if self.expand_dependencies[name] not in dependencies)
+
+    def use_validators(self) -> bool:
+        return not self.get_expand()
+
+
+class ProductIncludeMixin(SparseFieldsMixin):
+    """
+    `?include=tags,likes` adds the tag labels and `likes_count` / `liked_by_me` of the serialized products, each
+    looked up with one query (two for the likes of an authenticated user) for the whole page.
+    `?expand=collection` joins the collection, `?expand=promotions` adds the promotions with one query.
+
+    Like counts change far more often than products, so responses including likes depend on the 'like' list
+    cache generation, are not cached at all when they contain the user's own likes, and carry no ETag.
+    """
+    includes: tuple = ('tags', 'likes')
+    # include -> the output fields it adds
+    include_fields: dict = {'tags': ('tags',), 'likes': ('likes_count', 'liked_by_me')}
+    field_names: tuple = ('id', 'title', 'description', 'slug', 'inventory', 'price', 'price_with_tax',
+                          'final_price', 'collection', 'promotions', 'tags', 'likes_count', 'liked_by_me')
+    expandable: tuple = ('collection', 'promotions')
+    expand_dependencies: dict = {'collection': 'collection', 'promotions': 'promotion'}
+
+    def get_includes(self) -> set:
+        includes: set = set(self.request.query_params.get('include', '').split(',')) & set(self.includes)
+        fields: set | None = self.get_sparse_fields()
+        if fields is None:
+            return includes
+        return {include for include in includes if fields.intersection(self.include_fields[include])}
+
+    def get_values_fields(self) -> tuple:
+        """
+        The columns read by the `.values()` read path for `?fields=` / `?expand=`, with the sort key the paginator
+        reads from the rows.
+        """
+        names: tuple = ProductReadSerializer.get_values_fields(self.get_sparse_fields(), self.get_expand())
+        if self.pagination_class is not None and issubclass(self.pagination_class, KeysetPagination):
+            key: str = self.pagination_class().get_ordering(self.request).lstrip('-')
+            if key not in names and key in {field.attname for field in Product._meta.concrete_fields}:
+                names += (key,)
+        return names
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        includes: set = self.get_includes()
+        expand: set = kwargs['context'].get('expand', set())
+        if args and args[0] is not None and (includes or 'promotions' in expand):
+            rows: list = args[0] if kwargs.get('many') else [args[0]]
+            ids: list = [KeysetPagination.get_value(row, 'id') for row in rows]
+            if 'tags' in includes:
+                kwargs['context']['tags'] = TaggedItem.objects.get_tags_for_many(Product, ids)
+            if 'likes' in includes:
+                kwargs['context']['likes'] = LikedItem.objects.get_likes_for_many(Product, ids, self.request.user)
+            if 'promotions' in expand:
+                kwargs['context']['promotions'] = Promotion.objects.for_products(ids)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_cache_dependencies(self) -> tuple:
+        dependencies: tuple = super().get_cache_dependencies()
+        return dependencies + ('like',) if 'likes' in self.get_includes() else dependencies
+
+    def use_list_cache(self) -> bool:
+        return not ('likes' in self.get_includes() and self.request.user.is_authenticated)
+
+    def use_validators(self) -> bool:
+        return 'likes' not in self.get_includes() and super().use_validators()
+
+
+class ProductReadPathMixin:
+    """
+    GET / HEAD are served from `.values()` rows of the columns they need by `read_serializer_class`, the read-only
+    fast path; set it to None to serialize model instances instead.
+    """
+    read_serializer_class: ProductReadSerializer = ProductReadSerializer
+
+    def use_read_path(self) -> bool:
+        return self.read_serializer_class is not None and self.request.method in ('GET', 'HEAD')
+
+    def get_queryset(self):
+        if self.use_read_path():
+            return Product.objects.values(*self.get_values_fields())
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.use_read_path():
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+
+def parse_updated_since(value: str) -> datetime | None:
+    """
+    Parses an ISO 8601 datetime or date, naive values are taken as UTC.
+    """
+    try:
+        since: datetime | None = parse_datetime(value)
+        if since is None and (day := parse_date(value)) is not None:
+            since = datetime(day.year, day.month, day.day)
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = since.replace(tzinfo=dt_timezone.utc)
+    return since
+
+
+class UpdatedSinceField(serializers.Field):
+    default_error_messages: dict = {'invalid': 'Enter an ISO 8601 date or datetime.'}
+
+    def to_internal_value(self, data) -> datetime:
+        since: datetime | None = parse_updated_since(str(data))
+        if since is None:
+            self.fail('invalid')
+        return since
+
+
+# query parameter -> (lookup, field parsing its value). Bounds are inclusive except `inventory_lt`.
+# An index of Product.Meta.indexes reads only the rows of the page for: every ordering, unfiltered or with
+# `collection`; a price, final price or `updated_since` bound in the ordering on the same column, alone or with
+# `collection`; `inventory_lt` up to LOW_INVENTORY in id order (the partial low stock index). Other combinations
+# are answered but read more: they walk the index of the ordering skipping the rows that do not match
+# (`inventory_lt=50&ordering=id`, `updated_since=...&ordering=unit_price`), or read every matching row and sort
+# them (`price_min=1&ordering=title`, a range bound with `collection` in another ordering).
+PRODUCT_FILTERS: dict = {
+    'collection': ('collection_id', serializers.IntegerField(min_value=1)),
+    'price_min': ('unit_price__gte', serializers.DecimalField(max_digits=10, decimal_places=2)),
+    'price_max': ('unit_price__lte', serializers.DecimalField(max_digits=10, decimal_places=2)),
+    'final_price_min': ('final_price__gte', serializers.DecimalField(max_digits=10, decimal_places=2)),
+    'final_price_max': ('final_price__lte', serializers.DecimalField(max_digits=10, decimal_places=2)),
+    'inventory_lt': ('inventory__lt', serializers.IntegerField(min_value=0)),
+    'updated_since': ('last_update__gte', UpdatedSinceField()),
+}
+
+
+def apply_product_filters(queryset, query_params):
+    """
+    Applies the PRODUCT_FILTERS present in `query_params`, raises a ValidationError for malformed values.
+    """
+    errors: dict = {}
+    for param, (lookup, field) in PRODUCT_FILTERS.items():
+        if param not in query_params:
+            continue
+        try:
+            value = field.run_validation(query_params[param])
+        except serializers.ValidationError as exc:
+            errors[param] = exc.detail
+            continue
+        queryset = queryset.filter(**{lookup: value})
+        if param == 'inventory_lt' and value <= LOW_INVENTORY:
+            # the predicate of the partial low stock index, spelled out so that the planner matches it
+            queryset = queryset.filter(inventory__lt=LOW_INVENTORY)
+    if errors:
+        raise serializers.ValidationError(errors)
+    return queryset
+
+
+class ProductList(ProductReadPathMixin, ProductIncludeMixin, CachedListMixin, ListCreateAPIView):
+    # filters: PRODUCT_FILTERS; ordering and page size are applied by the keyset paginator (?ordering=, ?page_size=)
+    queryset: Product = Product.objects.select_related('collection')
     serializer_class: ProductSerializer = ProductSerializer
+    pagination_class: ProductPagination = ProductPagination
+    cache_dependencies: tuple = ('product', 'collection', 'promotion', 'tag')
+
+    def filter_queryset(self, queryset):
+        return apply_product_filters(super().filter_queryset(queryset), self.request.query_params)
 
     # if I need customizations over the queryset_class or serializer_class, I can write code here
     # def get_queryset(self):
@@ -30,7 +273,24 @@ class ProductList(ListCreateAPIView):
     #     return {'request': self.request}
 
 
-class ProductDetail(RetrieveUpdateDestroyAPIView):
+class ProductSearch(ProductIncludeMixin, CachedListMixin, ListAPIView):
+    """
+    Ranked full-text search over title and description: `?q=organic bre` matches products containing every term
+    as a word prefix, most relevant first (see store.search). Paginated by (rank, id) cursors.
+    """
+    serializer_class: ProductReadSerializer = ProductReadSerializer
+    pagination_class: ProductSearchPagination = ProductSearchPagination
+    cache_dependencies: tuple = ('product', 'tag')
+
+    def get_queryset(self):
+        query: str = self.request.query_params.get('q', '')
+        if not parse_terms(query):
+            raise serializers.ValidationError({'q': ['A search query is required.']})
+        return search_products(Product.objects.values(*self.get_values_fields()), query)
+
+
+class ProductDetail(ProductReadPathMixin, ProductIncludeMixin, ConditionalRequestMixin,
+                    RetrieveUpdateDestroyAPIView):
     queryset: Product = Product.objects.all()
     serializer_class: ProductSerializer = ProductSerializer
 
@@ -42,26 +302,645 @@ class ProductDetail(RetrieveUpdateDestroyAPIView):
                         status=status.HTTP_204_NO_CONTENT)
 
 
-class CollectionList(ListCreateAPIView):
-    queryset: Collection = Collection.objects.annotate(products_count=Count('product')).all().order_by('id')
+class ProductLike(APIView):
+    """
+    POST likes and DELETE unlikes a product for the current user. Both are idempotent: liking twice is a 200
+    instead of a 201 (the unique (user, content_type, object_id) constraint settles concurrent likes) and
+    unliking a product that is not liked is still a 204. Like counters are kept by likes.signals.handlers.
+    """
+    permission_classes: list = [IsAuthenticated]
+
+    def get_like(self, pk: int) -> dict:
+        return {'user': self.request.user, 'content_type': ContentType.objects.get_for_model(Product),
+                'object_id': pk}
+
+    def post(self, request: Request, pk: int) -> Response:
+        if not Product.objects.filter(pk=pk).exists():
+            raise NotFound()
+        with transaction.atomic():
+            _, created = LikedItem.objects.get_or_create(**self.get_like(pk))
+        likes_count, liked_by_me = LikedItem.objects.get_likes_for_many(Product, [pk], request.user)[pk]
+        return Response({'likes_count': likes_count, 'liked_by_me': liked_by_me},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request: Request, pk: int) -> Response:
+        with transaction.atomic():
+            # the row lock makes concurrent unlikes delete (and decrement the counter) once on PostgreSQL
+            like: LikedItem | None = LikedItem.objects.select_for_update().filter(**self.get_like(pk)).first()
+            if like is not None:
+                like.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProductBulk(APIView):
+    """
+    Batch endpoint for catalog syncs: POST creates and PATCH updates (every item needs an `id`) a list of products.
+
+    The whole batch is validated in one pass, the referenced collections are checked with a single query and the
+    writes go through bulk_create / bulk_update in one transaction. By default the batch is all-or-nothing;
+    with `?atomic=false` the valid items are written and the invalid ones are reported.
+    """
+    max_batch_size: int = 1000
+
+    def post(self, request: Request) -> Response:
+        return self.process(request, create=True)
+
+    def patch(self, request: Request) -> Response:
+        return self.process(request, create=False)
+
+    def process(self, request: Request, create: bool) -> Response:
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'message': 'Expected a non-empty list of products.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_batch_size:
+            return Response({'message': f'At most {self.max_batch_size} products per batch.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        atomic: bool = request.query_params.get('atomic', 'true').lower() not in ('false', '0', 'no')
+
+        with transaction.atomic():
+            validated, product_ids, errors = self.validate_items(items, create)
+            if errors and atomic:
+                return self.report(items, {}, errors, atomic, create)
+            if create:
+                products: dict = self.create_products(validated)
+            else:
+                products: dict = self.update_products(validated, product_ids)
+        return self.report(items, products, errors, atomic, create)
+
+    def validate_items(self, items: list, create: bool) -> tuple[dict, dict, dict]:
+        validator = ProductBulkSerializer(partial=not create)
+        validated: dict = {}  # index -> validated data
+        product_ids: dict = {}  # index -> product id (updates)
+        seen_ids: set = set()
+        errors: dict = {}  # index -> errors
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': ['Expected an object.']}
+                continue
+            if not create:
+                product_id = item.get('id')
+                if not isinstance(product_id, int) or isinstance(product_id, bool):
+                    errors[index] = {'id': ['A product id is required.']}
+                    continue
+                if product_id in seen_ids:
+                    errors[index] = {'id': [f'Product {product_id} appears more than once in the batch.']}
+                    continue
+                seen_ids.add(product_id)
+                product_ids[index] = product_id
+            try:
+                validated[index] = validator.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+
+        # One query for all the referenced collections
+        collection_ids: set = {data['collection_id'] for data in validated.values() if 'collection_id' in data}
+        existing_collections: set = set(Collection.objects.filter(pk__in=collection_ids).values_list('pk', flat=True))
+        # ... and one for the products to update
+        existing_products: dict = {}
+        if not create:
+            existing_products = Product.objects.select_for_update().in_bulk(
+                [product_ids[index] for index in validated])
+
+        for index, data in list(validated.items()):
+            error: dict | None = None
+            if 'collection_id' in data and data['collection_id'] not in existing_collections:
+                error = {'collection': [f'Invalid pk "{data["collection_id"]}" - object does not exist.']}
+            elif not create and product_ids[index] not in existing_products:
+                error = {'id': [f'Product {product_ids[index]} does not exist.']}
+            if error:
+                errors[index] = error
+                del validated[index]
+            elif not create:
+                data['product'] = existing_products[product_ids[index]]
+        return validated, product_ids, errors
+
+    @staticmethod
+    def create_products(validated: dict) -> dict:
+        products: dict = {index: Product(**data) for index, data in validated.items()}
+        Product.objects.bulk_create(products.values())
+        return products
+
+    @staticmethod
+    def update_products(validated: dict, product_ids: dict) -> dict:
+        products: dict = {}
+        fields: set = {'last_update'}
+        now = timezone.now()
+        for index, data in validated.items():
+            product: Product = data.pop('product')
+            for name, value in data.items():
+                setattr(product, name, value)
+            product.last_update = now
+            fields.update(data)
+            products[index] = product
+        if products:
+            Product.objects.bulk_update(products.values(), list(fields))
+            if 'unit_price' in fields:
+                # repriced by the database, see ProductQuerySet.update()
+                final_prices: dict = dict(Product.objects.filter(pk__in=[product.pk for product in products.values()])
+                                          .values_list('pk', 'final_price'))
+                for product in products.values():
+                    product.final_price = final_prices[product.pk]
+        return products
+
+    def report(self, items: list, products: dict, errors: dict, atomic: bool, create: bool) -> Response:
+        rows: list = [
+            {name: getattr(product, name) for name in ProductReadSerializer.values_fields}
+            for product in products.values()
+        ]
+        data: dict = dict(zip(products, ProductReadSerializer(rows, many=True,
+                                                              context={'request': self.request}).data))
+        success_status: int = status.HTTP_201_CREATED if create else status.HTTP_200_OK
+        results: list = []
+        for index in range(len(items)):
+            if index in errors:
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': errors[index]})
+            elif index in data:
+                results.append({'index': index, 'status': success_status, 'data': data[index]})
+            else:
+                # valid, but not written because another item failed an atomic batch
+                results.append({'index': index, 'status': status.HTTP_424_FAILED_DEPENDENCY})
+
+        if not errors:
+            response_status: int = success_status
+        elif atomic or not products:
+            response_status: int = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status: int = status.HTTP_207_MULTI_STATUS
+        return Response({
+            'atomic': atomic,
+            'succeeded': len(products),
+            'failed': len(errors),
+            'results': results,
+        }, status=response_status)
+
+
+class Echo:
+    """
+    File-like object for csv.writer that returns the written line instead of buffering it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class ProductExport(View):
+    """
+    Streams the whole catalog as NDJSON (default) or CSV (`?format=csv`) for feed generators.
+
+    Rows are read with `QuerySet.iterator(chunk_size=...)` (a server-side cursor on PostgreSQL) and flushed to the
+    client every `batch_size` rows, so memory stays flat and the first rows go out while the query is still
+    running. Filters: `?collection=<id>` (repeatable) and `?updated_since=<ISO 8601 datetime>`.
+    """
+    chunk_size: int = 2000
+    batch_size: int = 500
+    columns: tuple = ('id', 'title', 'slug', 'description', 'inventory', 'price', 'price_with_tax', 'final_price',
+                      'collection_id', 'collection_title', 'last_update')
+
+    def get(self, request: HttpRequest) -> StreamingHttpResponse | JsonResponse:
+        export_format: str = request.GET.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return JsonResponse({'message': 'format must be one of: ndjson, csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Product.objects.order_by('id')
+        collection_ids: list = request.GET.getlist('collection')
+        if collection_ids:
+            if not all(collection_id.isdigit() for collection_id in collection_ids):
+                return JsonResponse({'message': 'collection must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(collection_id__in=collection_ids)
+        updated_since: str | None = request.GET.get('updated_since')
+        if updated_since:
+            since: datetime | None = parse_updated_since(updated_since)
+            if since is None:
+                return JsonResponse({'message': 'updated_since must be an ISO 8601 date or datetime'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(last_update__gte=since)
+
+        rows = (queryset
+                .values_list('id', 'title', 'slug', 'description', 'inventory', 'unit_price', 'final_price',
+                             'collection_id', 'collection__title', 'last_update')
+                .iterator(chunk_size=self.chunk_size))
+        if export_format == 'csv':
+            response = StreamingHttpResponse(self.stream_csv(rows), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="products.csv"'
+        else:
+            response = StreamingHttpResponse(self.stream_ndjson(rows), content_type='application/x-ndjson')
+        return response
+
+    @staticmethod
+    def export_row(row: tuple) -> tuple:
+        # (id, title, slug, description, inventory, price, price_with_tax, final_price, collection_id,
+        #  collection_title, last_update)
+        return row[:6] + (price_with_tax(row[5]),) + row[6:9] + (row[9].isoformat(),)
+
+    def batches(self, rows):
+        while True:
+            batch: list = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def stream_ndjson(self, rows):
+        columns: tuple = self.columns
+        for batch in self.batches(rows):
+            lines: list = []
+            for row in batch:
+                record: dict = dict(zip(columns, self.export_row(row)))
+                record['price'] = float(record['price'])
+                record['price_with_tax'] = float(record['price_with_tax'])
+                record['final_price'] = float(record['final_price'])
+                lines.append(json.dumps(record, ensure_ascii=False))
+            yield '\n'.join(lines) + '\n'
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for batch in self.batches(rows):
+            yield ''.join(writer.writerow(self.export_row(row)) for row in batch)
+
+
+class CartList(APIView):
+    def post(self, request: Request) -> Response:
+        cart: Cart = Cart.objects.create()
+        return Response(cart_representation(Cart.objects.summary(cart.pk)), status=status.HTTP_201_CREATED)
+
+
+class CartDetail(APIView):
+    """
+    The cart with its items, product data, line totals and cart totals, all from one query (see
+    CartQuerySet.summary()).
+    """
+
+    def get(self, request: Request, pk) -> Response:
+        rows: list = Cart.objects.summary(pk)
+        if not rows:
+            raise NotFound()
+        return Response(cart_representation(rows))
+
+    def delete(self, request: Request, pk) -> Response:
+        deleted, _ = Cart.objects.filter(pk=pk).delete()
+        if not deleted:
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemMixin:
+    """
+    Item writes lock the cart row first, like checkout() does (see store.checkout): an item is never written
+    between checkout reading the items and deleting the cart, which would delete it without ordering it.
+    """
+
+    @staticmethod
+    def lock_cart(cart_id) -> None:
+        if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+            raise NotFound()
+
+    def save_item(self, cart_id, product_id: int, quantity: int, add: bool) -> Response:
+        """
+        One upsert statement (see CartItemQuerySet). When it writes nothing, the product is looked up to tell why.
+        """
+        with transaction.atomic():
+            self.lock_cart(cart_id)
+            new_quantity: int | None = CartItem.objects.upsert(cart_id, product_id, quantity, add=add)
+        if new_quantity is None:
+            if not Product.objects.filter(pk=product_id).exists():
+                raise serializers.ValidationError(
+                    {'product_id': [f'Invalid pk "{product_id}" - object does not exist.']})
+            raise serializers.ValidationError(
+                {'quantity': [f'At most {CartItem.MAX_QUANTITY} of a product per cart.']})
+        return Response({'product_id': product_id, 'quantity': new_quantity})
+
+
+class CartItemList(CartItemMixin, APIView):
+    def post(self, request: Request, pk) -> Response:
+        """
+        Adds `quantity` of `product_id` to the cart (to the existing quantity if the product is already in it).
+        """
+        serializer = CartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.save_item(pk, serializer.validated_data['product_id'], serializer.validated_data['quantity'],
+                              add=True)
+
+
+class CartItemDetail(CartItemMixin, APIView):
+    def put(self, request: Request, pk, product_id: int) -> Response:
+        """
+        Sets the quantity of the product in the cart, adding it if needed.
+        """
+        quantity = request.data.get('quantity') if isinstance(request.data, dict) else None
+        serializer = CartItemSerializer(data={'product_id': product_id, 'quantity': quantity})
+        serializer.is_valid(raise_exception=True)
+        return self.save_item(pk, product_id, serializer.validated_data['quantity'], add=False)
+
+    def delete(self, request: Request, pk, product_id: int) -> Response:
+        with transaction.atomic():
+            self.lock_cart(pk)
+            deleted, _ = CartItem.objects.filter(cart_id=pk, product_id=product_id).delete()
+        if not deleted:
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartCheckout(APIView):
+    """
+    Places an order for the cart of `customer_id` and deletes the cart (see store.checkout). Answers 409 with the
+    products that are short when the stock does not cover the cart, in which case nothing changes.
+    """
+
+    def post(self, request: Request, pk) -> Response:
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order, order_items = checkout(pk, serializer.validated_data['customer'])
+        except CartNotFound:
+            raise NotFound()
+        except EmptyCart:
+            return Response({'message': 'The cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as exc:
+            return Response({'message': 'Not enough stock.', 'products': exc.shortages},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(order_representation(order, order_items), status=status.HTTP_201_CREATED)
+
+
+class CustomerOrderList(ListAPIView):
+    """
+    Order history of a customer, newest first, with the totals maintained on the orders (see Order.total_price):
+    pages are keyset queries on the (customer, placed_at, id) index of store_order that never read the items.
+    Customers are not linked to user accounts, so the history is for staff only.
+    """
+    permission_classes: list = [IsAdminUser]
+    serializer_class: OrderHistorySerializer = OrderHistorySerializer
+    pagination_class: OrderPagination = OrderPagination
+
+    def get_queryset(self):
+        return Order.objects.filter(customer_id=self.kwargs['pk']).values(*OrderHistorySerializer.Meta.fields)
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        response: Response = super().list(request, *args, **kwargs)
+        # the customer itself is only looked up when there is nothing to show
+        if not response.data['results'] and not Customer.objects.filter(pk=self.kwargs['pk']).exists():
+            raise NotFound()
+        return response
+
+
+class SalesReport(APIView):
+    """
+    Sales from `?start=` to `?end=` (dates, inclusive, the last 30 days by default) per day, per collection or
+    per best selling product (`?group=day|collection|product`, `?limit=` products), answered from the sales
+    rollups only (see store.rollups): `as_of` is when they were last brought up to date.
+    """
+    permission_classes: list = [IsAdminUser]
+    default_days: int = 30
+    default_limit: int = 20
+    max_limit: int = 100
+    totals: dict = {'revenue': Sum('revenue'), 'units': Sum('units'), 'orders_count': Sum('orders_count')}
+
+    def get(self, request: Request) -> Response:
+        end: date = self.get_date(request, 'end', timezone.localdate())
+        start: date = self.get_date(request, 'start', end - timedelta(days=self.default_days - 1))
+        if start > end:
+            raise serializers.ValidationError({'start': ['Must not be after end.']})
+        group: str = request.query_params.get('group', 'day')
+        groups: dict = {
+            'day': (self.by_day, DaySalesSerializer),
+            'collection': (self.by_collection, CollectionSalesSerializer),
+            'product': (self.by_product, ProductSalesSerializer),
+        }
+        if group not in groups:
+            raise serializers.ValidationError({'group': [f'Must be one of: {", ".join(groups)}.']})
+        rows, serializer_class = groups[group]
+        return Response({
+            'start': start,
+            'end': end,
+            'group': group,
+            'as_of': get_watermark(),
+            'results': serializer_class(rows(start, end), many=True).data,
+        })
+
+    @staticmethod
+    def get_date(request: Request, name: str, default: date) -> date:
+        value: str | None = request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            day: date | None = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise serializers.ValidationError({name: ['Must be a YYYY-MM-DD date.']})
+        return day
+
+    def by_day(self, start: date, end: date):
+        return (DailySales.objects.filter(day__range=(start, end)).order_by('day')
+                .values('day', 'revenue', 'units', 'orders_count'))
+
+    def by_collection(self, start: date, end: date):
+        return (DailyCollectionSales.objects.filter(day__range=(start, end))
+                .values('collection_id', title=F('collection__title'))
+                .annotate(**self.totals)
+                .order_by('-revenue', 'collection_id'))
+
+    def by_product(self, start: date, end: date):
+        try:
+            limit: int = min(max(int(self.request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            raise serializers.ValidationError({'limit': ['A valid integer is required.']})
+        return (DailyProductSales.objects.filter(day__range=(start, end))
+                .values('product_id', title=F('product__title'))
+                .annotate(**self.totals)
+                .order_by('-revenue', 'product_id')[:limit])
+
+
+class CollectionFieldsMixin(SparseFieldsMixin):
+    """
+    `?fields=` reads only the needed columns with `only()`, `?expand=featured_product` joins the product.
+    """
+    field_names: tuple = ('id', 'title', 'products_count', 'featured_product')
+    expandable: tuple = ('featured_product',)
+    expand_dependencies: dict = {'featured_product': 'product'}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields: set | None = self.get_sparse_fields()
+        expand: set = self.get_expand()
+        if 'featured_product' in expand:
+            queryset = queryset.select_related('featured_product')
+        if fields is not None:
+            # the id and title (a sort key) are always read, featured_product only when it is joined
+            queryset = queryset.only('id', 'title', *(fields & {'products_count'}), *expand)
+        return queryset
+
+
+class CollectionList(CollectionFieldsMixin, CachedListMixin, ListCreateAPIView):
+    queryset: Collection = Collection.objects.all()
     serializer_class: CollectionSerializer = CollectionSerializer
+    pagination_class: CollectionPagination = CollectionPagination
+    cache_dependencies: tuple = ('collection', 'product')
 
 
-class CollectionDetail(RetrieveUpdateDestroyAPIView):
-    queryset: Collection = Collection.objects.annotate(products_count=Count('product'))
+class CollectionDetail(CollectionFieldsMixin, ConditionalRequestMixin, RetrieveUpdateDestroyAPIView):
+    queryset: Collection = Collection.objects.all()
     serializer_class: CollectionSerializer = CollectionSerializer
 
     def delete(self, request: Request, pk: int) -> Response:
         collection: Collection = (get_object_or_404(Collection, pk=pk))
         temp: tuple = (collection.id, collection.title)
-        if collection.product_set.count() > 0:
-            return Response({'message': f'ID: {temp[0]} - {temp[1]} has products, cannot be deleted!'},
-                            status=status.HTTP_409_CONFLICT)
-        collection.delete()
+        has_products: Response = Response({'message': f'ID: {temp[0]} - {temp[1]} has products, cannot be deleted!'},
+                                          status=status.HTTP_409_CONFLICT)
+        if collection.products_count > 0:
+            return has_products
+        try:
+            collection.delete()
+        except ProtectedError:
+            # products_count drifted (see `manage.py repair_counters`): the foreign key has the last word
+            return has_products
         return Response({'message': f'ID: {temp[0]} - {temp[1]}, deleted successfully!'},
                         status=status.HTTP_204_NO_CONTENT)
 
 
+class ListCacheStats(APIView):
+    permission_classes: list = [IsAdminUser]
+
+    def get(self, request: Request) -> Response:
+        return Response(list_cache.stats())
+
+
+# endregion
+
+# region Async (ASGI) read views, routed by store.urls when settings.STORE_ASYNC_VIEWS is on (see storefront.asgi)
+class AsyncReadView(View):
+    """
+    Natively async GET of a catalog endpoint, reading with the async ORM so that under an ASGI server a request
+    waiting on the database holds no worker thread.
+
+    Only the plain JSON reads are served here. Everything else (writes, `?format=`, the browsable API, MessagePack,
+    `?include=`, `?fields=`, `?expand=`, invalid cursors, missing objects) is handed to `sync_view_class`, the DRF
+    view of the same URL, so the endpoint answers exactly as under WSGI.
+    """
+    sync_view_class: type = None
+    sync_view = None
+    # the rows are read with `model.objects.values(*fields)` and rendered by `serializer_class`
+    model: type = None
+    fields: tuple = ()
+    serializer_class: type = None
+    # requested representations rendered by the DRF view: the browsable API and MessagePack
+    sync_media_types: tuple = ('text/html', 'application/msgpack')
+    response_headers: dict = {}
+    renderer: ORJSONRenderer = ORJSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view_class = cls.sync_view_class
+        initkwargs.setdefault('sync_view', view_class.as_view())
+        # the Allow / Vary headers DRF adds to the responses of the view
+        initkwargs.setdefault('response_headers', view_class().default_response_headers)
+        # writes reach the DRF view, which does its own CSRF checks
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def use_sync_view(self, request: HttpRequest) -> bool:
+        return (request.method not in ('GET', 'HEAD')
+                or any(param in request.GET for param in ('format', 'include', 'fields', 'expand'))
+                or any(media_type in request.headers.get('Accept', '') for media_type in self.sync_media_types))
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponseBase:
+        if not self.use_sync_view(request):
+            try:
+                return await super().dispatch(request, *args, **kwargs)
+            except (APIException, ObjectDoesNotExist):
+                pass
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    def serialize(self, data, request: HttpRequest, many: bool = False):
+        return self.serializer_class(data, many=many, context={'request': request}).data
+
+    def render(self, data, **headers) -> HttpResponse:
+        return HttpResponse(self.renderer.render(data), content_type='application/json',
+                            headers={**self.response_headers, **headers})
+
+
+class AsyncCachedListView(AsyncReadView):
+    """
+    Keyset paginated list sharing the entries of `list_cache` with the DRF view (see CachedListMixin).
+    """
+
+    def filter_queryset(self, queryset, request: Request):
+        return queryset
+
+    def get_fields(self, paginator: KeysetPagination, request: Request) -> tuple:
+        """
+        `fields` with the sort key the paginator reads from the rows (as ProductIncludeMixin.get_values_fields).
+        """
+        key: str = paginator.get_ordering(request).lstrip('-')
+        if key not in self.fields and key in {field.attname for field in self.model._meta.concrete_fields}:
+            return self.fields + (key,)
+        return self.fields
+
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        key: str = await list_cache.amake_key(request, self.sync_view_class.cache_dependencies,
+                                              self.renderer.format)
+        data = await list_cache.aget(key)
+        if data is not None:
+            return self.render(data, **{'X-Cache': 'HIT'})
+
+        drf_request = Request(request)
+        paginator = self.sync_view_class.pagination_class()
+        queryset = self.filter_queryset(self.model.objects.values(*self.get_fields(paginator, drf_request)),
+                                        drf_request)
+        rows: list = paginator.process_page([row async for row in paginator.page_queryset(queryset, drf_request)])
+        data = paginator.get_paginated_response(self.serialize(rows, drf_request, many=True)).data
+        await list_cache.aset(key, data)
+        return self.render(data, **{'X-Cache': 'MISS'})
+
+
+class AsyncProductList(AsyncCachedListView):
+    sync_view_class: type = ProductList
+    model: type = Product
+    fields: tuple = ProductReadSerializer.values_fields
+    serializer_class: type = ProductReadSerializer
+
+    def filter_queryset(self, queryset, request: Request):
+        return apply_product_filters(queryset, request.query_params)
+
+
+class AsyncCollectionList(AsyncCachedListView):
+    sync_view_class: type = CollectionList
+    model: type = Collection
+    fields: tuple = tuple(CollectionSerializer.Meta.fields)
+    # DRF serializers read dict rows as well as instances
+    serializer_class: type = CollectionSerializer
+
+
+class AsyncDetailView(AsyncReadView):
+    """
+    The object and its version are read with one `aget()`; conditional requests are answered like
+    ConditionalRequestMixin does, from the same row.
+    """
+    version_field: str = 'last_update'
+
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponseBase:
+        row: dict = await self.model.objects.values(*self.fields, self.version_field).aget(pk=pk)
+        version: datetime = row[self.version_field]
+        response: HttpResponseBase | None = get_conditional_response_for(request, pk, version)
+        if response is not None:
+            return response
+        response = self.render(self.serialize(row, request))
+        set_validators(response, pk, version)
+        return response
+
+
+class AsyncProductDetail(AsyncDetailView):
+    sync_view_class: type = ProductDetail
+    model: type = Product
+    fields: tuple = ProductReadSerializer.values_fields
+    serializer_class: type = ProductReadSerializer
+
+
+class AsyncCollectionDetail(AsyncDetailView):
+    sync_view_class: type = CollectionDetail
+    model: type = Collection
+    fields: tuple = tuple(CollectionSerializer.Meta.fields)
+    serializer_class: type = CollectionSerializer
+
+
 # endregion
 
 # region (APIView) Class-based views (New way) - more powerful and flexible than function-based views.
@@ -1,11 +1,11 @@
 from store.models import Product
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
-from store.admin import ProductAdmin
+from store.admin import AutocompleteInlineMixin, ProductAdmin
 from tags.models import TaggedItem
 
 
-class TagInline(GenericTabularInline):
+class TagInline(AutocompleteInlineMixin, GenericTabularInline):
     autocomplete_fields = ['tag']
     model = TaggedItem
 
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storefront.settings')
+# serve the catalog reads with the async views, see STORE_ASYNC_VIEWS in storefront.settings
+os.environ.setdefault('STOREFRONT_ASYNC', '1')
 
 application = get_asgi_application()
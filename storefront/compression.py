@@ -0,0 +1,67 @@
+"""
+Compression of large API responses.
+
+CompressionMiddleware compresses the responses whose content type is one of COMPRESSED_CONTENT_TYPES and that
+are at least COMPRESSION_MIN_SIZE bytes long (streaming ones, the exports, always): with brotli when the optional
+`brotli` package is installed and the client accepts it, with gzip otherwise (Django's GZipMiddleware, BREACH
+padding and streaming included). Smaller responses cost more CPU time to compress than they save on the wire and
+are sent as they are, without a `Vary: Accept-Encoding`.
+
+Compression is CPU work only, so under ASGI it runs inline in the event loop instead of in a thread, as
+MiddlewareMixin would do.
+"""
+import re
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSED_CONTENT_TYPES: frozenset = frozenset({'application/json', 'application/msgpack', 'application/x-ndjson',
+                                                 'text/csv'})
+# brotli's default quality (11) is meant for static assets; 4 takes about as long as gzip and compresses better
+BROTLI_QUALITY: int = 4
+re_accepts_br = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, get_response) -> None:
+        super().__init__(get_response)
+        self.min_size: int = getattr(settings, 'COMPRESSION_MIN_SIZE', 4096)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        if not self.is_compressible(response):
+            return response
+        if (brotli is not None and not response.streaming
+                and re_accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return self.compress_brotli(response)
+        return super().process_response(request, response)
+
+    def is_compressible(self, response: HttpResponse) -> bool:
+        content_type: str = response.get('Content-Type', '').partition(';')[0].strip()
+        if content_type not in COMPRESSED_CONTENT_TYPES or response.has_header('Content-Encoding'):
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    @staticmethod
+    def compress_brotli(response: HttpResponse) -> HttpResponse:
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed: bytes = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # a compressed representation only matches the uncompressed one weakly (RFC 9110 8.8.1)
+        etag: str | None = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,354 @@
+"""
+Lightweight production request metrics.
+
+MetricsMiddleware records, per resolved URL name, the wall time, DB time, query count and response size of every
+request into fixed-bucket histograms, plus a request counter per status code. Everything is kept in process
+memory behind one lock, so recording a request costs a few microseconds.
+
+With several worker processes set METRICS_DIR to a directory shared by the workers of one host: each process then
+writes a snapshot of its metrics there at most every METRICS_FLUSH_INTERVAL seconds, and the /metrics/ endpoint
+(Prometheus text format) merges the snapshots of every process. The snapshots of processes that exited are folded
+into one archive, so their requests stay counted (counters never go down) and the directory holds one file per live
+worker. The shared directory needs POSIX file locks and process ids: on other platforms (Windows) METRICS_DIR is
+ignored and /metrics/ reports the process that answers it.
+
+/metrics/ answers the clients in METRICS_ALLOWED_NETWORKS and, when METRICS_TOKEN is set, the requests with an
+`Authorization: Bearer <METRICS_TOKEN>` header; everyone else gets a 403.
+"""
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: in-process metrics only
+    fcntl = None
+
+DURATION_BUCKETS: tuple = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS: tuple = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS: tuple = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# metric name -> (help, buckets), in the order of ViewMetrics.histograms
+HISTOGRAMS: tuple = (
+    ('storefront_request_duration_seconds', 'Wall time of the request.', DURATION_BUCKETS),
+    ('storefront_request_db_duration_seconds', 'Time spent executing SQL during the request.', DURATION_BUCKETS),
+    ('storefront_request_queries', 'Number of SQL queries executed by the request.', QUERY_BUCKETS),
+    ('storefront_response_size_bytes', 'Size of the (non-streaming) response body.', SIZE_BUCKETS),
+)
+BUCKETS: tuple = tuple(buckets for _, _, buckets in HISTOGRAMS)
+UNRESOLVED: str = '<unresolved>'
+# metrics of the processes that exited, in METRICS_DIR
+ARCHIVE: str = 'archive.json'
+
+
+class QueryTimer:
+    """
+    Accumulates the number and duration of the queries of one request.
+    """
+    __slots__ = ('count', 'duration')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+
+# QueryTimer of the request being handled in the current thread / task
+current_timer: ContextVar = ContextVar('current_timer', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    timer: QueryTimer | None = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs) -> None:
+    # Installed once per connection instead of wrapping every connection on every request
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class ViewMetrics:
+    """
+    Histograms (non-cumulative bucket counts + sum) and status counters of one URL name.
+    """
+    __slots__ = ('histograms', 'statuses')
+
+    def __init__(self) -> None:
+        # [bucket counts (last one is +Inf), sum] for each entry of HISTOGRAMS
+        self.histograms: list = [[[0] * (len(buckets) + 1), 0.0] for _, _, buckets in HISTOGRAMS]
+        self.statuses: dict = {}
+
+    def observe(self, values: tuple) -> None:
+        for histogram, buckets, value in zip(self.histograms, BUCKETS, values):
+            if value is not None:
+                histogram[0][bisect_left(buckets, value)] += 1
+                histogram[1] += value
+
+    def to_dict(self) -> dict:
+        return {'histograms': self.histograms, 'statuses': self.statuses}
+
+    def merge(self, data: dict) -> None:
+        for histogram, (counts, total) in zip(self.histograms, data['histograms']):
+            histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+            histogram[1] += total
+        for status, count in data['statuses'].items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+def get_metrics_dir() -> str | None:
+    """
+    METRICS_DIR, or None where the multi-process registry is not supported (see the module docstring).
+    """
+    return getattr(settings, 'METRICS_DIR', None) if fcntl is not None else None
+
+
+def merge_snapshots(snapshots) -> dict:
+    merged: dict = {}
+    for snapshot in snapshots:
+        for view_name, data in snapshot.items():
+            merged.setdefault(view_name, ViewMetrics()).merge(data)
+    return merged
+
+
+def is_alive(pid: int) -> bool:
+    # POSIX only: signal 0 probes the process, on Windows os.kill() terminates it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a process of another user
+        return True
+    return True
+
+
+def read_json(path: Path, default):
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path: Path, data) -> None:
+    temporary: Path = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.views: dict = {}
+        self.flushed_at: float = 0.0
+        self.owner: int | None = None
+        self.name: str = ''
+
+    def observe(self, view_name: str, status: int, values: tuple) -> None:
+        with self.lock:
+            metrics: ViewMetrics | None = self.views.get(view_name)
+            if metrics is None:
+                metrics = self.views[view_name] = ViewMetrics()
+            metrics.observe(values)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {view_name: json.loads(json.dumps(metrics.to_dict())) for view_name, metrics in self.views.items()}
+
+    # region Multi-process
+    def maybe_flush(self, directory: str, interval: float) -> None:
+        now: float = time.monotonic()
+        if now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        self.flush(directory)
+
+    def snapshot_name(self) -> str:
+        """
+        `<pid>-<random>.json`: a new name for every process, so a process reusing the pid of one that exited never
+        overwrites the snapshot of the other (the name is renewed in processes forked after it was made).
+        """
+        pid: int = os.getpid()
+        if self.owner != pid:
+            self.owner, self.name = pid, f'{pid}-{uuid.uuid4().hex[:12]}.json'
+        return self.name
+
+    def flush(self, directory: str) -> None:
+        write_json(Path(directory) / self.snapshot_name(), self.snapshot())
+
+    def collect(self, directory: str | None) -> dict:
+        """
+        Metrics of this process merged with the snapshots the other processes wrote to `directory` and the
+        archive of the processes that exited.
+        """
+        snapshots: list = [self.snapshot()]
+        if directory:
+            self.compact(Path(directory))
+            own: str = self.snapshot_name()
+            for path in Path(directory).glob('*.json'):
+                if path.name != own:
+                    try:
+                        data: dict = json.loads(path.read_text())
+                    except (OSError, ValueError):
+                        continue
+                    snapshots.append(data['views'] if path.name == ARCHIVE else data)
+        return merge_snapshots(snapshots)
+
+    @staticmethod
+    def compact(directory: Path) -> None:
+        """
+        Folds the snapshots of the processes that exited into the archive and deletes them. The archive records the
+        snapshots it holds, so a snapshot is never counted twice, even when deleting it failed.
+        """
+        pids: dict = {path: path.name.partition('-')[0] for path in directory.glob('*.json') if path.name != ARCHIVE}
+        dead: list = [path for path, pid in pids.items() if pid.isdigit() and not is_alive(int(pid))]
+        if not dead:
+            return
+        with open(directory / 'archive.lock', 'a') as lock:
+            # one process at a time, each sees the archive the previous one wrote
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive: dict = read_json(directory / ARCHIVE, {'folded': [], 'views': {}})
+            folded: set = set(archive['folded'])
+            snapshots: list = [archive['views']]
+            for path in dead:
+                if path.name not in folded:
+                    try:
+                        snapshots.append(json.loads(path.read_text()))
+                    except (OSError, ValueError):
+                        continue
+                    folded.add(path.name)
+            # the names of the snapshots deleted since the last compaction are not needed anymore
+            folded = {name for name in folded if (directory / name).exists()}
+            merged: dict = merge_snapshots(snapshots)
+            write_json(directory / ARCHIVE, {'folded': sorted(folded),
+                                             'views': {name: metrics.to_dict() for name, metrics in merged.items()}})
+            for path in dead:
+                path.unlink(missing_ok=True)
+    # endregion
+
+
+registry: Registry = Registry()
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, DB time, query count, response size and status per resolved URL name into `registry`.
+    Put it first in MIDDLEWARE so the wall time covers the other middleware.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response, registry: Registry = registry) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.registry: Registry = registry
+        self.directory: str | None = get_metrics_dir()
+        self.interval: float = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10.0)
+        if self.directory:
+            Path(self.directory).mkdir(parents=True, exist_ok=True)
+        # connections opened before this module was imported missed the connection_created signal
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(sender=type(connection), connection=connection)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        started: float = time.perf_counter()
+        try:
+            response: HttpResponse = self.get_response(request)
+        finally:
+            elapsed: float = time.perf_counter() - started
+            current_timer.reset(token)
+        self.record(request, response, elapsed, timer)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # the ORM runs the queries of async views in threads that inherit this context, so they find the timer
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        started: float = time.perf_counter()
+        try:
+            response: HttpResponse = await self.get_response(request)
+        finally:
+            elapsed: float = time.perf_counter() - started
+            current_timer.reset(token)
+        self.record(request, response, elapsed, timer)
+        return response
+
+    def record(self, request: HttpRequest, response: HttpResponse, elapsed: float, timer: QueryTimer) -> None:
+        match = request.resolver_match
+        size: int | None = None if response.streaming else len(response.content)
+        self.registry.observe(match.view_name if match else UNRESOLVED, response.status_code,
+                              (elapsed, timer.duration, timer.count, size))
+        if self.directory:
+            self.registry.maybe_flush(self.directory, self.interval)
+
+
+def render_prometheus(views: dict) -> str:
+    lines: list = []
+    for index, (name, help_text, buckets) in enumerate(HISTOGRAMS):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for view_name, metrics in sorted(views.items()):
+            counts, total = metrics.histograms[index]
+            label: str = f'view="{escape_label(view_name)}"'
+            cumulative: int = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label}}} {total}')
+            lines.append(f'{name}_count{{{label}}} {cumulative}')
+    lines += ['# HELP storefront_requests_total Requests by URL name and status code.',
+              '# TYPE storefront_requests_total counter']
+    for view_name, metrics in sorted(views.items()):
+        for status, count in sorted(metrics.statuses.items()):
+            lines.append(f'storefront_requests_total{{view="{escape_label(view_name)}",status="{status}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def is_allowed(request: HttpRequest) -> bool:
+    token: str | None = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network)
+               for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', ('127.0.0.1/32', '::1/128')))
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    views: dict = registry.collect(get_metrics_dir())
+    return HttpResponse(render_prometheus(views), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,174 @@
+"""
+Read replica routing.
+
+ReplicaRouter sends the reads of the catalog apps (store, tags, likes) to the aliases listed in
+DATABASE_REPLICAS and every write to 'default', the primary. Replicas are only read from inside requests that
+went through ReplicaMiddleware; management commands, the shell and background code always read the primary, so
+nothing ever writes back values read from a lagging replica.
+
+Within a request, reads go to the primary when:
+
+- the request is a write (POST, PUT, PATCH, DELETE), so it validates against what it is about to change;
+- a transaction is open on the primary (select_for_update() and read-modify-write code need the primary);
+- the client wrote less than REPLICA_STICKY_SECONDS ago: a request that wrote sets a cookie that pins the
+  client to the primary for that long, so it reads its own writes whatever the replication lag;
+- no replica is healthy: a replica that cannot be connected to is skipped for REPLICA_RETRY_SECONDS.
+
+One replica is picked per request, so all the reads of a request see the same snapshot. Cached data computed
+from replica reads expires after REPLICA_STICKY_SECONDS (see replica_lag_timeout()).
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpRequest, HttpResponse
+
+ROUTED_APPS: frozenset = frozenset({'store', 'tags', 'likes'})
+SAFE_METHODS: frozenset = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class ReadState:
+    """
+    Routing state of the request being handled in the current thread / task.
+    """
+    __slots__ = ('pinned', 'replica', 'wrote')
+
+    def __init__(self, pinned: bool) -> None:
+        self.pinned = pinned
+        # the replica picked for this request, chosen on its first read
+        self.replica: str | None = None
+        self.wrote = False
+
+
+current_state: ContextVar = ContextVar('current_read_state', default=None)
+
+
+class ReplicaHealth:
+    """
+    Per process record of the replicas that could not be connected to, and until when they are skipped.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.down_until: dict = {}
+
+    def is_healthy(self, alias: str) -> bool:
+        with self.lock:
+            if self.down_until.get(alias, 0.0) > time.monotonic():
+                return False
+        try:
+            # a no-op when the connection of this thread is already open
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            self.mark_down(alias)
+            return False
+        return True
+
+    def mark_down(self, alias: str) -> None:
+        with self.lock:
+            self.down_until[alias] = time.monotonic() + getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.down_until.clear()
+
+
+health: ReplicaHealth = ReplicaHealth()
+
+
+def get_replicas() -> list:
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def replica_lag_timeout():
+    """
+    Cache timeout for data computed in the current request: REPLICA_STICKY_SECONDS, the replication lag the
+    deployment tolerates, when it was read from a replica (it may predate the write that invalidated the
+    previous entry), the cache's own default otherwise.
+    """
+    state: ReadState | None = current_state.get()
+    if state is None or state.replica in (None, DEFAULT_DB_ALIAS):
+        return DEFAULT_TIMEOUT
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints) -> str | None:
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state: ReadState | None = current_state.get()
+        if state is None or state.pinned or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            healthy: list = [alias for alias in get_replicas() if health.is_healthy(alias)]
+            state.replica = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints) -> str:
+        state: ReadState | None = current_state.get()
+        if state is not None and model._meta.app_label in ROUTED_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        # replicas hold the same rows as the primary
+        databases: set = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str = None, **hints) -> bool | None:
+        # replicas get their schema through replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Enables replica reads for the request and pins the client to the primary for REPLICA_STICKY_SECONDS after a
+    request that wrote, with the REPLICA_PIN_COOKIE cookie. Works in both sync and async middleware chains.
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.cookie_name: str = getattr(settings, 'REPLICA_PIN_COOKIE', 'primary_pin')
+        self.sticky_seconds: int = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = ReadState(pinned=self.is_pinned(request))
+        token = current_state.set(state)
+        try:
+            response: HttpResponse = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # the ORM runs in threads that inherit this context, so the router sees the state
+        state = ReadState(pinned=self.is_pinned(request))
+        token = current_state.set(state)
+        try:
+            response: HttpResponse = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.process_response(state, response)
+
+    def is_pinned(self, request: HttpRequest) -> bool:
+        return request.method not in SAFE_METHODS or self.cookie_name in request.COOKIES
+
+    def process_response(self, state: ReadState, response: HttpResponse) -> HttpResponse:
+        if state.wrote and self.sticky_seconds > 0:
+            response.set_cookie(self.cookie_name, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
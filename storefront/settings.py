@@ -1,6 +1,8 @@
 """
 Django settings for storefront project.
 """
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +36,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'storefront.metrics.MetricsMiddleware',
+    'storefront.routers.ReplicaMiddleware',
+    'storefront.compression.CompressionMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django_browser_reload.middleware.BrowserReloadMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -45,6 +50,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Deployment mode. storefront.asgi sets STOREFRONT_ASYNC=1: the catalog read endpoints are then served by the
+# async views of store.views (see store.urls), and middleware that can only run synchronously is left out, as
+# Django would hop to a thread around it on every request.
+STORE_ASYNC_VIEWS = os.environ.get('STOREFRONT_ASYNC') == '1'
+if STORE_ASYNC_VIEWS:
+    MIDDLEWARE.remove('debug_toolbar.middleware.DebugToolbarMiddleware')
+    SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W001']
+
 INTERNAL_IPS = [
     # ...
     '127.0.0.1',
@@ -82,6 +95,56 @@ DATABASES = {
     }
 }
 
+# Read replicas (see storefront.routers): aliases of DATABASES that replicate 'default'. The catalog reads of
+# requests go to a healthy replica, writes and everything else to 'default'. 'replica' is a second alias of the
+# same database: list it in DATABASE_REPLICAS to try the routing locally. The test runner points it to the test
+# database of 'default' (store.tests.ReplicaRoutingTests routes to it).
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['storefront.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+# After writing, a client reads from 'default' for this long (cookie REPLICA_PIN_COOKIE): set it above the
+# replication lag. It also bounds how long cached responses computed from replica reads are kept.
+REPLICA_STICKY_SECONDS = 5
+REPLICA_PIN_COOKIE = 'primary_pin'
+# A replica that cannot be connected to is skipped for this long
+REPLICA_RETRY_SECONDS = 30
+
+# Cache
+# The 'store' cache holds the catalog list responses (see store.cache). LocMemCache is a per-process LRU bounded
+# by MAX_ENTRIES; with several worker processes switch it to a shared backend such as
+# 'django.core.cache.backends.filebased.FileBasedCache' (LOCATION: a directory) or
+# 'django.core.cache.backends.db.DatabaseCache' (LOCATION: a table, see `manage.py createcachetable`)
+# so invalidations reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'store': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store-list-cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+STORE_LIST_CACHE_ALIAS = 'store'
+
+# Admin changelists of the large store tables show the planner's row estimate instead of an exact count above
+# this many rows (see store.estimates)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10_000
+
+# Request metrics (see storefront.metrics), served at /metrics/ in Prometheus text format.
+# With several worker processes point METRICS_DIR to a directory shared by them so /metrics/ aggregates all of them.
+# POSIX only, ignored on Windows.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 10.0
+# Who may read /metrics/: clients in these networks (REMOTE_ADDR, so the proxy's address behind a reverse proxy)
+# and, when METRICS_TOKEN is set, requests with an `Authorization: Bearer <METRICS_TOKEN>` header
+METRICS_ALLOWED_NETWORKS = ['127.0.0.1/32', '::1/128']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,7 +179,24 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Django REST framework settings
+# Django REST framework settings. JSON is rendered with orjson (see store.renderers); MessagePack
+# (`Accept` / `Content-Type: application/msgpack`) is served and accepted when the msgpack package is installed.
 REST_FRAMEWORK = {
-    'COERCE_DECIMAL_TO_STRING': False
+    'COERCE_DECIMAL_TO_STRING': False,
+    'DEFAULT_RENDERER_CLASSES': [
+        'store.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('store.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('store.renderers.MessagePackParser')
+
+# JSON, MessagePack, CSV and NDJSON responses of at least this many bytes are compressed by
+# storefront.compression.CompressionMiddleware (brotli when the brotli package is installed, gzip otherwise)
+COMPRESSION_MIN_SIZE = 4096
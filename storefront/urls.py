@@ -17,11 +17,14 @@ from django.contrib import admin
 from django.urls import path, include
 import debug_toolbar
 
+from .metrics import metrics_view
+
 admin.site.site_header = 'Storefront Admin'
 admin.site.index_title = 'Admin'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('playground/', include('playground.urls')),
     path('', include('store.urls')),
     path('__debug__/', include(debug_toolbar.urls)),
@@ -14,6 +14,24 @@ class TaggedItemManager(models.Manager):
                 object_id=obj_id
             )
 
+    def get_tags_for_many(self, obj_type, obj_ids) -> dict:
+        """
+        Tags of many objects of the same type with one query: {object id: [Tag, ...]} sorted by label,
+        with an empty list for the objects that have no tags.
+        """
+        obj_ids = list(obj_ids)
+        tags: dict = {obj_id: [] for obj_id in obj_ids}
+        if not obj_ids:
+            return tags
+        # get_for_model() is served from the ContentType cache after the first call
+        content_type = ContentType.objects.get_for_model(obj_type)
+        rows = self.filter(content_type=content_type, object_id__in=obj_ids) \
+            .order_by('tag__label', 'tag_id') \
+            .values_list('object_id', 'tag_id', 'tag__label')
+        for obj_id, tag_id, label in rows:
+            tags[obj_id].append(Tag(id=tag_id, label=label))
+        return tags
+
 
 class Tag(models.Model):
     label = models.CharField(max_length=255)
@@ -28,3 +46,9 @@ class TaggedItem(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            # every lookup goes through (content_type, object_id), see TaggedItemManager
+            models.Index(fields=['content_type', 'object_id'], name='tags_taggeditem_object_idx'),
+        ]